@@ -0,0 +1,132 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+from waveforms import AnalogWaveform
+from i2c_dissector import I2cAnalyzer
+
+class AnalysisCache:
+    """
+    On-disk cache of digitized edges and decoded transactions.
+
+    Every entry is an uncompressed .npz file with the arrays of
+    I2cAnalyzer.to_arrays(), named after a hash of the content of the capture
+    files and the thresholds, so changed captures or thresholds never hit a
+    stale entry. The cache directory is kept below max_size by deleting the least
+    recently used entries.
+    """
+    VERSION = 1
+    """Format version, part of the key"""
+
+    DIRNAME = ".i2ccache"
+
+    def __init__(self, directory: Union[str, Path], max_size: int = 512 << 20) -> None:
+        """
+        Args:
+            directory: Directory of the cache entries (created on first store)
+            max_size: Maximum total size of all entries in bytes
+        """
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    @classmethod
+    def next_to(cls, filename: Union[str, Path], max_size: int = 512 << 20) -> "AnalysisCache":
+        """Cache in a directory next to a capture file."""
+        return cls(Path(filename).parent / cls.DIRNAME, max_size)
+
+    @staticmethod
+    def file_hash(filename: Union[str, Path], block_size: int = 1 << 20) -> str:
+        """SHA-256 of the content of a file."""
+        h = hashlib.sha256()
+        with open(filename, "rb") as f:
+            while block := f.read(block_size):
+                h.update(block)
+        return h.hexdigest()
+
+    def key(self, filenames: Iterable[Union[str, Path]], threshold_lo: float, threshold_hi: float, *extra) -> str:
+        """
+        Get the key of an analysis.
+
+        Args:
+            filenames: Capture files (content is hashed)
+            threshold_lo: Lower threshold voltage
+            threshold_hi: Higher threshold voltage
+            extra: Anything else the result depends on (e.g. CSV columns)
+        """
+        h = hashlib.sha256()
+        for filename in filenames:
+            h.update(self.file_hash(filename).encode())
+        h.update(repr((self.VERSION, float(threshold_lo), float(threshold_hi)) + extra).encode())
+        return h.hexdigest()[:32]
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def load(self, key: str, sda_waveform: AnalogWaveform, scl_waveform: AnalogWaveform, threshold_lo: float, threshold_hi: float) -> Optional[I2cAnalyzer]:
+        """
+        Get a cached analysis.
+
+        Returns:
+            The restored analyzer, None if the entry doesn't exist or can't be read
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as npz:
+                arrays = { name : npz[name] for name in I2cAnalyzer.ARRAY_NAMES }
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # mark as recently used
+        os.utime(path)
+        return I2cAnalyzer.from_arrays(sda_waveform, scl_waveform, threshold_lo, threshold_hi, arrays)
+
+    def store(self, key: str, analyzer: I2cAnalyzer) -> Path:
+        """
+        Store an analysis and evict old entries if the cache got too large.
+
+        Returns:
+            The path of the entry
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        # write to a temporary file first, a crash must not leave a truncated entry behind
+        tmp = path.with_name(f"{key}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **analyzer.to_arrays())
+        os.replace(tmp, path)
+
+        self.evict(keep=path)
+        return path
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Delete an entry, or all entries if key is None."""
+        paths = [self.path(key)] if key is not None else self.directory.glob("*.npz")
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """
+        Delete the least recently used entries until the cache is below max_size.
+
+        Args:
+            keep: Entry that is never deleted (e.g. the one just stored)
+        """
+        entries = []
+        for path in self.directory.glob("*.npz"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,137 @@
+from waveforms import *
+from i2c_dissector import *
+from i2cgenerator import I2cWaveformGenerator
+from simplestats import Simplestats
+from profiler import StageProfiler
+import i2cvisualizer
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import matplotlib
+matplotlib.use("Agg") # figures are only saved as files
+
+p = argparse.ArgumentParser(description="Times the stages of the I2C analysis on synthetic captures of increasing size")
+p.add_argument("-d", "--durations", type=str, default="0.1,0.5,2", help="Comma separated capture lengths in seconds (default: %(default)s)")
+p.add_argument("-s", "--bus_speed", type=float, default=400e3, help="SCL frequency in Hz, e.g. 100e3, 400e3, 1e6 (default: %(default)s)")
+p.add_argument("-sr", "--sample_rate", type=float, default=12.5e6, help="Sample rate in Hz (default: %(default)s)")
+p.add_argument("-vbus", "--bus_voltage", type=float, default=5, help="Bus voltage (default: %(default)s)")
+p.add_argument("--rise_time", type=float, default=500e-9, help="10 %% to 90 %% rise time in s (default: %(default)s)")
+p.add_argument("--fall_time", type=float, default=400e-9, help="90 %% to 10 %% fall time in s (default: %(default)s)")
+p.add_argument("--noise", type=float, default=0.02, help="Noise standard deviation in V (default: %(default)s)")
+p.add_argument("--crosstalk", type=float, default=0.05, help="Fraction of a voltage step coupled into the other line (default: %(default)s)")
+p.add_argument("--stretch", type=float, default=0.1, help="Probability of clock stretching after an ACK (default: %(default)s)")
+p.add_argument("--nack", type=float, default=0.05, help="Probability of NACKs (default: %(default)s)")
+p.add_argument("--restart", type=float, default=0.3, help="Probability of repeated START register reads (default: %(default)s)")
+p.add_argument("--seed", type=int, default=1, help="Seed of the synthetic traffic (default: %(default)s)")
+p.add_argument("--mmap", action="store_true", help="Memory-map the capture files instead of reading them in the load stage")
+p.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes rendering the figures (default: %(default)s)")
+p.add_argument("-w", "--workdir", type=str, default=None, help="Directory for the capture files and figures (default: temporary directory)")
+p.add_argument("-p", "--profile", type=str, default=None, help="Run the stages matching this pattern under cProfile and save the statistics as profile_<stage>.prof")
+p.add_argument("-o", "--output", type=str, default="benchmark.json", help="Result file (default: %(default)s)")
+
+args = p.parse_args()
+
+durations = [float(v) for v in args.durations.split(",")]
+v_bus = args.bus_voltage
+v_lo = v_bus * 0.3
+v_hi = v_bus * 0.7
+
+def run(duration, workdir):
+    generator = I2cWaveformGenerator(bus_speed=args.bus_speed, sample_rate=args.sample_rate, v_bus=v_bus,
+        rise_time=args.rise_time, fall_time=args.fall_time, noise=args.noise, crosstalk=args.crosstalk,
+        stretch_probability=args.stretch, nack_probability=args.nack, restart_probability=args.restart, seed=args.seed)
+    scl_file = os.path.join(workdir, "bench_scl.bin")
+    sda_file = os.path.join(workdir, "bench_sda.bin")
+    num_samples = generator.write_saleae_bin(duration, scl_file, sda_file)
+
+    profiler = StageProfiler(args.profile)
+
+    with profiler.stage("load", samples=num_samples):
+        aw_scl = AnalogWaveform.from_saleae_bin(scl_file, mmap=args.mmap)
+        aw_sda = AnalogWaveform.from_saleae_bin(sda_file, mmap=args.mmap)
+
+    with profiler.stage("digitize", samples=num_samples):
+        dw_scl = DigitalWaveform(aw_scl, v_lo, v_hi)
+        dw_sda = DigitalWaveform(aw_sda, v_lo, v_hi)
+
+    with profiler.stage("decode", samples=num_samples):
+        transactions = I2cAnalyzer(dw_sda, dw_scl).get_transactions()
+
+    renderer = i2cvisualizer.FigureRenderer()
+
+    with profiler.stage("bitstats", samples=num_samples):
+        # same bit selection as the report
+        for ag in transactions.i2c_addresses():
+            for read in (True, False):
+                bits = transactions.filter(ag.address, read).get_bits(not read, read, True, False)
+                bits.extend(transactions.filter(ag.address, not read).get_bits(not read, read, False, read))
+                if len(bits) == 0:
+                    continue
+                bitinfo = i2cvisualizer.I2cBitInfo(bits, v_bus, dw_scl, dw_sda)
+                bitinfo.info()
+                renderer.add(os.path.join(workdir, f"bits_0x{ag.address:02X}{'R' if read else 'W'}.png"), i2cvisualizer.draw_density,
+                             bitinfo.histogram.counts, bitinfo.histogram.x_bins, bitinfo.histogram.y_bins)
+
+    with profiler.stage("crosstalk", samples=num_samples):
+        for aggressor, victim, name in ((dw_sda, dw_scl, "sda_scl"), (dw_scl, dw_sda, "scl_sda")):
+            for rising in (True, False):
+                histogram = i2cvisualizer.I2cCrosstalk(aggressor, rising, victim, v_bus).histogram()
+                renderer.add(os.path.join(workdir, f"xtalk_{name}_{'rise' if rising else 'fall'}.png"), i2cvisualizer.draw_density,
+                             histogram.counts, histogram.x_bins, histogram.y_bins)
+
+    with profiler.stage("transitiontimes", samples=num_samples):
+        for scl in (True, False):
+            ttgroups = i2cvisualizer.I2cTransitiontime(transactions, scl)
+            for ttgroup in ttgroups.data:
+                Simplestats(ttgroup["rise"]).serialize()
+                Simplestats(ttgroup["fall"]).serialize()
+            renderer.add(os.path.join(workdir, f"trtime_{'scl' if scl else 'sda'}.png"), i2cvisualizer.draw_transitiontime,
+                         "SCL" if scl else "SDA", ttgroups.histograms(), size=ttgroups.figsize)
+
+    with profiler.stage("render", samples=num_samples):
+        renderer.run(args.jobs)
+
+    expected = len(generator.transactions)
+    return {
+        "duration" : duration,
+        "samples" : num_samples,
+        "scl_edges" : len(dw_scl.transitions),
+        "sda_edges" : len(dw_sda.transitions),
+        "transactions" : len(transactions),
+        "transactions_generated" : expected,
+        "stages" : { stage["name"] : dict(stage, samples_per_s=num_samples / stage["wall_time"]) for stage in profiler.serialize() },
+    }
+
+data = {
+    "machine" : {
+        "platform" : platform.platform(),
+        "processor" : platform.processor(),
+        "cpus" : os.cpu_count(),
+        "python" : platform.python_version(),
+        "numpy" : np.__version__,
+    },
+    "config" : vars(args),
+    "runs" : [],
+}
+
+# peak memory is the resident set size of this process, including memory-mapped samples, excluding render workers
+with tempfile.TemporaryDirectory() as tmpdir:
+    workdir = args.workdir if args.workdir is not None else tmpdir
+    os.makedirs(workdir, exist_ok=True)
+    for duration in durations:
+        print(f"Capture of {duration} s at {args.bus_speed / 1e3:.0f} kHz, {args.sample_rate / 1e6:.3f} MHz")
+        result = run(duration, workdir)
+        data["runs"].append(result)
+        print(f"  {result['samples']} samples, {result['transactions']} of {result['transactions_generated']} transactions decoded")
+        print("  stage              time [s]      CPU [s]     samples/s   peak RSS [MB]")
+        for name, stage in result["stages"].items():
+            rss = "---" if stage["peak_rss"] is None else f"{stage['peak_rss'] / 2**20:.1f}"
+            print(f"  {name:<15} {stage['wall_time']:>11.3f} {stage['cpu_time']:>12.3f} {stage['samples_per_s']:>13.3g} {rss:>15}")
+
+with open(args.output, "w") as fp:
+    json.dump(data, fp, indent=1)
+print()
+print(f"Results saved as '{args.output}'")
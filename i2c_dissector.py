@@ -1,6 +1,12 @@
 from waveforms import *
 from simplestats import Simplestats
-from typing import List
+from typing import List, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing
+import numpy as np
+import math
+import os
 from dataclasses import dataclass
 
 class I2cStartcondition:
@@ -54,16 +60,12 @@ class I2cBit:
     
     @property
     def bit_time(self):
-        analyzer = self.parent.transaction.analyzer
-        #prev_trans = analyzer.scl_data.prev_from_index(self.scl_transition.index, False)
-        next_trans = analyzer.scl_data.next_from_index(self.scl_transition.index, False)
-        prev_trans = next_trans.slope_prev
-        if prev_trans is None or next_trans is None:
+        """Time from the SCL falling edge before the bit to the one after it."""
+        if (prev_fall := self.scl_transition.slope_prev) is None:
             return None
-        
-        dt = analyzer.scl_data.time_at_index(next_trans.index) - analyzer.scl_data.time_at_index(prev_trans.index)
-
-        return dt
+        if (fall := self.scl_transition.slope_next) is None:
+            return None
+        return fall.t2 - prev_fall.t2
     
     def __repr__(self):
         return f"<{self.__class__.__name__} sda={self.sda_value} scl_index={self.scl_transition.i_end}>"
@@ -219,7 +221,7 @@ class I2cTransaction:
     def data(self) -> list:
         retval = []
         for item in self.obj_data:
-            retval.append(item.data if item.is_complete is True else None)
+            retval.append(item.value if item.is_complete is True else None)
 
         return retval
     
@@ -307,82 +309,707 @@ class I2cTransaction:
     
     @classmethod
     def next_transaction(cls, analyzer: "I2cAnalyzer", startindex: int = 0):
-        self = cls(analyzer)
+        return I2cDecoder(analyzer, startindex).next_transaction()
 
-        scld = self.analyzer.scl_data
-        sdad = self.analyzer.sda_data
+class I2cDecoder:
+    """
+    Resumable I2C protocol decoder working on the edge tables of an I2cAnalyzer.
 
-        i = startindex
+    The search position, the partial transaction and the partial byte are kept
+    between calls, so decoding can be continued when the edge tables have grown
+    (see I2cStreamAnalyzer).
+    """
+    def __init__(self, analyzer: "I2cAnalyzer", startindex: int = 0) -> None:
+        self.analyzer = analyzer
+        self.index = startindex
+        self.finished = False
 
-        self.start_condition = analyzer._next_start(i)
+        self._search_index = startindex
+        self._transaction: Optional[I2cTransaction] = None
+        self._data = None
+        self._cursor = None
 
-        if self.start_condition is None:
-            return self
-        
-        #print(f"got start condition: {self.start_condition}")
-        
-        i = self.start_condition.index
-        self.index_start = i
+    def decode(self, final: bool = True) -> List[I2cTransaction]:
+        """
+        Decode all transactions the edges seen so far allow.
 
-        #print(f"START at {analyzer.tstr(i)}")
+        Args:
+            final: No more edges will follow. The last transaction is then
+                returned even if it has no end (like the original get_transactions()).
 
-        data = I2cAddressByte(self)
+        Returns:
+            List of transactions decoded in this call
+        """
+        transactions = []
+        while (tr := self.next_transaction(final)) is not None:
+            transactions.append(tr)
+        return transactions
+
+    def next_transaction(self, final: bool = True) -> Optional[I2cTransaction]:
+        """
+        Decode the next transaction.
+
+        Args:
+            final: No more edges will follow
+
+        Returns:
+            The transaction or None if decoding is finished or more edges are needed
+        """
+        if self.finished is True:
+            return None
+
+        scl = self.analyzer.scl_data.transitions
+        sda = self.analyzer.sda_data.transitions
+
+        if self._transaction is None:
+            start_condition = self._next_start()
+            if start_condition is None:
+                if final is True:
+                    self.finished = True
+                    return I2cTransaction(self.analyzer)
+                return None
+
+            tr = I2cTransaction(self.analyzer)
+            tr.start_condition = start_condition
+            tr.index_start = start_condition.index
+            self._transaction = tr
+            self._cursor = start_condition.index
+            self._data = I2cAddressByte(tr)
+
+        tr = self._transaction
 
         while True:
             # check if there is a start/stop condition before the next bit
-            # in the current state (after a tart condition or after data latched), SCL is high
+            # in the current state (after a start condition or after data latched), SCL is high
             # look for the next falling slope, if there is any change of SDA before that 
             # (i.e. during SCL is high), there has been a STOP or RESTART condition
-            scl_trans = scld.next_from_index(i, False)
-            if scl_trans is None:
-                # no transition -> premature end of transaction
-                #print(f"could not find SCL fall after {analyzer.tstr(i)} -> end of transmission")
-                return self
-
-            sda_trans = sdad.next_from_index(i, None, scl_trans.i_end)
-            #print(f"checking next SDA transition between {analyzer.tstr(i)} ... {analyzer.tstr(scl_trans.i_end)}: {sda_trans}")
-            if sda_trans is not None:
-                if isinstance(sda_trans, RisingEdge): # STOP condition
-                    #print(f"STOP condition at {analyzer.tstr(sda_trans.i_end)} -> end of transmission")
-                    #print(f"residual data: {data}")
+            scl_fall = scl.first_after(self._cursor, False)
+            if scl_fall is None:
+                # no transition (yet) -> premature end of transaction
+                return self._unterminated(final)
 
-                    self.stop_condition = I2cStopcondition(self, sda_trans)
-                    self.index_end = sda_trans.i_end
-                    #FIXME: is the transaction complete? set self.completetransaction = True
-                    return self
+            sda_pos = sda.first_after(self._cursor)
+            if sda_pos is not None and sda.i_end[sda_pos] < scl.i_end[scl_fall]:
+                sda_trans = sda[sda_pos]
+                if isinstance(sda_trans, RisingEdge): # STOP condition
+                    tr.stop_condition = I2cStopcondition(tr, sda_trans)
                 else: # RESTART condition
-                    #print(f"RESTART condition at {analyzer.tstr(sda_trans.i_end)} -> end of transmission")
-                    #print(f"residual data: {data}")
-                    self.stop_condition = I2cStartcondition(self, sda_trans, True)
-                    self.index_end = sda_trans.i_end #FIXME: is this correct? 
-                    # or rather just i - restart condition must be re-detected by next transaction detection
-                    #FIXME: is the transaction complete? set self.completetransaction = True
-                    return self
-                
-            scl_trans = scld.next_from_index(i, True) # next rising edge of SCL
-            if scl_trans is None:
-                #print("premature end of data")
-                return self
-            if data.addbit(scl_trans, sdad.level_at(scl_trans.i_end)) is True:
+                    tr.stop_condition = I2cStartcondition(tr, sda_trans, True)
+                tr.index_end = sda_trans.i_end
+                return self._terminated()
+
+            scl_rise = scl.first_after(self._cursor, True) # next rising edge of SCL
+            if scl_rise is None:
+                return self._unterminated(final)
+
+            sda_value = LEVELS[self.analyzer.sda_level_at_scl[scl_rise]]
+            if self._data.addbit(scl[scl_rise], sda_value) is True:
                 # byte transmission is done
-                if isinstance(data, I2cAddressByte):
-                    #print(f"address byte completely received: {data}")
-                    self.obj_address = data
+                if isinstance(self._data, I2cAddressByte):
+                    tr.obj_address = self._data
                 else:
-                    #print(f"data byte completely received: {data}")
-                    self.obj_data.append(data)
+                    tr.obj_data.append(self._data)
+
+                self._data = I2cDataByte(tr)
+
+            self._cursor = float(scl.i_end[scl_rise])
+
+    def _next_start(self) -> Optional[I2cStartcondition]:
+        sda = self.analyzer.sda_data.transitions
+        while True:
+            pos = sda.first_after(self._search_index, False)
+            if pos is None:
+                return None
+            if self.analyzer.scl_level_at_sda[pos] == 1:
+                return I2cStartcondition(self.analyzer, sda[pos])
+            self._search_index = float(sda.i_end[pos]) + 1
+
+    def _terminated(self) -> I2cTransaction:
+        tr = self._transaction
+        if self.index == tr.index_end:
+            raise Exception("Could not find next transaction (stuck in inf loop)")
+
+        self.index = tr.index_end
+        if isinstance(tr.stop_condition, I2cStartcondition):
+            # restart condition, need to move the cursor a bit to catch the (re-)start
+            self.index -= 1
+
+        self._search_index = self.index
+        self._transaction = None
+        return tr
+
+    def _unterminated(self, final: bool) -> Optional[I2cTransaction]:
+        if final is False:
+            return None
+        self.finished = True
+        tr = self._transaction
+        self._transaction = None
+        return tr
+
+# digital levels as returned by DigitalWaveform.levels_at()
+LEVELS = { 1 : True, 0 : False, -1 : None }
+
+class I2cBitTiming:
+    """
+    SCL timing of bits as arrays, the vectorized version of the I2cBit properties.
+
+    Times are in seconds, NaN where the edge before or after the bit is missing.
+    The low time and period of the last bit of a transaction are NaN as well,
+    the next rising SCL edge belongs to the next transaction.
+    """
+    def __init__(self, scl_pos, scl_high_time, scl_low_time, scl_period, bit_time) -> None:
+        self.scl_pos = scl_pos
+        """Position of the rising SCL edge of every bit"""
+        self.scl_high_time = scl_high_time
+        """From the rising SCL edge of the bit to the next falling one"""
+        self.scl_low_time = scl_low_time
+        """From the falling SCL edge after the bit to the next rising one"""
+        self.scl_period = scl_period
+        """From the rising SCL edge of the bit to the next rising one"""
+        self.bit_time = bit_time
+        """From the falling SCL edge before the bit to the one after it"""
+
+    @classmethod
+    def from_edges(cls, scl: EdgeTable, scl_pos: np.ndarray, last: Optional[np.ndarray] = None) -> "I2cBitTiming":
+        """
+        Measure the bits in one pass over the SCL edges.
+
+        Args:
+            scl: SCL edges
+            scl_pos: Position of the rising SCL edge of every bit
+            last: Whether a bit is the last one of its transaction, None for none
+        """
+        scl_pos = np.asarray(scl_pos, dtype=np.int64)
+        t2 = scl.t2
+
+        def time_at(pos):
+            valid = (pos >= 0) & (pos < len(t2))
+            result = np.full(len(pos), np.nan)
+            result[valid] = t2[pos[valid]]
+            return result
+
+        rise = time_at(scl_pos)
+        fall = time_at(scl_pos + 1)
+        next_rise = time_at(scl_pos + 2)
+        if last is not None:
+            next_rise[np.asarray(last, dtype=bool)] = np.nan
+        return cls(scl_pos, fall - rise, next_rise - fall, next_rise - rise, fall - time_at(scl_pos - 1))
+
+    def __len__(self) -> int:
+        return len(self.scl_pos)
+
+    def __getitem__(self, index) -> "I2cBitTiming":
+        """Subset of the bits (index array, mask or slice)."""
+        return I2cBitTiming(self.scl_pos[index], self.scl_high_time[index], self.scl_low_time[index],
+                            self.scl_period[index], self.bit_time[index])
+
+class I2cSetupHold:
+    """
+    Setup and hold times of all bits and START/STOP conditions of a decoded table.
+
+    Measured like in UM10204, from the edge tables in a few vectorized passes
+    (t1: start, t2: end of an edge, i.e. when it left or reached a threshold):
+    * tHD;DAT: SCL falling edge end to the start of the next data SDA edge
+    * tSU;DAT: end of the last data SDA edge to the start of the next SCL rising edge
+    * tHD;STA: START SDA edge end to the start of the next SCL falling edge
+    * tSU;STA: SCL rising edge end to the start of a repeated START SDA edge
+    * tSU;STO: SCL rising edge end to the start of the STOP SDA edge
+    * tBUF: STOP SDA edge end to the start of the next START SDA edge
+
+    Data SDA edges are the ones ending while SCL is low or changing. They are
+    assigned to the low phase after the last SCL falling edge that started
+    before them, so SDA changing while SCL is still falling (or already rising)
+    gives a negative hold (or setup) time. Bits without an SDA change have no
+    data setup and hold time (NaN).
+    """
+    BIT_PARAMETERS = ("t_su_dat", "t_hd_dat")
+    """Parameters measured per bit"""
+    CONDITION_PARAMETERS = ("t_hd_sta", "t_su_sta", "t_su_sto", "t_buf")
+    """Parameters measured per transaction"""
+
+    def __init__(self, table: "I2cTransactionTable") -> None:
+        self.table = table
+        analyzer = table.analyzer
+        scl = analyzer.scl_data.transitions
+        sda = analyzer.sda_data.transitions
+        scl_rising = scl.rising
+        n_bits = len(table.bit_scl_pos)
+
+        self.values = {}
+        """Parameter name -> value of every bit or transaction [s], NaN if not measured"""
+        self.times = {}
+        """Parameter name -> time of the SDA edge the value was measured at [s]"""
+
+        # bit index of every rising SCL edge
+        bit_of_scl = np.full(len(scl), -1, dtype=np.int64)
+        bit_of_scl[table.bit_scl_pos] = np.arange(n_bits)
+
+        # data SDA edges and the SCL falling edge of their low phase
+        data = np.flatnonzero(analyzer.scl_level_at_sda != 1)
+        fall_pos = scl.pos_falling
+        k = np.searchsorted(scl.i_start[fall_pos], sda.i_end[data], side="left") - 1
+        valid = k >= 0
+        data, fall = data[valid], fall_pos[k[valid]]
+
+        # hold: first data edge after the falling edge of a bit
+        hold_bit = np.where(fall > 0, bit_of_scl[np.maximum(fall - 1, 0)], -1)
+        first = np.unique(fall, return_index=True)[1]
+        first = first[hold_bit[first] >= 0]
+        self.values["t_hd_dat"] = np.full(n_bits, np.nan)
+        self.times["t_hd_dat"] = np.full(n_bits, np.nan)
+        self.values["t_hd_dat"][hold_bit[first]] = sda.t1[data[first]] - scl.t2[fall[first]]
+        self.times["t_hd_dat"][hold_bit[first]] = sda.t1[data[first]]
+
+        # setup: last data edge before the next rising edge
+        rise = fall + 1
+        has_rise = rise < len(scl)
+        has_rise[has_rise] = scl_rising[rise[has_rise]]
+        setup_bit = np.where(has_rise, bit_of_scl[np.minimum(rise, len(scl) - 1)], -1)
+        last = len(fall) - 1 - np.unique(fall[::-1], return_index=True)[1]
+        last = last[setup_bit[last] >= 0]
+        self.values["t_su_dat"] = np.full(n_bits, np.nan)
+        self.times["t_su_dat"] = np.full(n_bits, np.nan)
+        self.values["t_su_dat"][setup_bit[last]] = scl.t1[rise[last]] - sda.t2[data[last]]
+        self.times["t_su_dat"][setup_bit[last]] = sda.t2[data[last]]
+
+        # conditions per transaction
+        rows = len(table)
+        for name in self.CONDITION_PARAMETERS:
+            self.values[name] = np.full(rows, np.nan)
+            self.times[name] = np.full(rows, np.nan)
+
+        rise_pos = scl.pos_rising
+        i_end_falling = scl.i_end_falling
+        i_end_rising = scl.i_end_rising
+
+        # START: hold until the next SCL falling edge
+        has_start = np.flatnonzero(table.start_pos >= 0)
+        start = table.start_pos[has_start]
+        f = np.searchsorted(i_end_falling, sda.i_end[start], side="right")
+        ok = f < len(fall_pos)
+        self.values["t_hd_sta"][has_start[ok]] = scl.t1[fall_pos[f[ok]]] - sda.t2[start[ok]]
+        self.times["t_hd_sta"][has_start[ok]] = sda.t1[start[ok]]
+
+        # repeated START: the previous transaction ended with it
+        prev_end = np.full(rows, -1, dtype=np.int64)
+        prev_end[1:] = table.end_pos[:-1]
+        prev_restart = np.zeros(rows, dtype=bool)
+        prev_restart[1:] = table.restart[:-1]
+        repeated = has_start[(prev_end[has_start] == start) & prev_restart[has_start]]
+        start = table.start_pos[repeated]
+        r = np.searchsorted(i_end_rising, sda.i_end[start], side="left") - 1
+        ok = r >= 0
+        self.values["t_su_sta"][repeated[ok]] = sda.t1[start[ok]] - scl.t2[rise_pos[r[ok]]]
+        self.times["t_su_sta"][repeated[ok]] = sda.t1[start[ok]]
+
+        # STOP: setup after the last SCL rising edge
+        stopped = np.flatnonzero((table.end_pos >= 0) & ~table.restart)
+        stop = table.end_pos[stopped]
+        r = np.searchsorted(i_end_rising, sda.i_end[stop], side="left") - 1
+        ok = r >= 0
+        self.values["t_su_sto"][stopped[ok]] = sda.t1[stop[ok]] - scl.t2[rise_pos[r[ok]]]
+        self.times["t_su_sto"][stopped[ok]] = sda.t1[stop[ok]]
+
+        # bus free time from the STOP of the previous transaction
+        free = has_start[(prev_end[has_start] >= 0) & ~prev_restart[has_start]]
+        start = table.start_pos[free]
+        stop = prev_end[free]
+        ok = sda.i_end[stop] < sda.i_end[start]
+        self.values["t_buf"][free[ok]] = sda.t1[start[ok]] - sda.t2[stop[ok]]
+        self.times["t_buf"][free[ok]] = sda.t1[start[ok]]
 
-                # check if a STOP or RESTART condition follows
+    def select(self, rows: np.ndarray, bits: np.ndarray) -> dict:
+        """
+        Get the measured values of some transactions and bits.
 
-                data = I2cDataByte(self)
+        Args:
+            rows: Rows of the transactions
+            bits: Indices of the bits (see I2cTransactionTable.bit_indices())
 
-            i = scl_trans.i_end
+        Returns:
+            Parameter name -> (values, times) without the bits and transactions that were not measured
+        """
+        result = {}
+        for name in self.BIT_PARAMETERS + self.CONDITION_PARAMETERS:
+            index = bits if name in self.BIT_PARAMETERS else rows
+            values = self.values[name][index]
+            measured = ~np.isnan(values)
+            result[name] = (values[measured], self.times[name][index][measured])
+        return result
+
+class I2cClockStretching:
+    """
+    Stretched SCL low phases of decoded transactions, as arrays.
+
+    The low phase before every bit of a transaction (and before the SCL edge
+    of its STOP or repeated START) is measured from the end of the falling SCL
+    edge to the start of the rising one, while SCL is below the lower threshold.
+    The nominal low time of the controller is the median of all low phases,
+    a phase longer than factor times the nominal one is stretched by the target.
+    The stall is the time the bus lost, low time minus nominal low time.
+
+    The low phase after the START belongs to the controller and is skipped.
+    A controller that holds SCL low itself (e.g. USB adapters waiting for the
+    next packet) can't be told apart from a stretching target.
+    """
+    def __init__(self, nominal_low_time: float, factor: float, row, position, before_condition, address, read,
+                 time, low_time) -> None:
+        self.nominal_low_time = nominal_low_time
+        """Median low time of all bits [s], NaN without bits"""
+        self.factor = factor
+        """Low phases longer than factor * nominal_low_time are stretched"""
+        self.row = row
+        """Transaction row of every stretched low phase"""
+        self.position = position
+        """Position of the bit after the low phase in its transaction (0: first address bit, 9: first bit after the address ACK, ...)"""
+        self.before_condition = before_condition
+        """Whether the low phase is followed by the STOP or repeated START instead of a bit"""
+        self.address = address
+        """7 bit address of the transaction, -1 if unknown"""
+        self.read = read
+        """SDA level of the R/W bit of the transaction (1: read, 0: write, -1: undefined)"""
+        self.time = time
+        """Start of the low phase [s]"""
+        self.low_time = low_time
+        """Duration of the low phase [s]"""
+
+    @classmethod
+    def from_table(cls, table: "I2cTransactionTable", factor: float = 1.5) -> "I2cClockStretching":
+        """
+        Find the stretched low phases in one pass over the SCL edges of all transactions.
+
+        Args:
+            table: Decoded transactions
+            factor: Minimum ratio of a stretched low phase to the nominal low time
+        """
+        scl = table.analyzer.scl_data.transitions
+        count = table.bit_count
+        row = np.repeat(np.arange(len(table)), count)
+        position = np.arange(len(row)) - np.repeat(np.cumsum(count) - count, count)
+        pos = table.bit_scl_pos[table.bit_first[row] + position]
+
+        # only low phases between a falling and a rising SCL edge, the target isn't addressed before the first bit
+        valid = (pos > 0) & (position > 0)
+        valid[valid] = ~scl.rising[pos[valid] - 1]
+        row, position, pos = row[valid], position[valid], pos[valid]
+        low_time = scl.t1[pos] - scl.t2[pos - 1]
+
+        nominal = float(np.median(low_time)) if len(low_time) > 0 else math.nan
+        stretched = low_time > factor * nominal
+        row, position, pos = row[stretched], position[stretched], pos[stretched]
+        return cls(nominal, factor, row, position, position >= table.byte_count[row] * 9, table.address[row],
+                   table.read[row], scl.t2[pos - 1], low_time[stretched])
+
+    @property
+    def stall_time(self) -> np.ndarray:
+        """Time lost by every stretched low phase [s]"""
+        return self.low_time - self.nominal_low_time
+
+    @property
+    def total_stall_time(self) -> float:
+        """Time lost by all stretched low phases [s]"""
+        return float(self.stall_time.sum())
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    def __getitem__(self, index) -> "I2cClockStretching":
+        """Subset of the low phases (index array, mask or slice), e.g. stretching[stretching.address == 0x39]."""
+        return I2cClockStretching(self.nominal_low_time, self.factor, self.row[index], self.position[index],
+                                  self.before_condition[index], self.address[index], self.read[index],
+                                  self.time[index], self.low_time[index])
+
+class I2cTransactionTable:
+    """
+    Compact columnar representation of decoded transactions.
+
+    Bits refer to the rising SCL edges (index into scl.pos_rising), the bits
+    of every transaction are consecutive. Every 9 bits form a byte, the first
+    byte of a transaction is the address byte, trailing incomplete bytes are
+    dropped like in the object model.
+
+    The I2cTransaction objects are only built on demand by transaction().
+    """
+    def __init__(self, analyzer: "I2cAnalyzer", start_pos, end_pos, restart, bit_first, bit_count) -> None:
+        """
+        Args:
+            analyzer: I2cAnalyzer the table was decoded from
+            start_pos: Position of the SDA edge of the start condition, -1 if not found
+            end_pos: Position of the SDA edge of the stop or restart condition, -1 if not found
+            restart: Whether the transaction was ended by a restart condition
+            bit_first: Index of the first bit
+            bit_count: Number of bits
+        """
+        self.analyzer = analyzer
+        self.start_pos = np.asarray(start_pos, dtype=np.int64)
+        self.end_pos = np.asarray(end_pos, dtype=np.int64)
+        self.restart = np.asarray(restart, dtype=bool)
+        self.bit_first = np.asarray(bit_first, dtype=np.int64)
+        self.bit_count = np.asarray(bit_count, dtype=np.int64)
+
+        scl = analyzer.scl_data.transitions
+        self.bit_scl_pos = scl.pos_rising
+        """Position of the SCL edge of every bit"""
+        self.bit_level = analyzer.sda_level_at_scl[scl.pos_rising]
+        """SDA level of every bit (1: high, 0: low, -1: undefined)"""
+
+        self.byte_count = self.bit_count // 9
+        self.byte_first = np.cumsum(self.byte_count) - self.byte_count
+        transaction_of_byte = np.repeat(np.arange(len(self.byte_count)), self.byte_count)
+        byte_in_transaction = np.arange(len(transaction_of_byte)) - self.byte_first[transaction_of_byte]
+        byte_bits = self.bit_level[(self.bit_first[transaction_of_byte] + 9 * byte_in_transaction)[:, None] + np.arange(9)]
+
+        self.byte_value = ((byte_bits[:, :8] == 1) * (1 << np.arange(7, -1, -1))).sum(axis=1).astype(np.uint8)
+        """Value of the first 8 bits of every byte"""
+        self.byte_ack = byte_bits[:, 8] != 1
+        """ACK bit of every byte"""
+
+        has_address = self.byte_count > 0
+        address_byte = self.byte_first[has_address]
+        self.address = np.full(len(self), -1, dtype=np.int16)
+        """7 bit address, -1 if no complete address byte"""
+        self.address[has_address] = self.byte_value[address_byte] >> 1
+        self.read = np.full(len(self), -1, dtype=np.int8)
+        """SDA level of the R/W bit"""
+        self.read[has_address] = byte_bits[address_byte, 7]
+        self.addr_ack = np.zeros(len(self), dtype=bool)
+        self.addr_ack[has_address] = self.byte_ack[address_byte]
+
+        self.byte_row = transaction_of_byte
+        """Transaction row of every byte"""
+        self.byte_target_ack = (byte_in_transaction == 0) | (self.read[transaction_of_byte] == 0)
+        """Whether the ACK bit of every byte is the target's (address bytes and written bytes),
+        the controller NACKs the last byte it reads on purpose"""
+
+        self._index: Optional[dict] = None
+        self._bit_timing: Optional[I2cBitTiming] = None
+        self._setup_hold: Optional[I2cSetupHold] = None
+
+    def __len__(self) -> int:
+        return len(self.start_pos)
+
+    def bit_indices(self, rows: Optional[np.ndarray] = None, address: bool = True, address_ack: bool = True,
+                    data: bool = True, data_ack: bool = True) -> np.ndarray:
+        """
+        Get the bits of transactions, in the order of I2cTransaction.get_bits().
+
+        Args:
+            rows: Rows of the transactions, None for all
+            address: Include the address and R/W bits
+            address_ack: Include the ACK bit of the address byte
+            data: Include the data bits
+            data_ack: Include the ACK bits of the data bytes
+
+        Returns:
+            Indices into the bit columns (bit_scl_pos, bit_level)
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        count = self.byte_count[rows] * 9
+        offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        is_ack = offset % 9 == 8
+        keep = np.where(offset < 9, np.where(is_ack, address_ack, address), np.where(is_ack, data_ack, data))
+        return (np.repeat(self.bit_first[rows], count) + offset)[keep]
+
+    @property
+    def setup_hold(self) -> I2cSetupHold:
+        """Setup and hold times of all bits and transactions, measured on first use."""
+        if self._setup_hold is None:
+            self._setup_hold = I2cSetupHold(self)
+        return self._setup_hold
+
+    def bit_timing(self, bits: Optional[np.ndarray] = None) -> I2cBitTiming:
+        """
+        Get the SCL timing of bits, all bits are measured on first use.
+
+        Args:
+            bits: Indices of the bits (see bit_indices()), None for all
+        """
+        if self._bit_timing is None:
+            last = np.zeros(len(self.bit_scl_pos), dtype=bool)
+            last[(self.bit_first + 9 * self.byte_count - 1)[self.byte_count > 0]] = True
+            self._bit_timing = I2cBitTiming.from_edges(self.analyzer.scl_data.transitions, self.bit_scl_pos, last)
+        return self._bit_timing if bits is None else self._bit_timing[bits]
+
+    def time_spans(self) -> tuple:
+        """
+        Get the time span of every transaction.
+
+        Returns:
+            Tuple (start, end) [s], from the start of the START SDA edge (or of the first bit)
+            to the end of the STOP or repeated START SDA edge (or of the SCL edge after the
+            last bit), NaN for rows with neither START nor bits
+        """
+        analyzer = self.analyzer
+        scl = analyzer.scl_data.transitions
+        sda = analyzer.sda_data.transitions
+
+        start = np.full(len(self), np.nan)
+        has_start = self.start_pos >= 0
+        start[has_start] = sda.t1[self.start_pos[has_start]]
+        has_bits = self.bit_count > 0
+        first_bit = ~has_start & has_bits
+        start[first_bit] = scl.t1[self.bit_scl_pos[self.bit_first[first_bit]]]
+
+        end = start.copy()
+        last = self.bit_scl_pos[(self.bit_first + self.bit_count - 1)[has_bits]]
+        end[has_bits] = scl.t2[np.minimum(last + 1, len(scl) - 1)]
+        has_end = self.end_pos >= 0
+        end[has_end] = sda.t2[self.end_pos[has_end]]
+        return start, end
+
+    @staticmethod
+    def _group(rows: np.ndarray, keys: np.ndarray):
+        """Split rows by key, the rows of every key stay sorted."""
+        order = np.argsort(keys, kind="stable")
+        unique, first = np.unique(keys[order], return_index=True)
+        return zip(unique.tolist(), np.split(rows[order], first[1:]))
+
+    @property
+    def index(self) -> dict:
+        """
+        Rows of every address and direction, built on first use.
+
+        Keys are (address, read) with read the SDA level of the R/W bit
+        (1: read, 0: write, -1: undefined) or None for both directions.
+        """
+        if self._index is None:
+            rows = np.flatnonzero(self.address >= 0)
+            address = self.address[rows].astype(np.int64)
+            self._index = {}
+            for key, group in self._group(rows, address * 4 + self.read[rows] + 1):
+                self._index[(key >> 2, (key & 3) - 1)] = group
+            for key, group in self._group(rows, address):
+                self._index[(key, None)] = group
+        return self._index
+
+    def rows(self, address: Optional[int] = None, read: Optional[bool] = None) -> np.ndarray:
+        """
+        Get the rows of the transactions to an address and/or in a direction.
+
+        Args:
+            address: 7 bit address, None for all transactions
+            read: True for reads, False for writes, None for both
+
+        Returns:
+            Sorted row indices
+        """
+        if address is None:
+            if read is None:
+                return np.arange(len(self))
+            return np.flatnonzero(self.read == int(read))
+        return self.index.get((address, None if read is None else int(read)), np.empty(0, dtype=np.int64))
+
+    def transaction(self, index: int) -> I2cTransaction:
+        """Build the I2cTransaction object of a row."""
+        analyzer = self.analyzer
+        scl = analyzer.scl_data.transitions
+        sda = analyzer.sda_data.transitions
+
+        tr = I2cTransaction(analyzer)
+        if self.start_pos[index] < 0:
+            return tr
+
+        tr.start_condition = I2cStartcondition(analyzer, sda[int(self.start_pos[index])])
+        tr.index_start = tr.start_condition.index
+
+        bit = int(self.bit_first[index])
+        for i in range(int(self.byte_count[index])):
+            data = I2cAddressByte(tr) if i == 0 else I2cDataByte(tr)
+            for _ in range(9):
+                data.addbit(scl[int(self.bit_scl_pos[bit])], LEVELS[self.bit_level[bit]])
+                bit += 1
+            if i == 0:
+                tr.obj_address = data
+            else:
+                tr.obj_data.append(data)
+
+        if self.end_pos[index] >= 0:
+            sda_trans = sda[int(self.end_pos[index])]
+            if self.restart[index]:
+                tr.stop_condition = I2cStartcondition(tr, sda_trans, True)
+            else:
+                tr.stop_condition = I2cStopcondition(tr, sda_trans)
+            tr.index_end = sda_trans.i_end
+
+        return tr
 
 class I2cAnalyzer:
     def __init__(self, sda_data: DigitalWaveform, scl_data: DigitalWaveform) -> None:
         self.sda_data = sda_data
         self.scl_data = scl_data
 
+        self._scl_level_at_sda: Optional[GrowableArray] = None
+        self._sda_level_at_scl: Optional[GrowableArray] = None
+        self._table: Optional[I2cTransactionTable] = None
+
+    ARRAY_NAMES = (
+        "sda_i_start", "sda_i_end", "sda_rising", "sda_v1", "sda_v2",
+        "scl_i_start", "scl_i_end", "scl_rising", "scl_v1", "scl_v2",
+        "scl_level_at_sda", "sda_level_at_scl",
+        "start_pos", "end_pos", "restart", "bit_first", "bit_count",
+    )
+    """Names of the arrays of to_arrays()"""
+
+    def to_arrays(self) -> dict:
+        """
+        Get the edges, the levels at the edges and the decoded transaction table as plain arrays.
+
+        Returns:
+            { name : array } for all ARRAY_NAMES, see from_arrays()
+        """
+        table = self._table if self._table is not None else self.decode_table()
+        arrays = {}
+        for name, dw in (("sda", self.sda_data), ("scl", self.scl_data)):
+            t = dw.transitions
+            arrays.update({ f"{name}_i_start" : t.i_start, f"{name}_i_end" : t.i_end, f"{name}_rising" : t.rising, f"{name}_v1" : t.v1, f"{name}_v2" : t.v2 })
+        arrays["scl_level_at_sda"] = self.scl_level_at_sda
+        arrays["sda_level_at_scl"] = self.sda_level_at_scl
+        arrays.update({ "start_pos" : table.start_pos, "end_pos" : table.end_pos, "restart" : table.restart, "bit_first" : table.bit_first, "bit_count" : table.bit_count })
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, sda_waveform: AnalogWaveform, scl_waveform: AnalogWaveform, threshold_lo: float, threshold_hi: float, arrays) -> "I2cAnalyzer":
+        """
+        Restore an analyzer from the arrays of to_arrays() without digitizing or decoding.
+
+        Args:
+            sda_waveform: SDA samples (or timing parameters only)
+            scl_waveform: SCL samples
+            threshold_lo: Lower threshold voltage the arrays were created with
+            threshold_hi: Higher threshold voltage
+            arrays: { name : array } (e.g. a loaded .npz file)
+        """
+        digital = []
+        for name, awf in (("sda", sda_waveform), ("scl", scl_waveform)):
+            dw = DigitalWaveform(awf, threshold_lo, threshold_hi, streaming=True)
+            dw.transitions.extend(*(arrays[f"{name}_{column}"] for column in ("i_start", "i_end", "rising", "v1", "v2")))
+            digital.append(dw)
+
+        ia = cls(*digital)
+        ia._scl_level_at_sda = GrowableArray(np.int8)
+        ia._scl_level_at_sda.extend(arrays["scl_level_at_sda"])
+        ia._sda_level_at_scl = GrowableArray(np.int8)
+        ia._sda_level_at_scl.extend(arrays["sda_level_at_scl"])
+        ia._table = I2cTransactionTable(ia, *(arrays[column] for column in ("start_pos", "end_pos", "restart", "bit_first", "bit_count")))
+        return ia
+
+    @property
+    def scl_level_at_sda(self) -> np.ndarray:
+        """Level of SCL at the end of every SDA transition (1: high, 0: low, -1: undefined)."""
+        if self._scl_level_at_sda is None:
+            self._scl_level_at_sda = GrowableArray(np.int8)
+            self._scl_level_at_sda.extend(self.scl_data.levels_at(self.sda_data.transitions.i_end))
+        return self._scl_level_at_sda.values
+
+    @property
+    def sda_level_at_scl(self) -> np.ndarray:
+        """Level of SDA at the end of every SCL transition (1: high, 0: low, -1: undefined)."""
+        if self._sda_level_at_scl is None:
+            self._sda_level_at_scl = GrowableArray(np.int8)
+            self._sda_level_at_scl.extend(self.sda_data.levels_at(self.scl_data.transitions.i_end))
+        return self._sda_level_at_scl.values
+
     def tstr(self, index):
         if isinstance(index, Edge):
             index = index.i_end
@@ -398,7 +1025,7 @@ class I2cAnalyzer:
             if slope is None:
                 return None
             
-            scl_level = self.scl_data.level_at(slope.i_end)
+            scl_level = LEVELS[self.scl_level_at_sda[slope.position]]
             #print(f"  SCL level at {slope.i_end} is {scl_level}")
             
             if scl_level is True:
@@ -412,71 +1039,312 @@ class I2cAnalyzer:
             slope = self.sda_data.next_from_index(index, True)
             if slope is None:
                 return None
-            if self.scl_data.level_at(slope.i_end) is True:
+            if LEVELS[self.scl_level_at_sda[slope.position]] is True:
                 return I2cStopcondition(self, slope)
+            index = slope.i_end + 1
             
-    def get_transactions(self):
-        index = 0
-        transactions = []
+    def decode_table(self, index: float = 0) -> I2cTransactionTable:
+        """
+        Decode all transactions in a few vectorized passes over the edge tables.
+
+        Gives the same result as I2cDecoder. For every rising SCL edge (i.e. bit),
+        the next falling SCL edge and the next SDA edge are looked up at once. A
+        transaction ends at the first bit that is followed by an SDA edge while
+        SCL is still high (STOP or RESTART) or that has no successor. Only the
+        walk from one transaction to the next is sequential.
+
+        Args:
+            index: Sample index to start searching for the first start condition
+
+        Returns:
+            The decoded transactions
+        """
+        scl = self.scl_data.transitions
+        sda = self.sda_data.transitions
+
+        rise_end = scl.i_end_rising
+        fall_end = scl.i_end_falling
+        sda_end = sda.i_end
+
+        def lookahead(cursor):
+            # next SCL fall and next SDA edge after each cursor, condition if SDA changes while SCL is high
+            next_fall = np.searchsorted(fall_end, cursor, side="right")
+            next_sda = np.searchsorted(sda_end, cursor, side="right")
+            has_fall = next_fall < len(fall_end)
+            has_sda = next_sda < len(sda_end)
+            condition = has_fall & has_sda
+            condition[condition] = sda_end[next_sda[condition]] < fall_end[next_fall[condition]]
+            return has_fall, next_sda, condition
+
+        # cursor after each bit
+        bit_has_fall, bit_next_sda, bit_condition = lookahead(rise_end)
+        bit_last = ~bit_has_fall | bit_condition
+        if len(bit_last) > 0:
+            bit_last[-1] = True
+        bit_last_idx = np.flatnonzero(bit_last)
+
+        # cursor after each possible start condition (SDA falling while SCL is high)
+        start_pos = sda.pos_falling[self.scl_level_at_sda[sda.pos_falling] == 1]
+        start_end = sda_end[start_pos]
+        start_has_fall, start_next_sda, start_condition = lookahead(start_end)
+        start_first_bit = np.searchsorted(rise_end, start_end, side="right")
+
+        rows = ([], [], [], [], [])
+        def add(start, end, restart, bit_first, bit_count):
+            for col, value in zip(rows, (start, end, restart, bit_first, bit_count)):
+                col.append(value)
+
         while True:
-            tr = I2cTransaction.next_transaction(self, index)
-            transactions.append(tr)
-            
-            if tr is None or tr.index_end is None:
+            j = int(np.searchsorted(start_end, index, side="right"))
+            if j >= len(start_pos):
+                add(-1, -1, False, 0, 0)
+                break
+
+            end_pos = -1
+            bit_first = 0
+            bit_count = 0
+            if not start_has_fall[j]:
+                pass
+            elif start_condition[j]:
+                end_pos = int(start_next_sda[j])
+            elif start_first_bit[j] < len(rise_end):
+                bit_first = int(start_first_bit[j])
+                bit_end = int(bit_last_idx[np.searchsorted(bit_last_idx, bit_first)])
+                bit_count = bit_end - bit_first + 1
+                if bit_has_fall[bit_end] and bit_condition[bit_end]:
+                    end_pos = int(bit_next_sda[bit_end])
+
+            if end_pos < 0:
+                # premature end of data
+                add(int(start_pos[j]), -1, False, bit_first, bit_count)
                 break
 
-            if index == tr.index_end:
+            restart = not sda.rising[end_pos]
+            add(int(start_pos[j]), end_pos, restart, bit_first, bit_count)
+
+            if index == sda_end[end_pos]:
                 raise Exception("Could not find next transaction (stuck in inf loop)")
-            
-            index = tr.index_end
-            
-            if isinstance(tr.stop_condition, I2cStartcondition):
+            index = float(sda_end[end_pos])
+            if restart:
                 # restart condition, need to move the cursor a bit to catch the (re-)start
                 index -= 1
 
-        return I2cTransactions(transactions)
+        return I2cTransactionTable(self, *rows)
+
+    def get_transactions(self):
+        if self._table is None:
+            self._table = self.decode_table()
+        return I2cTransactions(table=self._table)
+
+    def clock_stretching(self, factor: float = 1.5) -> I2cClockStretching:
+        """
+        Find the SCL low phases stretched by the targets in all transactions.
+
+        Args:
+            factor: Minimum ratio of a stretched low phase to the nominal low time of the controller
+
+        Returns:
+            The stretched low phases
+        """
+        table = self.get_transactions().table
+        if table is None:
+            raise ValueError("Clock stretching needs the decoded table, finish() the stream first")
+        return I2cClockStretching.from_table(table, factor)
+
+class I2cStreamAnalyzer(I2cAnalyzer):
+    """
+    I2C analyzer for captures that are processed chunk by chunk.
+
+    SDA and SCL samples are fed in equally sized chunks. Only the edge tables,
+    the levels at the edges and the decoder state are kept, so the memory usage
+    doesn't depend on the number of samples.
+    """
+    def __init__(self, sda_waveform: AnalogWaveform, scl_waveform: AnalogWaveform, threshold_lo: float, threshold_hi: float) -> None:
+        """
+        Args:
+            sda_waveform: Timing parameters of SDA (see SaleaeBinStream.waveform())
+            scl_waveform: Timing parameters of SCL
+            threshold_lo: Lower threshold voltage
+            threshold_hi: Higher threshold voltage
+        """
+        super().__init__(
+            DigitalWaveform(sda_waveform, threshold_lo, threshold_hi, streaming=True),
+            DigitalWaveform(scl_waveform, threshold_lo, threshold_hi, streaming=True)
+        )
+        self._scl_level_at_sda = GrowableArray(np.int8)
+        self._sda_level_at_scl = GrowableArray(np.int8)
+
+        self.decoder = I2cDecoder(self)
+        self.transactions: List[I2cTransaction] = []
+        self.finished = False
+
+    def feed(self, sda_chunk, scl_chunk) -> List[I2cTransaction]:
+        """
+        Process the next chunk of samples.
+
+        Returns:
+            Transactions completed in this chunk
+        """
+        self._feed_edges(sda_chunk, scl_chunk)
+
+        transactions = self.decoder.decode(final=False)
+        self.transactions.extend(transactions)
+        return transactions
+
+    def _feed_edges(self, sda_chunk, scl_chunk) -> None:
+        """Find the edges of the next chunk and the levels of the other signal at them."""
+        if len(sda_chunk) != len(scl_chunk):
+            raise ValueError("SDA and SCL chunks must have the same length")
+
+        sda_cnt = len(self.sda_data.transitions)
+        scl_cnt = len(self.scl_data.transitions)
+        self.sda_data.feed(sda_chunk)
+        self.scl_data.feed(scl_chunk)
+
+        # the levels of the other signal are needed at the edges, get them while the samples are still there
+        self._scl_level_at_sda.extend(self.scl_data.levels_at(self.sda_data.transitions.i_end[sda_cnt:]))
+        self._sda_level_at_scl.extend(self.sda_data.levels_at(self.scl_data.transitions.i_end[scl_cnt:]))
+
+    def finish(self) -> List[I2cTransaction]:
+        """
+        Decode the remaining transactions after the last chunk.
+
+        Returns:
+            Transactions completed by finishing
+        """
+        transactions = self.decoder.decode(final=True)
+        self.transactions.extend(transactions)
+        self.finished = True
+        return transactions
+
+    def resume(self, sda_samples: np.ndarray, scl_samples: np.ndarray, index: int) -> None:
+        """
+        Start at a sample index instead of the beginning of the capture.
+
+        Args:
+            sda_samples: All SDA samples (e.g. memory-mapped), only the ones before index are read
+            scl_samples: All SCL samples
+            index: Index of the first sample that will be fed
+        """
+        self.sda_data._detector.resume(sda_samples, index)
+        self.scl_data._detector.resume(scl_samples, index)
+        # edges found from here on end after index - 1
+        self.decoder = I2cDecoder(self, index - 1)
+
+    def run(self, sda_chunks: Iterable, scl_chunks: Iterable) -> "I2cTransactions":
+        """Feed all chunks and finish the decoding."""
+        for sda_chunk, scl_chunk in zip(sda_chunks, scl_chunks):
+            self.feed(sda_chunk, scl_chunk)
+        self.finish()
+        return self.get_transactions()
+
+    def get_transactions(self):
+        # after the last chunk the edge tables are complete, the table is decoded from them like from a cached capture
+        if self.finished:
+            return super().get_transactions()
+        return I2cTransactions(self.transactions)
+
+@dataclass
+class I2CAddress:
+    address: int
+    read: bool
+    write: bool
+    read_count: int
+    write_count: int
 
 class I2cTransactions:
-    def __init__(self, items):
-        self.items: List[I2cTransaction] = items
+    def __init__(self, items: Optional[List[I2cTransaction]] = None, table: Optional[I2cTransactionTable] = None,
+                 rows: Optional[np.ndarray] = None, objects: Optional[dict] = None):
+        """
+        Args:
+            items: Transaction objects
+            table: Decoded transactions, the objects are only built on access
+            rows: Rows of table in this selection, None for all
+            objects: Transaction objects already built from table, shared by all selections of it
+        """
+        self.table = table
+        self.rows = rows
+        if items is not None:
+            self._objects = dict(enumerate(items))
+            self._len = len(items)
+        else:
+            self._objects = objects if objects is not None else {}
+            self._len = len(table) if rows is None else len(rows)
+
+    @property
+    def items(self) -> List[I2cTransaction]:
+        return [self[i] for i in range(len(self))]
 
     def __len__(self) -> int:
-        return len(self.items)
-
-    def i2c_addresses(self):
-        @dataclass
-        class I2CAddress:
-            address: int
-            read: bool
-            write: bool
-            read_count: int
-            write_count: int
-        tmp = {}
-        for tr in self.items:
-            
-            if (addr := tr.address) is not None:
-                #addr = (addr << 1) | (1 if tr.access_read else 0)
-                if addr not in tmp:
-                    tmp[addr] = I2CAddress(addr, False, False, 0, 0)
-                
-                if tr.access_read is True:
-                    tmp[addr].read = True
-                    tmp[addr].read_count += 1
-                else:
-                    tmp[addr].write = True
-                    tmp[addr].write_count += 1
+        return self._len
 
+    def __iter__(self) -> Iterator[I2cTransaction]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def _table_rows(self) -> np.ndarray:
+        return np.arange(len(self.table)) if self.rows is None else self.rows
+
+    def i2c_addresses(self) -> List[I2CAddress]:
+        """Addresses with their number of reads and writes, in order of their first transaction."""
+        if self.table is None:
+            tmp = {}
+            for tr in self.items:
+                if (addr := tr.address) is not None:
+                    if addr not in tmp:
+                        tmp[addr] = I2CAddress(addr, False, False, 0, 0)
+
+                    if tr.access_read is True:
+                        tmp[addr].read = True
+                        tmp[addr].read_count += 1
+                    else:
+                        tmp[addr].write = True
+                        tmp[addr].write_count += 1
+
+            return list(tmp.values())
+
+        rows = self._table_rows()
+        address = self.table.address[rows].astype(np.int64)
+        read = self.table.read[rows]
+        valid = address >= 0
+        address = address[valid]
+        read_count = np.bincount(address[read[valid] == 1], minlength=128)
+        total_count = np.bincount(address, minlength=128)
+
+        unique, first = np.unique(address, return_index=True)
+        result = []
+        for addr in unique[np.argsort(first)].tolist():
+            r = int(read_count[addr])
+            w = int(total_count[addr]) - r
+            result.append(I2CAddress(addr, r > 0, w > 0, r, w))
+        return result
 
-        return list(tmp.values())
-    
     def filter(self, address: Union[int, None] = None, read: Union[bool, None] = None):
-        items = []
-        for item in self.items:
-            if (address is None or item.address == address) and (read is None or item.access_read == read):
-                items.append(item)
-        
-        return I2cTransactions(items)
-    
+        """
+        Get the transactions to an address and/or in a direction.
+
+        Selections of a decoded table are looked up in its index, the
+        transaction objects are shared with this selection.
+        """
+        if self.table is None:
+            items = []
+            for item in self.items:
+                if (address is None or item.address == address) and (read is None or item.access_read == read):
+                    items.append(item)
+
+            return I2cTransactions(items)
+
+        if self.rows is None:
+            rows = self.table.rows(address, read)
+        else:
+            mask = np.ones(len(self.rows), dtype=bool)
+            if address is not None:
+                mask &= self.table.address[self.rows] == address
+            if read is not None:
+                mask &= self.table.read[self.rows] == int(read)
+            rows = self.rows[mask]
+        return I2cTransactions(table=self.table, rows=rows, objects=self._objects)
+
     def get_bits(self, address: bool = False, address_ack: bool = False, data: bool = False, data_ack: bool = False):
         result = []
 
@@ -484,6 +1352,311 @@ class I2cTransactions:
             result.extend(item.get_bits(address, address_ack, data, data_ack))
 
         return result
-    
+
+    def bit_timing(self, address: bool = False, address_ack: bool = False, data: bool = False, data_ack: bool = False) -> I2cBitTiming:
+        """
+        Get the SCL timing of the bits get_bits() would return, as arrays.
+
+        Combine with filter() to measure the bits of an address and direction.
+        """
+        if self.table is None:
+            bits = []
+            last = []
+            for item in self.items:
+                item_bits = item.get_bits(address, address_ack, data, data_ack)
+                all_bits = item.get_bits(True, True, True, True)
+                bits.extend(item_bits)
+                last.extend(bit is all_bits[-1] for bit in item_bits)
+            if len(bits) == 0:
+                empty = np.empty(0)
+                return I2cBitTiming(np.empty(0, dtype=np.int64), empty, empty, empty, empty)
+            return I2cBitTiming.from_edges(bits[0].scl_transition.table, [bit.scl_transition.position for bit in bits], last)
+
+        return self.table.bit_timing(self.table.bit_indices(self._table_rows(), address, address_ack, data, data_ack))
+
+    def setup_hold(self) -> dict:
+        """
+        Get the setup and hold times of the transactions and their bits.
+
+        Combine with filter() to measure the transactions of an address and direction.
+
+        Returns:
+            Parameter name (see I2cSetupHold) -> (values, times of the SDA edges) [s]
+        """
+        if self.table is None:
+            raise ValueError("Setup and hold times need decoded transactions (I2cAnalyzer.get_transactions())")
+        rows = self._table_rows()
+        return self.table.setup_hold.select(rows, self.table.bit_indices(rows))
+
     def __getitem__(self, index):
-        return self.items[index]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if not -len(self) <= index < len(self):
+            raise IndexError("transaction index out of range")
+        index %= len(self)
+        row = index if self.rows is None else int(self.rows[index])
+        if (tr := self._objects.get(row)) is None:
+            tr = self._objects[row] = self.table.transaction(row)
+        return tr
+
+
+def _attach_buffer(descriptor):
+    """Open a sample buffer described by I2cParallelAnalyzer._share_buffer() in a worker process."""
+    kind = descriptor[0]
+    if kind == "mmap":
+        _, filename, offset, shape, dtype = descriptor
+        return np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape), None
+    _, name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm
+
+def _analyze_segment(sda_desc, scl_desc, sda_timing, scl_timing, threshold_lo, threshold_hi, start, stop, chunk_size):
+    """Digitize and decode the samples start...stop-1 in a worker process."""
+    sda_samples, sda_shm = _attach_buffer(sda_desc)
+    scl_samples, scl_shm = _attach_buffer(scl_desc)
+    try:
+        sda_wf = AnalogWaveform()
+        sda_wf.time_offset, sda_wf.time_interval = sda_timing
+        scl_wf = AnalogWaveform()
+        scl_wf.time_offset, scl_wf.time_interval = scl_timing
+
+        ia = I2cStreamAnalyzer(sda_wf, scl_wf, threshold_lo, threshold_hi)
+        ia.resume(sda_samples, scl_samples, start)
+        for offset in range(start, stop, chunk_size):
+            end = min(offset + chunk_size, stop)
+            # only feed the edge detection, decoding is done with the batch decoder below
+            ia._feed_edges(sda_samples[offset:end], scl_samples[offset:end])
+
+        table = ia.decode_table(start - 1)
+        edges = []
+        for dw in (ia.sda_data, ia.scl_data):
+            t = dw.transitions
+            edges.append((t.i_start.copy(), t.i_end.copy(), t.rising.copy(), t.v1.copy(), t.v2.copy()))
+
+        rows = (table.start_pos, table.end_pos, table.restart, table.bit_first, table.bit_count)
+        return edges, ia.scl_level_at_sda.copy(), ia.sda_level_at_scl.copy(), rows
+    finally:
+        del sda_samples, scl_samples
+        for shm in (sda_shm, scl_shm):
+            if shm is not None:
+                shm.close()
+
+class I2cThresholdSweep:
+    """
+    Digitize and decode a capture with many threshold pairs.
+
+    Both signals are digitized for all threshold pairs in a single pass over
+    their samples (DigitalWaveform.sweep()), then every pair is decoded with
+    the batch decoder.
+    """
+    def __init__(self, sda_waveform: AnalogWaveform, scl_waveform: AnalogWaveform, thresholds) -> None:
+        """
+        Args:
+            sda_waveform: SDA samples
+            scl_waveform: SCL samples
+            thresholds: (threshold_lo, threshold_hi) pairs
+        """
+        self.thresholds = [(float(lo), float(hi)) for lo, hi in thresholds]
+        sda = DigitalWaveform.sweep(sda_waveform, self.thresholds)
+        scl = DigitalWaveform.sweep(scl_waveform, self.thresholds)
+        self.analyzers = [I2cAnalyzer(sda_data, scl_data) for sda_data, scl_data in zip(sda, scl)]
+        """One analyzer per threshold pair"""
+
+    def summary(self) -> List[dict]:
+        """
+        Get the decoding results of every threshold pair.
+
+        Returns:
+            Per threshold pair: thresholds, number of edges, transactions,
+            incomplete transactions, NACKed addresses and written data bytes
+            (see I2cTransactionTable.byte_target_ack) and the transition time
+            statistics [ns] of all edges
+        """
+        result = []
+        for (lo, hi), ia in zip(self.thresholds, self.analyzers):
+            ia.get_transactions()
+            table = ia._table
+
+            found = table.start_pos >= 0
+            data_byte = np.ones(len(table.byte_ack), dtype=bool)
+            data_byte[table.byte_first[table.byte_count > 0]] = False
+
+            transitiontimes = {}
+            for name, dw in (("scl", ia.scl_data), ("sda", ia.sda_data)):
+                t = dw.transitions
+                transitiontimes[name] = {
+                    "rise" : Simplestats(t.transition_time[t.pos_rising] * 1e9).serialize(),
+                    "fall" : Simplestats(t.transition_time[t.pos_falling] * 1e9).serialize(),
+                }
+
+            result.append({
+                "threshold_lo" : lo,
+                "threshold_hi" : hi,
+                "scl_edges" : len(ia.scl_data.transitions),
+                "sda_edges" : len(ia.sda_data.transitions),
+                "transactions" : int(found.sum()),
+                "incomplete" : int((found & (table.end_pos < 0)).sum()),
+                "addr_nacks" : int(((table.address >= 0) & ~table.addr_ack).sum()),
+                "data_nacks" : int((~table.byte_ack & table.byte_target_ack & data_byte).sum()),
+                "transitiontimes" : transitiontimes,
+            })
+        return result
+
+class I2cParallelAnalyzer(I2cAnalyzer):
+    """
+    I2C analyzer that digitizes and decodes a capture in a process pool.
+
+    The capture is cut into segments at bus-idle gaps (SCL and SDA both high
+    for at least min_idle_time). The workers get the sample buffers memory-mapped
+    (.bin files) or via shared memory, never as pickled copies, and return
+    the edges and the decoded transaction table of their segment, which are
+    merged in time order. If a transaction crosses a segment border anyway,
+    the merged edges are decoded again as a whole, so the result is always
+    the same as the one of I2cAnalyzer.
+    """
+    def __init__(self, sda_waveform: AnalogWaveform, scl_waveform: AnalogWaveform, threshold_lo: float, threshold_hi: float,
+                 processes: Optional[int] = None, min_idle_time: float = 10e-6, chunk_size: int = SaleaeBinStream.DEFAULT_CHUNK_SIZE,
+                 mp_context=None) -> None:
+        """
+        Args:
+            sda_waveform: SDA samples
+            scl_waveform: SCL samples
+            threshold_lo: Lower threshold voltage
+            threshold_hi: Higher threshold voltage
+            processes: Number of worker processes, default: number of CPUs
+            min_idle_time: Minimum time both lines have to be high to cut the capture there
+            chunk_size: Number of samples a worker processes at once
+            mp_context: multiprocessing context for the process pool (e.g. "fork" for scripts without a __main__ guard)
+        """
+        if len(sda_waveform) != len(scl_waveform):
+            raise ValueError("SDA and SCL must have the same number of samples")
+
+        super().__init__(
+            DigitalWaveform(sda_waveform, threshold_lo, threshold_hi, streaming=True),
+            DigitalWaveform(scl_waveform, threshold_lo, threshold_hi, streaming=True)
+        )
+        self._scl_level_at_sda = GrowableArray(np.int8)
+        self._sda_level_at_scl = GrowableArray(np.int8)
+
+        self.processes = processes if processes is not None else (os.cpu_count() or 1)
+        self.min_idle_time = min_idle_time
+        self.chunk_size = chunk_size
+        self.mp_context = multiprocessing.get_context(mp_context) if isinstance(mp_context, str) else mp_context
+        self.segments: List[tuple] = []
+
+    @staticmethod
+    def _share_buffer(data) -> tuple:
+        """Get a descriptor the workers can open the samples with, and the shared memory to release afterwards."""
+        if isinstance(data, np.memmap) and data.filename is not None:
+            return ("mmap", data.filename, data.offset, data.shape, data.dtype.str), None
+
+        data = np.asarray(data)
+        shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+        return ("shm", shm.name, data.shape, data.dtype.str), shm
+
+    def find_idle(self, start: int, block_size: int = 1 << 16) -> Optional[int]:
+        """
+        Find the next bus-idle point.
+
+        Args:
+            start: Sample index to start searching at
+
+        Returns:
+            Sample index in the middle of the first min_idle_time long stretch
+            with SCL and SDA high, None if there is none
+        """
+        scl = self.scl_data.awf
+        sda = self.sda_data.awf
+        hi = np.float64(self.scl_data.threshold_hi)
+        min_len = max(int(math.ceil(self.min_idle_time / scl.time_interval)), 1)
+
+        run = 0 # length of the idle stretch ending at the start of the current block
+        n = len(scl.data)
+        while start < n:
+            end = min(start + block_size, n)
+            idle = (np.asarray(scl.data[start:end]) >= hi) & (np.asarray(sda.data[start:end]) >= hi)
+            # stretches between the busy samples, the first one continues the one of the previous block
+            bounds = np.concatenate(([-1 - run], np.flatnonzero(~idle), [end - start]))
+            lengths = np.diff(bounds) - 1
+            found = np.flatnonzero(lengths >= min_len)
+            if len(found) > 0:
+                return start + int(bounds[found[0]]) + 1 + min_len // 2
+            run = int(lengths[-1])
+            start = end
+        return None
+
+    def _split(self) -> List[tuple]:
+        n = len(self.scl_data.awf)
+        segment_cnt = self.processes * 4
+        splits = [0]
+        for i in range(1, segment_cnt):
+            target = max(n * i // segment_cnt, splits[-1] + 1)
+            if (split := self.find_idle(target)) is None:
+                break
+            if split > splits[-1]:
+                splits.append(split)
+        splits.append(n)
+        return list(zip(splits[:-1], splits[1:]))
+
+    def run(self) -> "I2cTransactions":
+        """Digitize and decode all segments and merge the results."""
+        self.segments = self._split()
+
+        shared = [self._share_buffer(self.sda_data.awf.data), self._share_buffer(self.scl_data.awf.data)]
+        try:
+            sda_awf = self.sda_data.awf
+            scl_awf = self.scl_data.awf
+            with ProcessPoolExecutor(max_workers=self.processes, mp_context=self.mp_context) as pool:
+                futures = [
+                    pool.submit(_analyze_segment, shared[0][0], shared[1][0],
+                                (sda_awf.time_offset, sda_awf.time_interval), (scl_awf.time_offset, scl_awf.time_interval),
+                                self.sda_data.threshold_lo, self.sda_data.threshold_hi, start, stop, self.chunk_size)
+                    for start, stop in self.segments
+                ]
+                results = [f.result() for f in futures]
+        finally:
+            for _, shm in shared:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+        rows = ([], [], [], [], [])
+        consistent = True
+        for i, (edges, scl_level_at_sda, sda_level_at_scl, seg_rows) in enumerate(results):
+            sda_offset = len(self.sda_data.transitions)
+            rise_offset = len(self.scl_data.transitions.pos_rising)
+            self.sda_data.transitions.extend(*edges[0])
+            self.scl_data.transitions.extend(*edges[1])
+            self._scl_level_at_sda.extend(scl_level_at_sda)
+            self._sda_level_at_scl.extend(sda_level_at_scl)
+
+            start_pos, end_pos, restart, bit_first, bit_count = seg_rows
+            if i < len(results) - 1:
+                # the last row is the search for a start condition that ran out of edges,
+                # it is only an empty one if no transaction crosses the segment border
+                if start_pos[-1] >= 0:
+                    consistent = False
+                start_pos, end_pos, restart, bit_first, bit_count = (col[:-1] for col in seg_rows)
+
+            rows[0].append(np.where(start_pos >= 0, start_pos + sda_offset, -1))
+            rows[1].append(np.where(end_pos >= 0, end_pos + sda_offset, -1))
+            rows[2].append(restart)
+            rows[3].append(bit_first + rise_offset)
+            rows[4].append(bit_count)
+
+        # the edges were found with the whole capture in mind, the samples can be taken from the waveforms from now on
+        self.sda_data._detector = None
+        self.scl_data._detector = None
+
+        if consistent:
+            self._table = I2cTransactionTable(self, *(np.concatenate(col) for col in rows))
+        else:
+            self._table = self.decode_table()
+
+        return self.get_transactions()
+
+    def get_transactions(self):
+        if self._table is None:
+            self.run()
+        return I2cTransactions(table=self._table)
@@ -0,0 +1,301 @@
+from typing import Optional
+
+import numpy as np
+
+from i2c_dissector import I2cTransactionTable
+
+MODES = {
+    "standard" : {
+        "name" : "Standard-mode",
+        "f_scl" : 100e3,
+        "t_hd_sta" : 4.0e-6,
+        "t_low" : 4.7e-6,
+        "t_high" : 4.0e-6,
+        "t_su_sta" : 4.7e-6,
+        "t_hd_dat" : 0.0,
+        "t_su_dat" : 250e-9,
+        "t_r" : (None, 1000e-9),
+        "t_f" : (None, 300e-9),
+        "t_su_sto" : 4.0e-6,
+        "t_buf" : 4.7e-6,
+    },
+    "fast" : {
+        "name" : "Fast-mode",
+        "f_scl" : 400e3,
+        "t_hd_sta" : 0.6e-6,
+        "t_low" : 1.3e-6,
+        "t_high" : 0.6e-6,
+        "t_su_sta" : 0.6e-6,
+        "t_hd_dat" : 0.0,
+        "t_su_dat" : 100e-9,
+        "t_r" : (20e-9, 300e-9),
+        "t_f" : (20e-9, 300e-9), # the minimum is scaled by VDD / 5.5 V
+        "t_su_sto" : 0.6e-6,
+        "t_buf" : 1.3e-6,
+    },
+    "fastplus" : {
+        "name" : "Fast-mode Plus",
+        "f_scl" : 1e6,
+        "t_hd_sta" : 0.26e-6,
+        "t_low" : 0.5e-6,
+        "t_high" : 0.26e-6,
+        "t_su_sta" : 0.26e-6,
+        "t_hd_dat" : 0.0,
+        "t_su_dat" : 50e-9,
+        "t_r" : (None, 120e-9),
+        "t_f" : (20e-9, 120e-9), # the minimum is scaled by VDD / 5.5 V
+        "t_su_sto" : 0.26e-6,
+        "t_buf" : 0.5e-6,
+    },
+}
+"""Timing limits of the bus modes, UM10204 Rev. 7, table 10 [s, Hz]"""
+
+class I2cCompliance:
+    """
+    Checks a decoded capture against the UM10204 limits of a bus mode.
+
+    Every parameter is measured for the whole capture at once from the edge
+    tables and the decoded table (no per-bit objects):
+    * fSCL, tLOW, tHIGH: per bit of the complete bytes, tLOW is the low phase
+      before the bit, the frequency is measured from the rising SCL edge of the
+      bit to the next one in the same transaction
+    * tr, tf: every SCL and SDA edge, measured between the thresholds of the
+      digitizer (30 % and 70 % of VDD by default, like in UM10204)
+    * tSU;DAT, tHD;DAT, tHD;STA, tSU;STA, tSU;STO, tBUF: see I2cSetupHold
+    * VOL: SDA at the rising SCL edge of the bits read as low and SCL three
+      quarters into the low phase before every bit
+
+    tLOW and tHIGH are measured between the thresholds the SCL edges cross
+    last and first (lower threshold for tLOW, upper one for tHIGH).
+
+    Violations are indexed by time, with the row of the transaction and the
+    position of the bit in it (0: first address bit, -1: not at a bit, e.g.
+    START and STOP conditions or edges between transactions).
+    """
+    PARAMETERS = {
+        "f_scl" : ("fSCL", "kHz", 1e-3),
+        "t_low" : ("tLOW", "ns", 1e9),
+        "t_high" : ("tHIGH", "ns", 1e9),
+        "t_r_scl" : ("tr SCL", "ns", 1e9),
+        "t_f_scl" : ("tf SCL", "ns", 1e9),
+        "t_r_sda" : ("tr SDA", "ns", 1e9),
+        "t_f_sda" : ("tf SDA", "ns", 1e9),
+        "t_su_dat" : ("tSU;DAT", "ns", 1e9),
+        "t_hd_dat" : ("tHD;DAT", "ns", 1e9),
+        "t_hd_sta" : ("tHD;STA", "ns", 1e9),
+        "t_su_sta" : ("tSU;STA", "ns", 1e9),
+        "t_su_sto" : ("tSU;STO", "ns", 1e9),
+        "t_buf" : ("tBUF", "ns", 1e9),
+        "v_ol_scl" : ("VOL SCL", "V", 1),
+        "v_ol_sda" : ("VOL SDA", "V", 1),
+    }
+    """Parameter name -> (label, unit, scale factor from SI to unit)"""
+
+    def __init__(self, table: I2cTransactionTable, v_bus: float, mode: Optional[str] = None) -> None:
+        """
+        Args:
+            table: Decoded transactions (I2cTransactions.table)
+            v_bus: Bus voltage [V]
+            mode: Key of MODES, None to detect it from the SCL frequency (see detect_mode())
+        """
+        self.table = table
+        self.v_bus = v_bus
+        self.mode = self.detect_mode(table) if mode is None else mode
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown bus mode '{self.mode}' (options: {', '.join(MODES)})")
+
+        self.limits = self._limits(MODES[self.mode], v_bus)
+        """Parameter name -> (minimum, maximum) [SI units], None if there is no limit"""
+
+        self.values = {}
+        """Parameter name -> measured values [SI units]"""
+        self.times = {}
+        """Parameter name -> time of every value [s]"""
+        self.rows = {}
+        """Parameter name -> transaction row of every value, -1 if outside of the transactions"""
+        self.bits = {}
+        """Parameter name -> position of the bit in its transaction, -1 if not at a bit"""
+        self._measure()
+
+        self.summary = {}
+        """Parameter name -> limits, number of values and violations and the worst value"""
+        violations = []
+        for i, name in enumerate(self.PARAMETERS):
+            lo, hi = self.limits[name]
+            values = self.values[name]
+            # distance beyond the limit, negative while within it
+            margin = np.full(len(values), -np.inf)
+            if lo is not None:
+                margin = np.maximum(margin, lo - values)
+            if hi is not None:
+                margin = np.maximum(margin, values - hi)
+            violated = np.flatnonzero(margin > 0)
+            violations.append((np.full(len(violated), i, dtype=np.int8), violated, name))
+
+            summary = { "min" : lo, "max" : hi, "count" : len(values), "violations" : len(violated), "worst" : None,
+                        "time" : None, "transaction" : None, "bit" : None }
+            if len(values) > 0:
+                worst = int(np.argmax(margin))
+                summary.update(worst=float(values[worst]), time=float(self.times[name][worst]),
+                               transaction=int(self.rows[name][worst]), bit=int(self.bits[name][worst]))
+            self.summary[name] = summary
+
+        # index of all violations, ordered by time
+        self.violation_parameter = np.concatenate([parameter for parameter, _, _ in violations])
+        """Index of the violated parameter (into PARAMETERS) of every violation"""
+        self.violation_time = np.concatenate([self.times[name][index] for _, index, name in violations])
+        """Time of every violation [s]"""
+        self.violation_value = np.concatenate([self.values[name][index] for _, index, name in violations])
+        """Measured value of every violation [SI units]"""
+        self.violation_row = np.concatenate([self.rows[name][index] for _, index, name in violations])
+        """Transaction row of every violation, -1 if outside of the transactions"""
+        self.violation_bit = np.concatenate([self.bits[name][index] for _, index, name in violations])
+        """Position of the bit of every violation in its transaction, -1 if not at a bit"""
+        order = np.argsort(self.violation_time, kind="stable")
+        for attr in ("violation_parameter", "violation_time", "violation_value", "violation_row", "violation_bit"):
+            setattr(self, attr, getattr(self, attr)[order])
+
+    @staticmethod
+    def detect_mode(table: I2cTransactionTable) -> str:
+        """
+        Get the bus mode whose nominal SCL frequency is the closest one to the
+        median SCL frequency of the bits (on a logarithmic scale).
+
+        A bus clocked slightly above the limit of its mode is still checked against that mode.
+        """
+        period = table.bit_timing(table.bit_indices()).scl_period
+        period = period[~np.isnan(period)]
+        if len(period) == 0:
+            return "standard"
+        distance = {key: abs(np.log(mode["f_scl"] * np.median(period))) for key, mode in MODES.items()}
+        return min(distance, key=distance.get)
+
+    @staticmethod
+    def _limits(mode: dict, v_bus: float) -> dict:
+        t_f_min = None if mode["t_f"][0] is None else mode["t_f"][0] * v_bus / 5.5
+        v_ol = 0.4 if v_bus > 2 else 0.2 * v_bus
+        limits = {
+            "f_scl" : (None, mode["f_scl"]),
+            "t_r_scl" : mode["t_r"],
+            "t_f_scl" : (t_f_min, mode["t_f"][1]),
+            "t_r_sda" : mode["t_r"],
+            "t_f_sda" : (t_f_min, mode["t_f"][1]),
+            "v_ol_scl" : (None, v_ol),
+            "v_ol_sda" : (None, v_ol),
+        }
+        for name in ("t_low", "t_high", "t_su_dat", "t_hd_dat", "t_hd_sta", "t_su_sta", "t_su_sto", "t_buf"):
+            limits[name] = (mode[name], None)
+        return limits
+
+    def _add(self, name: str, values, times, rows, bits) -> None:
+        measured = ~np.isnan(values)
+        self.values[name] = np.asarray(values, dtype=np.float64)[measured]
+        self.times[name] = np.asarray(times, dtype=np.float64)[measured]
+        self.rows[name] = np.asarray(rows, dtype=np.int64)[measured]
+        self.bits[name] = np.asarray(bits, dtype=np.int64)[measured]
+
+    def _measure(self) -> None:
+        table = self.table
+        analyzer = table.analyzer
+        scl = analyzer.scl_data.transitions
+        sda = analyzer.sda_data.transitions
+        n_rows = len(table)
+
+        # transaction row and position in it of the bits of the complete bytes
+        bits = table.bit_indices()
+        count = table.byte_count * 9
+        row_of_bit = np.repeat(np.arange(n_rows), count)
+        bit_in_row = bits - table.bit_first[row_of_bit]
+
+        def edge_time(column, pos):
+            valid = (pos >= 0) & (pos < len(scl))
+            result = np.full(len(pos), np.nan)
+            result[valid] = column[pos[valid]]
+            return result, valid
+
+        # SCL phases around the bits, only if the neighbouring edges have the expected direction
+        pos = table.bit_scl_pos[bits]
+        rising_scl = scl.rising
+        prev_fall_t2, valid = edge_time(scl.t2, pos - 1)
+        prev_fall_t2[valid] = np.where(rising_scl[(pos - 1)[valid]], np.nan, prev_fall_t2[valid])
+        next_fall_t1, valid = edge_time(scl.t1, pos + 1)
+        next_fall_t1[valid] = np.where(rising_scl[(pos + 1)[valid]], np.nan, next_fall_t1[valid])
+        bit_time = scl.t1[pos]
+        self._add("t_low", bit_time - prev_fall_t2, prev_fall_t2, row_of_bit, bit_in_row)
+        self._add("t_high", next_fall_t1 - scl.t2[pos], bit_time, row_of_bit, bit_in_row)
+        with np.errstate(divide="ignore"):
+            self._add("f_scl", 1 / table.bit_timing(bits).scl_period, bit_time, row_of_bit, bit_in_row)
+
+        # transition times of all edges
+        row_start, row_end = table.time_spans()
+        bit_start = scl.t1[table.bit_scl_pos]
+        for signal, edges in (("scl", scl), ("sda", sda)):
+            rows, positions = self._locate(edges.t1, row_start, row_end, bit_start)
+            for prefix, select in (("t_r", edges.rising), ("t_f", ~edges.rising)):
+                self._add(f"{prefix}_{signal}", edges.transition_time[select], edges.t1[select], rows[select], positions[select])
+
+        # setup and hold times
+        setup_hold = table.setup_hold
+        for name in setup_hold.BIT_PARAMETERS:
+            self._add(name, setup_hold.values[name][bits], setup_hold.times[name][bits], row_of_bit, bit_in_row)
+        no_bit = np.full(n_rows, -1)
+        for name in setup_hold.CONDITION_PARAMETERS:
+            self._add(name, setup_hold.values[name], setup_hold.times[name], np.arange(n_rows), no_bit)
+
+        # low levels
+        scl_awf = analyzer.scl_data.awf
+        sda_awf = analyzer.sda_data.awf
+        fall = pos - 1
+        valid = fall >= 0
+        valid[valid] = ~rising_scl[fall[valid]]
+        index = scl.i_end[fall[valid]] + 0.75 * (scl.i_start[pos[valid]] - scl.i_end[fall[valid]])
+        self._add("v_ol_scl", scl_awf.values_at_indices(index), scl_awf.time_at_index(index), row_of_bit[valid], bit_in_row[valid])
+        low = table.bit_level[bits] == 0
+        index = scl.i_end[pos[low]]
+        self._add("v_ol_sda", sda_awf.values_at_indices(index), sda_awf.time_at_index(index), row_of_bit[low], bit_in_row[low])
+
+    def _locate(self, times, row_start, row_end, bit_start):
+        """
+        Get the transaction row and the position of the bit in it of times.
+
+        A time belongs to the last bit whose rising SCL edge started before it.
+        """
+        table = self.table
+        found = np.flatnonzero(~np.isnan(row_start))
+        k = np.searchsorted(row_start[found], times, side="right") - 1
+        rows = np.where(k >= 0, found[np.maximum(k, 0)], -1)
+        inside = (rows >= 0) & (times <= row_end[rows])
+        rows = np.where(inside, rows, -1)
+
+        bit = np.searchsorted(bit_start, times, side="right") - 1 - table.bit_first[rows]
+        positions = np.where(inside & (bit >= 0) & (bit < table.byte_count[rows] * 9), bit, -1)
+        return rows, positions
+
+    def serialize(self) -> dict:
+        """Limits, summary and the violation index in the units of PARAMETERS."""
+        names = list(self.PARAMETERS)
+        parameters = {}
+        for name, (label, unit, scale) in self.PARAMETERS.items():
+            summary = dict(self.summary[name], label=label, unit=unit)
+            for key in ("min", "max", "worst"):
+                if summary[key] is not None:
+                    summary[key] *= scale
+            parameters[name] = summary
+
+        scale = np.array([item[2] for item in self.PARAMETERS.values()])
+        return {
+            "mode" : self.mode,
+            "name" : MODES[self.mode]["name"],
+            "parameters" : parameters,
+            "violations" : {
+                "parameter" : [names[i] for i in self.violation_parameter.tolist()],
+                "time" : self.violation_time.tolist(),
+                "value" : (self.violation_value * scale[self.violation_parameter]).tolist(),
+                "transaction" : self.violation_row.tolist(),
+                "bit" : self.violation_bit.tolist(),
+            },
+        }
+
+    def offending_transactions(self) -> np.ndarray:
+        """Sorted rows of the transactions with at least one violation."""
+        return np.unique(self.violation_row[self.violation_row >= 0])
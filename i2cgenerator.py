@@ -0,0 +1,287 @@
+import math
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from waveforms import AnalogWaveform
+
+class I2cWaveformGenerator:
+    """
+    Synthesizes analog SDA/SCL captures of I2C traffic with known content.
+
+    The bus is modelled as two open-drain lines: a released line is pulled up
+    through an RC network (exponential rise with rise_time from 10 % to 90 %),
+    a driven line is pulled down faster (exponential fall with fall_time). Every edge couples
+    into the other line (crosstalk, a fraction of the aggressor's remaining
+    voltage step) and gaussian noise is added to every sample.
+
+    The traffic is a sequence of random transactions to a set of addresses:
+    writes, reads and register reads (write, repeated START, read), address
+    and data NACKs and clock stretching by the device after an ACK.
+
+    The level changes are scheduled first and the samples are rendered in
+    chunks from them, so long captures can be written to .bin files without
+    holding them in memory.
+    """
+    STANDARD_MODE = 100e3
+    FAST_MODE = 400e3
+    FAST_MODE_PLUS = 1e6
+
+    def __init__(self, bus_speed: float = FAST_MODE, sample_rate: float = 12.5e6, v_bus: float = 5.0,
+                 rise_time: float = 500e-9, fall_time: float = 400e-9, noise: float = 0.02, crosstalk: float = 0.05,
+                 addresses: Tuple[int, ...] = (0x41, 0x39, 0x60), max_bytes: int = 4, idle_time: float = 50e-6,
+                 stretch_probability: float = 0.0, stretch_time: float = 10e-6, nack_probability: float = 0.0,
+                 restart_probability: float = 0.0, seed: Optional[int] = None) -> None:
+        """
+        Args:
+            bus_speed: SCL frequency [Hz], e.g. STANDARD_MODE, FAST_MODE, FAST_MODE_PLUS
+            sample_rate: Sample rate of the capture [Hz]
+            v_bus: Bus voltage [V]
+            rise_time: 10 % to 90 % rise time of the RC pull-up [s]
+            fall_time: 90 % to 10 % fall time of the drivers [s], including the bandwidth limit of the
+                analyzer (the defaults are close to the example capture). Edges are only detected
+                if there is a sample between the thresholds.
+            noise: Standard deviation of the noise [V]
+            crosstalk: Fraction of a voltage step coupled into the other line
+            addresses: 7-bit addresses of the devices
+            max_bytes: Maximum number of data bytes per transaction
+            idle_time: Mean bus idle time between transactions [s]
+            stretch_probability: Probability that a device stretches the clock after an ACK
+            stretch_time: Maximum duration of a clock stretch [s]
+            nack_probability: Probability of an address NACK, and of a NACK of a written byte
+            restart_probability: Probability of a register read (write, repeated START, read)
+            seed: Seed of the random generator, None for a random seed
+        """
+        if sample_rate < 4 * bus_speed:
+            raise ValueError(f"Sample rate ({sample_rate} Hz) must be at least 4 times the bus speed ({bus_speed} Hz)")
+
+        self.bus_speed = bus_speed
+        self.sample_rate = sample_rate
+        self.v_bus = v_bus
+        self.rise_time = rise_time
+        self.fall_time = fall_time
+        self.noise = noise
+        self.crosstalk = crosstalk
+        self.addresses = tuple(addresses)
+        self.max_bytes = max_bytes
+        self.idle_time = idle_time
+        self.stretch_probability = stretch_probability
+        self.stretch_time = stretch_time
+        self.nack_probability = nack_probability
+        self.restart_probability = restart_probability
+        self.seed = seed
+
+        self.transactions: List[dict] = []
+        """Content of the transactions of the last generated capture"""
+
+    def num_samples(self, duration: float) -> int:
+        """Number of samples of a capture of duration seconds."""
+        return int(round(duration * self.sample_rate))
+
+    def _schedule(self, duration: float, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Schedule the level changes of both lines.
+
+        Only transactions that end within the capture are kept, the bus is
+        idle (both lines released) at the start and the end.
+
+        Returns:
+            Tuple (sda_times, sda_levels, scl_times, scl_levels), times in seconds
+        """
+        h = 0.5 / self.bus_speed # SCL low and high time
+        sda_times, sda_levels, scl_times, scl_levels = [], [], [], []
+        self.transactions = []
+
+        def clock_bit(t, value, stretch = 0.0):
+            # SDA changes in the middle of the low phase, the device may hold SCL low longer
+            sda.append((t + h / 2, value))
+            scl.append((t + h + stretch, 1))
+            scl.append((t + 2 * h + stretch, 0))
+            return t + 2 * h + stretch
+
+        def clock_byte(t, value, ack, stretch = False):
+            # the device stretches the low phase of the first bit after an ACK
+            s = rng.uniform(0, self.stretch_time) if stretch and rng.random() < self.stretch_probability else 0.0
+            for i in range(8):
+                t = clock_bit(t, (value >> (7 - i)) & 1, s if i == 0 else 0.0)
+            return clock_bit(t, 0 if ack else 1)
+
+        def start(t, restart):
+            if restart:
+                # release SDA while SCL is low, then START with SCL high
+                sda.append((t + h / 2, 1))
+                scl.append((t + h, 1))
+                t += h
+            sda.append((t + h / 2, 0))
+            scl.append((t + h, 0))
+            return t + h
+
+        t = rng.uniform(0.5, 1.5) * self.idle_time
+        while True:
+            sda, scl = [], []
+            address = int(rng.choice(self.addresses))
+            register_read = rng.random() < self.restart_probability
+            read = not register_read and rng.random() < 0.5
+
+            t_start = t
+            parts = []
+            if register_read:
+                parts.append((False, [int(rng.integers(0, 256))]))
+                parts.append((True, rng.integers(0, 256, int(rng.integers(1, self.max_bytes + 1))).tolist()))
+            else:
+                parts.append((read, rng.integers(0, 256, int(rng.integers(1 if read else 0, self.max_bytes + 1))).tolist()))
+
+            for i, (part_read, payload) in enumerate(parts):
+                t_part = t + h / 2 + (h if i > 0 else 0) # SDA falls
+                t = start(t, i > 0)
+                addr_ack = rng.random() >= self.nack_probability
+                t = clock_byte(t, (address << 1) | part_read, addr_ack)
+                sent = []
+                acks = []
+                if addr_ack:
+                    for j, value in enumerate(payload):
+                        # the controller NACKs the last byte it reads
+                        ack = j < len(payload) - 1 if part_read else rng.random() >= self.nack_probability
+                        t = clock_byte(t, value, ack, stretch = True)
+                        sent.append(value)
+                        acks.append(bool(ack))
+                        if not ack:
+                            break
+                self.transactions.append({
+                    "start" : t_part,
+                    "address" : address,
+                    "read" : bool(part_read),
+                    "addr_ack" : bool(addr_ack),
+                    "data" : sent,
+                    "data_ack" : acks,
+                    "restart" : i > 0,
+                })
+                if not addr_ack or (not part_read and len(sent) < len(payload)):
+                    break
+
+            # STOP: SDA low while SCL low, then released while SCL is high
+            sda.append((t + h / 2, 0))
+            scl.append((t + h, 1))
+            sda.append((t + 2 * h, 1))
+            t += 2 * h
+
+            if t + h > duration:
+                self.transactions = [tr for tr in self.transactions if tr["start"] < t_start]
+                break
+
+            for time, level in sda:
+                sda_times.append(time)
+                sda_levels.append(level)
+            for time, level in scl:
+                scl_times.append(time)
+                scl_levels.append(level)
+
+            t += rng.uniform(0.5, 1.5) * self.idle_time
+
+        return (np.array(sda_times), np.array(sda_levels, dtype=np.int8),
+                np.array(scl_times), np.array(scl_levels, dtype=np.int8))
+
+    def _segments(self, times: np.ndarray, levels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the RC segments of a line from its level changes.
+
+        Returns:
+            Tuple (start times, target voltages, time constants, start voltages)
+        """
+        # drop changes to the level the line already has
+        keep = np.diff(levels, prepend=1) != 0
+        times = np.concatenate(([-math.inf], times[keep]))
+        levels = np.concatenate(([1], levels[keep]))
+
+        # 10 % to 90 % of an exponential is ln(9) time constants
+        tau_rise = self.rise_time / math.log(9)
+        tau_fall = self.fall_time / math.log(9)
+        target = levels * self.v_bus
+        tau = np.where(levels == 1, tau_rise, tau_fall)
+
+        # a segment starts where the previous one was at its end (not necessarily settled)
+        v0 = np.empty(len(times))
+        v = self.v_bus
+        v0[0] = v
+        for k in range(1, len(times)):
+            if k > 1:
+                v = target[k - 1] + (v - target[k - 1]) * math.exp(-(times[k] - times[k - 1]) / tau[k - 1])
+            v0[k] = v
+        return times, target, tau, v0
+
+    @staticmethod
+    def _voltage(segments, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the voltage of a line at times t.
+
+        Returns:
+            Tuple (voltage, remaining step to the target voltage)
+        """
+        times, target, tau, v0 = segments
+        k = np.searchsorted(times, t, side="right") - 1
+        step = (v0[k] - target[k]) * np.exp(-(t - times[k]) / tau[k])
+        return target[k] + step, -step
+
+    def _render(self, sda_segments, scl_segments, start: int, count: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Render samples start to start + count of both lines."""
+        t = np.arange(start, start + count) / self.sample_rate
+        v_sda, step_sda = self._voltage(sda_segments, t)
+        v_scl, step_scl = self._voltage(scl_segments, t)
+        sda = v_sda + self.crosstalk * step_scl + rng.normal(0, self.noise, count)
+        scl = v_scl + self.crosstalk * step_sda + rng.normal(0, self.noise, count)
+        return sda.astype(np.float32), scl.astype(np.float32)
+
+    def _prepare(self, duration: float):
+        rng = np.random.default_rng(self.seed)
+        sda_times, sda_levels, scl_times, scl_levels = self._schedule(duration, rng)
+        return rng, self._segments(sda_times, sda_levels), self._segments(scl_times, scl_levels)
+
+    def generate(self, duration: float) -> Tuple[AnalogWaveform, AnalogWaveform]:
+        """
+        Generate a capture in memory.
+
+        Args:
+            duration: Length of the capture [s]
+
+        Returns:
+            Tuple (SDA waveform, SCL waveform)
+        """
+        rng, sda_segments, scl_segments = self._prepare(duration)
+        num_samples = self.num_samples(duration)
+
+        waveforms = []
+        for data in self._render(sda_segments, scl_segments, 0, num_samples, rng):
+            wf = AnalogWaveform()
+            wf.time_interval = 1 / self.sample_rate
+            wf.data = data
+            waveforms.append(wf)
+        return tuple(waveforms)
+
+    def write_saleae_bin(self, duration: float, scl_filename: Union[str, Path], sda_filename: Union[str, Path], chunk_size: int = 1 << 20) -> int:
+        """
+        Generate a capture as a pair of Saleae binary exports, chunk by chunk.
+
+        The samples are the same as with generate() for the same seed and duration,
+        as long as duration * sample_rate is below chunk_size.
+
+        Args:
+            duration: Length of the capture [s]
+            scl_filename: Path of the SCL .bin file
+            sda_filename: Path of the SDA .bin file
+            chunk_size: Number of samples rendered at once
+
+        Returns:
+            Number of samples per file
+        """
+        rng, sda_segments, scl_segments = self._prepare(duration)
+        num_samples = self.num_samples(duration)
+
+        with open(scl_filename, "wb") as f_scl, open(sda_filename, "wb") as f_sda:
+            for f in (f_scl, f_sda):
+                AnalogWaveform._write_saleae_bin_header(f, 0.0, self.sample_rate, 1, num_samples)
+            for start in range(0, num_samples, chunk_size):
+                sda, scl = self._render(sda_segments, scl_segments, start, min(chunk_size, num_samples - start), rng)
+                f_sda.write(sda.data)
+                f_scl.write(scl.data)
+        return num_samples
@@ -0,0 +1,196 @@
+import math
+from typing import List, Optional
+
+import numpy as np
+
+from i2c_dissector import I2cTransactionTable
+
+class I2cBusTimeline:
+    """
+    Bus load and SCL frequency over time, for any window size.
+
+    The transactions and SCL edges are turned into cumulative sums once (busy
+    time, transactions, data bytes, NACKs, SCL cycles), the counts of a window
+    are the differences at its borders. So a window of any size costs a few
+    binary searches, independent of its length.
+
+    For the overview, the counts of a fine grid of windows over the whole
+    capture are merged pairwise into a pyramid of coarser levels (window sizes
+    doubling from level to level). A view of a time range at a given number of
+    points is sliced from the right level, so its cost depends on the number
+    of points only. Views finer than the finest level are computed from the
+    cumulative sums directly.
+
+    Per window:
+    * utilization: fraction of the window the bus is busy (START to STOP)
+    * transactions_per_s, bytes_per_s: transactions and data bytes (without the
+      address byte) starting in the window, per second
+    * nack_rate: fraction of the address bytes and written data bytes that were
+      not acknowledged (the controller NACKs the last byte it reads on purpose)
+    * scl_frequency: SCL cycles per busy time [Hz], includes clock stretching
+    """
+    QUANTITIES = ("utilization", "transactions_per_s", "bytes_per_s", "nack_rate", "scl_frequency")
+
+    def __init__(self, table: I2cTransactionTable, t_start: Optional[float] = None, t_end: Optional[float] = None,
+                 min_width: float = 1e-6, max_bins: int = 1 << 16) -> None:
+        """
+        Args:
+            table: Decoded transactions
+            t_start: Start of the capture [s], None for the start of the SCL waveform
+            t_end: End of the capture [s], None for the end of the SCL waveform
+            min_width: Window size of the finest pyramid level [s], if the capture is short enough
+            max_bins: Maximum number of windows of the finest pyramid level
+        """
+        self.table = table
+        analyzer = table.analyzer
+        scl = analyzer.scl_data.transitions
+        awf = analyzer.scl_data.awf
+        self.t_start = awf.time_offset if t_start is None else t_start
+        self.t_end = awf.time_at_index(len(awf.data)) if t_end is None else t_end
+
+        start, end = table.time_spans()
+        found = np.flatnonzero(~np.isnan(start))
+        start, end = start[found], end[found]
+
+        # events are counted at the start of their transaction
+        self._event_time = start
+        data_bytes = np.maximum(table.byte_count[found] - 1, 0)
+        self._bytes = np.concatenate(([0], np.cumsum(data_bytes)))
+        # address NACKs and NACKed bytes of writes, ACKs of reads are the controller's
+        checked = table.byte_target_ack
+        nacks = np.bincount(table.byte_row[checked & ~table.byte_ack], minlength=len(table))[found]
+        acknowledgeable = np.bincount(table.byte_row[checked], minlength=len(table))[found]
+        self._nacks = np.concatenate(([0], np.cumsum(nacks)))
+        self._acknowledgeable = np.concatenate(([0], np.cumsum(acknowledgeable)))
+
+        # busy intervals, a repeated START is shared by two transactions
+        if len(start) > 0:
+            start = np.maximum(start, np.concatenate(([-math.inf], np.maximum.accumulate(end)[:-1])))
+            end = np.maximum(end, start)
+        self._busy_start = start
+        self._busy_end = end
+        self._busy_before = np.concatenate(([0.0], np.cumsum(end - start)))
+
+        self._scl_cycles = scl.t1[scl.pos_rising]
+
+        # finest level, then merged pairwise up to a single window
+        duration = self.t_end - self.t_start
+        width = max(min_width, duration / max_bins)
+        bins = max(int(math.ceil(duration / width)), 1)
+        self.levels: List[tuple] = []
+        """Pyramid levels (window size [s], counts of the windows from t_start on, see counts())"""
+        counts = self.counts(self.t_start + np.arange(bins + 1) * width)
+        while True:
+            self.levels.append((width, counts))
+            if len(counts["busy_time"]) <= 1:
+                break
+            width *= 2
+            counts = { name : np.add.reduceat(values, np.arange(0, len(values), 2)) for name, values in counts.items() }
+
+    def _busy_time(self, t: np.ndarray) -> np.ndarray:
+        """Busy time from the start of the capture to t."""
+        if len(self._busy_start) == 0:
+            return np.zeros(len(t))
+        k = np.searchsorted(self._busy_start, t, side="right") - 1
+        i = np.maximum(k, 0)
+        busy = self._busy_before[i] + np.clip(t - self._busy_start[i], 0, self._busy_end[i] - self._busy_start[i])
+        return np.where(k >= 0, busy, 0.0)
+
+    def counts(self, edges: np.ndarray) -> dict:
+        """
+        Get the counts of windows, exactly, from the cumulative sums.
+
+        Args:
+            edges: Borders of the windows [s], ascending, window i is edges[i] to edges[i + 1]
+
+        Returns:
+            Name -> array of counts per window: busy_time [s], transactions, bytes, nacks,
+            acknowledgeable (bytes the NACK rate refers to), scl_cycles
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+        events = np.searchsorted(self._event_time, edges, side="left")
+        return {
+            "busy_time" : np.diff(self._busy_time(edges)),
+            "transactions" : np.diff(events),
+            "bytes" : np.diff(self._bytes[events]),
+            "nacks" : np.diff(self._nacks[events]),
+            "acknowledgeable" : np.diff(self._acknowledgeable[events]),
+            "scl_cycles" : np.diff(np.searchsorted(self._scl_cycles, edges, side="left")),
+        }
+
+    @staticmethod
+    def rates(counts: dict, width) -> dict:
+        """
+        Get the quantities (QUANTITIES) of windows from their counts.
+
+        Args:
+            counts: See counts()
+            width: Size of the windows [s]
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "utilization" : counts["busy_time"] / width,
+                "transactions_per_s" : counts["transactions"] / width,
+                "bytes_per_s" : counts["bytes"] / width,
+                "nack_rate" : np.where(counts["acknowledgeable"] > 0, counts["nacks"] / counts["acknowledgeable"], np.nan),
+                "scl_frequency" : np.where(counts["busy_time"] > 0, counts["scl_cycles"] / counts["busy_time"], np.nan),
+            }
+
+    def windows(self, width: float, t_start: Optional[float] = None, t_end: Optional[float] = None) -> dict:
+        """
+        Get the quantities of windows of any size, computed from the cumulative sums.
+
+        Args:
+            width: Window size [s]
+            t_start: Start of the first window [s], None for the start of the capture
+            t_end: End of the time range [s], None for the end of the capture
+
+        Returns:
+            { "time" : start of every window, "width" : width, quantity : values, ... }
+        """
+        t_start = self.t_start if t_start is None else t_start
+        t_end = self.t_end if t_end is None else t_end
+        edges = t_start + np.arange(max(int(math.ceil((t_end - t_start) / width)), 1) + 1) * width
+        return dict(time=edges[:-1], width=width, **self.rates(self.counts(edges), width))
+
+    def view(self, t_start: Optional[float] = None, t_end: Optional[float] = None, points: int = 1000) -> dict:
+        """
+        Get a time range at about the given number of points, sliced from the pyramid.
+
+        The windows are the ones of the finest level with at most as many windows in
+        the range as points. If even the finest level is too coarse, the windows are
+        computed from the cumulative sums.
+
+        Returns:
+            See windows()
+        """
+        t_start = self.t_start if t_start is None else t_start
+        t_end = self.t_end if t_end is None else t_end
+        wanted = (t_end - t_start) / points
+        if wanted < self.levels[0][0]:
+            return self.windows(wanted, t_start, t_end)
+
+        width, counts = next((level for level in self.levels if level[0] >= wanted), self.levels[-1])
+        first = max(int(math.floor((t_start - self.t_start) / width)), 0)
+        last = int(math.ceil((t_end - self.t_start) / width))
+        counts = { name : values[first:last] for name, values in counts.items() }
+        time = self.t_start + (first + np.arange(len(counts["busy_time"]))) * width
+        return dict(time=time, width=width, **self.rates(counts, width))
+
+    def serialize(self, max_windows: int = 4096) -> dict:
+        """
+        Levels of the pyramid with at most max_windows windows.
+
+        Returns:
+            { "start" : t_start, "end" : t_end, "levels" : [{ "width" : window size [s], quantity : values, ... }, ...] },
+            NaN (no bytes or no busy time in a window) as None
+        """
+        levels = []
+        for width, counts in self.levels:
+            if len(counts["busy_time"]) > max_windows:
+                continue
+            level = { "width" : width }
+            for name, values in self.rates(counts, width).items():
+                level[name] = [None if math.isnan(value) else value for value in values.tolist()]
+            levels.append(level)
+        return { "start" : self.t_start, "end" : self.t_end, "levels" : levels }
@@ -1,12 +1,206 @@
 import numpy as np
-import math
-import statistics
+import os
+import matplotlib
 import matplotlib.pyplot as plt
-from matplotlib.colors import PowerNorm
+from matplotlib.figure import Figure
+from matplotlib.colors import PowerNorm, to_rgba
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 from simplestats import Simplestats
 from waveforms import DigitalWaveform, RisingEdge, FallingEdge
 
+def draw_density(figure, counts, x_bins, y_bins, title = None):
+    """
+    Draw a graded display (eye diagram, crosstalk) of a 2D histogram.
+
+    Args:
+        figure: Figure to draw into
+        counts: Histogram, indexed [x, y]
+        x_bins: Bin edges of the time axis [µs]
+        y_bins: Bin edges of the voltage axis [V]
+        title: Title of the plot
+
+    Returns:
+        The axis
+    """
+    axis = figure.add_subplot()
+
+    # Transpose the histogram for correct orientation in imshow
+    im = axis.imshow(counts.T, extent=[x_bins[0], x_bins[-1], y_bins[0], y_bins[-1]],
+            origin='lower', aspect='auto', cmap='inferno', norm=PowerNorm(gamma=0.3))
+    #cmap: hot, plasma, inferno
+    figure.colorbar(im, ax=axis, label='Sample Density')
+    axis.set_xlabel('Time [µs]')
+    axis.set_ylabel('Amplitude [V]')
+    if title is not None:
+        axis.set_title(title)
+    return axis
+
+def draw_transitiontime(figure, signal, histograms):
+    """
+    Draw the transition time histograms of all devices, falling edges left, rising edges right.
+
+    Args:
+        figure: Figure to draw into
+        signal: Name of the signal
+        histograms: See I2cTransitiontime.histograms()
+
+    Returns:
+        The axes
+    """
+    axes = figure.subplots(1, 2)
+    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+
+    for what, plt_axis in (("fall", axes[0]), ("rise", axes[1])):
+        bins, devices = histograms[what]
+        for i, (address, counts) in enumerate(devices):
+            color = to_rgba(colors[i % len(colors)], 0x60 / 255)
+            plt_axis.hist(bins[:-1], bins, weights=counts, color=color, label=f"Addr 0x{address:02X}, {counts.sum()} edges")
+
+        if what == "rise":
+            meh = "from low to high"
+            slope = "rising"
+        else:
+            meh = "from high to low"
+            slope = "falling"
+
+        plt_axis.set_xlabel(f'Transition time {meh} [ns]')
+        plt_axis.set_ylabel('Count')
+        plt_axis.legend()
+        plt_axis.title.set_text(f"{signal} {slope} edge transition time")
+    return axes
+
+def draw_timeline(figure, timeline):
+    """
+    Draw the bus load and SCL frequency over time.
+
+    Args:
+        figure: Figure to draw into
+        timeline: Windows of the capture, see I2cBusTimeline.view()
+
+    Returns:
+        The axes
+    """
+    axes = figure.subplots(4, 1, sharex=True)
+    time = timeline["time"]
+    plots = (
+        (axes[0], "utilization", 100, "Bus load [%]"),
+        (axes[1], "transactions_per_s", 1, "Transactions/s"),
+        (axes[2], "nack_rate", 100, "NACK rate [%]"),
+        (axes[3], "scl_frequency", 1e-3, "f_SCL [kHz]"),
+    )
+    for plt_axis, name, scale, label in plots:
+        plt_axis.step(time, timeline[name] * scale, where="post", linewidth=0.8)
+        plt_axis.set_ylabel(label)
+        plt_axis.grid(True, alpha=0.3)
+
+    bytes_axis = axes[1].twinx()
+    bytes_axis.step(time, timeline["bytes_per_s"], where="post", linewidth=0.8, color="tab:orange")
+    bytes_axis.set_ylabel("Bytes/s")
+
+    axes[0].set_title(f"Bus timeline ({timeline['width'] * 1e3:.3g} ms windows)")
+    axes[-1].set_xlabel("Time [s]")
+    return axes
+
+def _init_render_worker():
+    matplotlib.use("Agg")
+
+def _render_figure(filename, size, draw, args):
+    figure = Figure(figsize=size)
+    try:
+        draw(figure, *args)
+        figure.savefig(filename, format="png")
+    finally:
+        figure.clear()
+    return filename
+
+class FigureRenderer:
+    """
+    Renders figures to PNG files, headless and optionally in a process pool.
+
+    The figures are described by a draw function (e.g. draw_density) and its
+    precomputed arguments (histograms), so only small arrays are sent to the
+    workers. The figures are not registered with pyplot and are cleared right
+    after saving.
+    """
+    def __init__(self) -> None:
+        self.jobs = []
+
+    def add(self, filename: str, draw, *args, size = (8, 6)) -> None:
+        """
+        Queue a figure.
+
+        Args:
+            filename: PNG file to save the figure as
+            draw: Module level function draw(figure, *args)
+            args: Arguments of draw
+            size: Figure size in inches
+        """
+        self.jobs.append((filename, size, draw, args))
+
+    def run(self, processes = None, mp_context = None) -> List[str]:
+        """
+        Render all queued figures.
+
+        Args:
+            processes: Number of worker processes, default: number of CPUs, 1 renders in this process
+            mp_context: multiprocessing context for the process pool
+
+        Returns:
+            Filenames of the saved figures
+        """
+        jobs = self.jobs
+        self.jobs = []
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(jobs))
+
+        if processes <= 1:
+            return [_render_figure(*job) for job in jobs]
+
+        with ProcessPoolExecutor(max_workers=processes, mp_context=mp_context, initializer=_init_render_worker) as pool:
+            return list(pool.map(_render_figure, *zip(*jobs)))
+
+class EyeHistogram:
+    """
+    2D histogram (time x voltage) that samples are binned into as they come.
+
+    The count grid is allocated once, so the memory usage doesn't depend on the
+    number of samples. The binning is the same as the one of np.histogram2d().
+    """
+    def __init__(self, x_bins, y_bins) -> None:
+        """
+        Args:
+            x_bins: Bin edges of the time axis
+            y_bins: Bin edges of the voltage axis
+        """
+        self.x_bins = np.asarray(x_bins, dtype=np.float64)
+        self.y_bins = np.asarray(y_bins, dtype=np.float64)
+        self.counts = np.zeros((len(self.x_bins) - 1, len(self.y_bins) - 1), dtype=np.int64)
+        """Number of samples per bin, indexed [x, y]"""
+
+    @staticmethod
+    def _bin(edges, values):
+        # like np.histogramdd: right-open bins, except for the last one
+        index = np.searchsorted(edges, values, side="right")
+        index[values == edges[-1]] -= 1
+        return index - 1
+
+    def add(self, x, y) -> None:
+        """Bin the samples (x[i], y[i])."""
+        ix = self._bin(self.x_bins, x)
+        iy = self._bin(self.y_bins, y)
+        nx, ny = self.counts.shape
+        valid = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        self.counts += np.bincount(ix[valid] * ny + iy[valid], minlength=nx * ny).reshape(nx, ny)
+
 class I2cBitInfo:
+    BLOCK_SIZE = 4096
+    """Number of bits binned at once"""
+
+    LEVEL_BINS = 1 << 16
+    """Number of bins of the voltage histogram used for the level statistics (-v_bus...2 * v_bus)"""
+
     def __init__(self, bits, v_bus, dw_scl, dw_sda):
         self.bits = bits
 
@@ -15,46 +209,72 @@ class I2cBitInfo:
         self.figure = None
         self.axis = None
 
-        self.x_data = np.array([])
-        self.y_data = np.array([])
-
-        for bit in self.bits:
-            i = bit.index
-            #if bit.sda_value is not True: # level of SDA to be shown
-            #    continue
-            tr_next = dw_scl.next_from_index(i, True)
-            di = tr_next.slope_prev.i_end - i
-            i_start = math.floor(i - di)
-            i_end = math.ceil(i + di)
-
-            awf = dw_sda.awf
-
-            pts = awf.get_range_index(i_start, i_end)
-            t = [(x * awf.time_interval + awf.time_offset - awf.time_at_index(i)) * 1e6 for x in list(range(i_start, i_end + 1))]
+        self.dw_scl = dw_scl
+        self.dw_sda = dw_sda
 
-            self.x_data = np.append(self.x_data, t)
-            self.y_data = np.append(self.y_data, pts)
-
-    def draw_plot(self, size_x = 8, size_y = 6):
-        # Create a 2D histogram of the data
         # Adjust bins for resolution and range to your data
-        x_bins = np.linspace(-1.5, 1.5, 250)
-        y_bins = np.linspace(-0.5, self.v_bus + 1, 400)
-        hist, x_edges, y_edges = np.histogram2d(self.x_data, self.y_data, bins=[x_bins, y_bins])
-
-        # Transpose the histogram for correct orientation in imshow
-        hist = hist.T
+        self.histogram = EyeHistogram(np.linspace(-1.5, 1.5, 250), np.linspace(-0.5, self.v_bus + 1, 400))
+
+        # all samples of the windows, much finer than the eye diagram for info()
+        self.level_bins = np.linspace(-self.v_bus, 2 * self.v_bus, self.LEVEL_BINS + 1)
+        self.level_counts = np.zeros(self.LEVEL_BINS, dtype=np.int64)
+        self.v_min = None
+        self.v_max = None
+
+        bin_width = self.level_bins[1] - self.level_bins[0]
+        for x, y in self._windows():
+            self.histogram.add(x, y)
+
+            if len(y) == 0:
+                continue
+            y = y.astype(np.float64)
+            index = np.clip(np.floor((y - self.level_bins[0]) / bin_width), 0, self.LEVEL_BINS - 1).astype(np.int64)
+            self.level_counts += np.bincount(index, minlength=self.LEVEL_BINS)
+            self.v_min = y.min() if self.v_min is None else min(self.v_min, y.min())
+            self.v_max = y.max() if self.v_max is None else max(self.v_max, y.max())
+
+    def _windows(self):
+        """
+        Get the SDA samples around the bits, a block of bits at a time.
+
+        The window of a bit is centered around the rising SCL edge and is as wide as
+        the SCL high time before and after it.
+
+        Yields:
+            Time relative to the SCL edge [µs] and voltage of the samples
+        """
+        scl = self.dw_scl.transitions
+        awf = self.dw_sda.awf
+
+        index = np.fromiter((bit.index for bit in self.bits), dtype=np.float64, count=len(self.bits))
+
+        # the falling edge before the next rising edge ends the high time
+        next_rising = np.searchsorted(scl.i_end_rising, index, side="right")
+        valid = next_rising < len(scl.i_end_rising)
+        index = index[valid]
+        fall = scl.pos_rising[next_rising[valid]] - 1
+        valid = fall >= 0
+        index = index[valid]
+        di = scl.i_end[fall[valid]] - index
+
+        i_start = np.maximum(np.floor(index - di).astype(np.int64), 0)
+        i_end = np.minimum(np.ceil(index + di).astype(np.int64), len(awf.data) - 1)
+
+        for block in range(0, len(index), self.BLOCK_SIZE):
+            starts = i_start[block:block + self.BLOCK_SIZE]
+            lengths = np.maximum(i_end[block:block + self.BLOCK_SIZE] - starts + 1, 0)
+            # sample indices of all windows of the block, one after the other
+            offsets = np.cumsum(lengths) - lengths
+            sample = np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+            center = np.repeat(index[block:block + self.BLOCK_SIZE], lengths)
+
+            t = (sample * awf.time_interval + awf.time_offset - awf.time_at_index(center)) * 1e6
+            yield t, awf.data[sample]
 
+    def draw_plot(self, size_x = 8, size_y = 6):
         # Plot the graded display
         self.figure = plt.figure(figsize=(size_x, size_y))
-        self.axis = self.figure.add_subplot()
-
-        im = plt.imshow(hist, extent=[x_bins[0], x_bins[-1], y_bins[0], y_bins[-1]],
-                origin='lower', aspect='auto', cmap='inferno', norm=PowerNorm(gamma=0.3))
-        #cmap: hot, plasma, inferno
-        self.figure.colorbar(im, label='Sample Density')
-        self.axis.set_xlabel('Time [µs]')
-        self.axis.set_ylabel('Amplitude [V]')
+        self.axis = draw_density(self.figure, self.histogram.counts, self.histogram.x_bins, self.histogram.y_bins)
         #plt.savefig("density.svg", format="svg")
         #plt.show()
 
@@ -62,7 +282,15 @@ class I2cBitInfo:
 
 
     def info(self):
-        stats = Simplestats(self.y_data)
+        """
+        Voltage statistics of the bits, taken from the level histogram.
+
+        Minimum and maximum are exact. Levels are found on the same grid as with
+        the raw samples, counts can differ by the samples of the bins at the level
+        window borders and standard deviations by about the bin width
+        (v_bus * 3 / LEVEL_BINS).
+        """
+        stats = Simplestats.from_histogram(self.level_counts, self.level_bins, self.v_min, self.v_max)
         lvlinfo = stats.level_info()
 
         info = {
@@ -102,6 +330,9 @@ class I2cBitInfo:
         return info
     
 class I2cCrosstalk:
+    BLOCK_SIZE = 16384
+    """Number of aggressor edges whose windows are gathered at once"""
+
     def __init__(self, aggressor: DigitalWaveform, rising_edge: bool, victim: DigitalWaveform, v_bus, title: str = None):
         self.aggressor = aggressor
         self.rising_edge = rising_edge
@@ -112,46 +343,40 @@ class I2cCrosstalk:
         self.figure = None
         self.axis = None
 
-    def draw_plot(self, size_x = 8, size_y = 6):
-        slopes = list(filter(lambda o: o.slope == self.rising_edge, self.aggressor.transitions))
+    def histogram(self) -> EyeHistogram:
+        """Victim samples around the aggressor edges, relative to the middle of the edges."""
+        edges = self.aggressor.transitions
+        pos = edges.pos_rising if self.rising_edge else edges.pos_falling
 
-        t_tr = statistics.median(map(lambda o: o.transition_time, slopes)) * 5
+        t_tr = np.median(edges.transition_time[pos]) * 5
 
         awf = self.victim.awf
 
-        x_data = np.array([])
-        y_data = np.array([])
-
-        for slope in slopes:
-            t_ref = (slope.t2 + slope.t1) / 2
-            i_start = math.floor(awf.index_at_time(t_ref - t_tr))
-            i_end = math.ceil(awf.index_at_time(t_ref + t_tr))
-
-            pts = awf.get_range_index(i_start, i_end)
-            #t = [(awf.time_offset + x * awf.time_interval - (t_ref + slope.transition_time)) * 1e6 for x in list(range(i_start, i_end+1))]
-            t = [(awf.time_offset + x * awf.time_interval - t_ref) * 1e6 for x in list(range(i_start, i_end+1))]
-
-            x_data = np.append(x_data, t)
-            y_data = np.append(y_data, pts)
+        t_ref = (edges.t2[pos] + edges.t1[pos]) / 2
+        i_start = np.floor(awf.index_at_time(t_ref - t_tr)).astype(np.int64)
+        i_end = np.ceil(awf.index_at_time(t_ref + t_tr)).astype(np.int64)
 
         x_bins = np.linspace(-1, 1, 250)
         y_bins = np.linspace(-0.5, self.v_bus + 1, 400)
-        hist, x_edges, y_edges = np.histogram2d(x_data, y_data, bins=[x_bins, y_bins])
+        histogram = EyeHistogram(x_bins, y_bins)
+
+        # all windows at once as rows of an index matrix, padded to the longest one
+        width = int((i_end - i_start).max(initial=-1)) + 1
+        for block in range(0, len(pos), self.BLOCK_SIZE):
+            starts = i_start[block:block + self.BLOCK_SIZE]
+            sample = starts[:, None] + np.arange(width)
+            valid = sample <= i_end[block:block + self.BLOCK_SIZE, None]
+            sample = sample[valid]
+            t = (awf.time_offset + sample * awf.time_interval - np.broadcast_to(t_ref[block:block + self.BLOCK_SIZE, None], valid.shape)[valid]) * 1e6
+            histogram.add(t, awf.data[sample])
 
-        # Transpose the histogram for correct orientation in imshow
-        hist = hist.T
+        return histogram
+
+    def draw_plot(self, size_x = 8, size_y = 6):
+        histogram = self.histogram()
 
         self.figure = plt.figure(figsize=(size_x, size_y))
-        self.axis = self.figure.add_subplot()
-        #
-        im = self.axis.imshow(hist, extent=[x_bins[0], x_bins[-1], y_bins[0], y_bins[-1]],
-                origin='lower', aspect='auto', cmap='inferno', norm=PowerNorm(gamma=0.3))
-        #cmap: hot, plasma, inferno
-        self.figure.colorbar(im, label='Sample Density')
-        self.axis.set_xlabel('Time [µs]')
-        self.axis.set_ylabel('Amplitude [V]')
-        if self.title is not None:
-            self.axis.set_title(self.title)
+        self.axis = draw_density(self.figure, histogram.counts, histogram.x_bins, histogram.y_bins, self.title)
         #plt.show()
         return self.figure
 
@@ -190,38 +415,29 @@ class I2cTransitiontime:
             
             self.data.append(tmp)
 
-    def draw_plot(self, bin_width: float = 0.1):
-        #bin_width = 0.0001 # bin width in ns
-        # this implementation is dirty
+    def histograms(self, bin_width: float = 0.1):
+        """
+        Histograms of the transition times of every device.
 
-        def make_diagram(what, plt_axis, bin_width: float = 0.0001):
+        Args:
+            bin_width: Bin width [ns]
 
+        Returns:
+            { "fall" : (bins, [(address, counts), ...]), "rise" : ... }, the bins are the same for all devices
+        """
+        result = {}
+        for what in ("fall", "rise"):
             bins = np.arange(min(self.data_all[what]), max(self.data_all[what]) + bin_width, bin_width)
+            result[what] = (bins, [(item["address"], np.histogram(item[what], bins)[0]) for item in self.data])
+        return result
 
-            #data_weights = np.ones(len(data_all[what])) / len(data_all[what]) * 100
-            for i, item in enumerate(self.data):
-                color = plt.rcParams['axes.prop_cycle'].by_key()['color'][i] + "60"
-
-                plt_axis.hist(item[what], bins, color=color, label=f"Addr 0x{item['address']:02X}, {len(item[what])} edges")
-
-            if what == "rise":
-                meh = "from low to high"
-                slope = "rising"
-            else:
-                meh = "from high to low"
-                slope = "falling"
-
-            plt_axis.set_xlabel(f'Transition time {meh} [ns]')
-            plt_axis.set_ylabel('Count')
-            plt_axis.legend()
-            plt_axis.title.set_text(f"{'SCL' if self.scl is True else 'SDA'} {slope} edge transition time")
-
+    @property
+    def figsize(self):
         px = 1 / plt.rcParams['figure.dpi']
-        self.figure, self.axis = plt.subplots(1, 2, figsize=(640 * 2 * px, 480 * px))
+        return (640 * 2 * px, 480 * px)
 
-        make_diagram("fall", self.axis[0], bin_width)
-        make_diagram("rise", self.axis[1], bin_width)
+    def draw_plot(self, bin_width: float = 0.1):
+        self.figure = plt.figure(figsize=self.figsize)
+        self.axis = draw_transitiontime(self.figure, 'SCL' if self.scl is True else 'SDA', self.histograms(bin_width))
 
         return self.figure
-
-        
\ No newline at end of file
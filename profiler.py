@@ -0,0 +1,122 @@
+import cProfile
+import fnmatch
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident set size of this process (Linux only).
+
+    Returns:
+        Whether the peak could be reset, otherwise it is the peak since the start of the process
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes, None if unknown."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # kB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+class StageProfiler:
+    """
+    Records wall time, CPU time, peak memory and item counts of named stages.
+
+    Stages are consecutive, not nested. The CPU time includes worker processes
+    that ended within the stage (e.g. process pools), the peak memory is the
+    resident set size of this process only.
+
+    Optionally, stages matching a pattern are run under cProfile and the
+    statistics are dumped to a file per stage (readable with pstats or snakeviz).
+    """
+    def __init__(self, cprofile_pattern: Optional[str] = None, cprofile_directory: str = ".") -> None:
+        """
+        Args:
+            cprofile_pattern: Stage names to profile with cProfile (fnmatch pattern, e.g. "bitstats*"), None for none
+            cprofile_directory: Directory of the profile_<stage>.prof files
+        """
+        self.cprofile_pattern = cprofile_pattern
+        self.cprofile_directory = cprofile_directory
+        self.stages: List[dict] = []
+
+    @staticmethod
+    def _cpu_time() -> float:
+        t = os.times()
+        return time.process_time() + t.children_user + t.children_system
+
+    @contextmanager
+    def stage(self, name: str, **counts):
+        """
+        Record a stage.
+
+        Args:
+            name: Name of the stage
+            counts: Item counts known in advance (e.g. samples=...)
+
+        Yields:
+            The counts of the stage, add the counts known at the end (e.g. counts["edges"] = ...)
+        """
+        record = {
+            "name" : name,
+            "wall_time" : None,
+            "cpu_time" : None,
+            "peak_rss" : None,
+            "counts" : dict(counts),
+        }
+        self.stages.append(record)
+
+        profile = None
+        if self.cprofile_pattern is not None and fnmatch.fnmatchcase(name, self.cprofile_pattern):
+            profile = cProfile.Profile()
+
+        reset_peak_rss()
+        cpu0 = self._cpu_time()
+        t0 = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record["counts"]
+        finally:
+            if profile is not None:
+                profile.disable()
+            record["wall_time"] = time.perf_counter() - t0
+            record["cpu_time"] = self._cpu_time() - cpu0
+            record["peak_rss"] = peak_rss()
+            if profile is not None:
+                filename = os.path.join(self.cprofile_directory, f"profile_{name}.prof")
+                profile.dump_stats(filename)
+                record["cprofile"] = filename
+
+    def serialize(self) -> List[dict]:
+        return self.stages
+
+    def table(self) -> List[str]:
+        """Lines of a human readable summary."""
+        lines = ["  stage                            wall [s]    CPU [s]   peak RSS [MB]   counts"]
+        for record in self.stages:
+            counts = ", ".join(f"{key}={value}" for key, value in record["counts"].items())
+            rss = "---" if record["peak_rss"] is None else f"{record['peak_rss'] / 2**20:.1f}"
+            lines.append(f"  {record['name']:<30} {record['wall_time']:>10.3f} {record['cpu_time']:>10.3f} {rss:>15}   {counts}")
+        return lines
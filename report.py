@@ -1,8 +1,15 @@
 from waveforms import *
 from i2c_dissector import *
+from analysiscache import AnalysisCache
+from profiler import StageProfiler
+from i2ccompliance import I2cCompliance, MODES
+from i2ctimeline import I2cBusTimeline
 import json
 import argparse
+import multiprocessing
 import os
+import matplotlib
+matplotlib.use("Agg") # figures are only saved as files
 
 p = argparse.ArgumentParser(description="Creates a I2C analysis report")
 p.add_argument("-vbus", "--bus_voltage", type=float, default=5, help="Nominal voltage of the I2C bus (default: %(default)s)")
@@ -13,6 +20,15 @@ p.add_argument("-f", "--filetype", type=str, required=True, choices=["saleae_bin
     "For saleae_bin, 2 arguments: SCL file, SDA file."
     "For saleae_csv, 3 arguments: CSV file, SCL column, SDA column (both column numbers are 0-based)."
 ]))
+p.add_argument("-cs", "--chunk_size", type=int, default=None, help="Digitize and decode uncompressed saleae_bin files (.bin) in chunks of this many samples to bound the memory usage (default: whole capture at once)")
+p.add_argument("-j", "--jobs", type=int, default=None, help="Digitize and decode in this many processes, the capture is split at bus-idle gaps (default: single process). Also the number of processes rendering the figures (default: number of CPUs)")
+p.add_argument("-sw", "--sweep", type=str, default=None, help="Instead of creating the report, digitize and decode with these low:high threshold pairs in percent (e.g. 30:70,20:80) and compare the results in sweep.json")
+p.add_argument("-nc", "--no_cache", action="store_true", help="Don't use the cache of edges and transactions next to the capture files")
+p.add_argument("-rc", "--rebuild_cache", action="store_true", help="Ignore the cached edges and transactions of the capture and analyze it again")
+p.add_argument("--cache_size", type=int, default=512, help="Maximum size of the cache in MB, the least recently used entries are deleted (default: %(default)s)")
+p.add_argument("-p", "--profile", type=str, default=None, help="Run the stages matching this pattern (e.g. get_transactions, bitstats*) under cProfile and save the statistics as profile_<stage>.prof")
+p.add_argument("--no_minmax", action="store_true", help="Don't save the min/max pyramids of the waveforms (scl.minmax, sda.minmax) for viewers")
+p.add_argument("-m", "--mode", type=str, default=None, choices=list(MODES), help="Bus mode to check the timing against (UM10204), default: the mode closest to the measured SCL frequency")
 p.add_argument('rest', nargs=argparse.REMAINDER)
 
 try:
@@ -24,12 +40,28 @@ except:
 assert args.bus_voltage > 0, "Bus voltage must be > 0 V"
 assert 0 < args.threshold_low < args.threshold_high, "Low threshold must be between 0 % and high threshold"
 assert args.threshold_low < args.threshold_high < 100, "High threshold must be between low threshold and 100 %"
+assert args.chunk_size is None or args.chunk_size > 0, "Chunk size must be > 0"
+assert args.chunk_size is None or args.filetype == "saleae_bin", "Chunked processing is only supported for saleae_bin"
+assert args.jobs is None or args.jobs > 0, "Number of jobs must be > 0"
+assert args.jobs is None or args.chunk_size is None, "Chunked and parallel processing can't be combined"
+assert args.sweep is None or args.chunk_size is None, "Chunked processing and threshold sweeps can't be combined"
+
+sweep_thresholds = None
+if args.sweep is not None:
+    try:
+        sweep_thresholds = [tuple(float(v) for v in pair.split(":")) for pair in args.sweep.split(",")]
+    except ValueError:
+        sweep_thresholds = []
+    assert len(sweep_thresholds) > 0 and all(len(pair) == 2 and 0 < pair[0] < pair[1] < 100 for pair in sweep_thresholds), "Sweep thresholds must be low:high pairs with 0 % < low < high < 100 %"
 
 v_bus = args.bus_voltage
 v_lo = v_bus * args.threshold_low / 100
 v_hi = v_bus * args.threshold_high / 100
 
 
+# wall time, CPU time, memory and item counts of every stage end up in report.json
+profiler = StageProfiler(args.profile)
+
 print("Loading waveforms")
 
 aw_scl = None
@@ -49,29 +81,55 @@ def file_load_saleae_bin(filename):
         print("File type not supported (yet)")
         exit(-1)
 
-if args.filetype == "saleae_bin":
-    assert len(args.rest) == 2, "2 arguments (SCL file, SDA file) expected"
-    scl_file = args.rest[0]
-    sda_file = args.rest[1]
-    aw_scl = file_load_saleae_bin(scl_file)
-    aw_sda = file_load_saleae_bin(sda_file)
-elif args.filetype == "saleae_csv":
-    assert len(args.rest) == 3, "3 arguments (file, SCL column, SDA column) expected"
-    filename = args.rest[0]
-    scl_col = int(args.rest[1])
-    sda_col = int(args.rest[2])
-
-    scl_file = f"{filename}:{scl_col}"
-    sda_file = f"{filename}:{sda_col}"
-
-    aws = AnalogWaveform.from_saleae_csv(filename)
-    assert len(aws) >= 2, "2 or more columns in file expected, less found."
-
-    aw_scl = aws[scl_col]
-    aw_sda = aws[sda_col]
-else:
-    print("You should not be able to see this.")
-    exit()
+def file_open_saleae_bin_stream(filename, chunk_size):
+    if not os.path.exists(filename):
+        print(f"file '{filename}' could not be found.")
+        return None
+    fnlower = filename.lower()
+
+    if fnlower.endswith(".bin"):
+        return SaleaeBinStream(filename, False, chunk_size)
+    elif fnlower.endswith(".bin.gz"):
+        # the eye diagrams, crosstalk and min/max pyramids need the whole capture afterwards,
+        # only uncompressed files can be memory-mapped for that instead of being read into RAM
+        print(f"Chunked processing needs uncompressed .bin files, '{filename}' is gzip compressed (decompress it with gunzip first).")
+        exit(-1)
+    else:
+        print("File type not supported (yet)")
+        exit(-1)
+
+with profiler.stage("load") as counts:
+    if args.filetype == "saleae_bin":
+        assert len(args.rest) == 2, "2 arguments (SCL file, SDA file) expected"
+        scl_file = args.rest[0]
+        sda_file = args.rest[1]
+        input_files = [scl_file, sda_file]
+        cache_extra = ()
+        if args.chunk_size is None:
+            aw_scl = file_load_saleae_bin(scl_file)
+            aw_sda = file_load_saleae_bin(sda_file)
+        else:
+            # only the headers are read here, the samples are streamed while digitizing
+            aw_scl = file_open_saleae_bin_stream(scl_file, args.chunk_size)
+            aw_sda = file_open_saleae_bin_stream(sda_file, args.chunk_size)
+    elif args.filetype == "saleae_csv":
+        assert len(args.rest) == 3, "3 arguments (file, SCL column, SDA column) expected"
+        filename = args.rest[0]
+        scl_col = int(args.rest[1])
+        sda_col = int(args.rest[2])
+
+        scl_file = f"{filename}:{scl_col}"
+        sda_file = f"{filename}:{sda_col}"
+        input_files = [filename]
+        cache_extra = (scl_col, sda_col)
+
+        aw_scl, aw_sda = AnalogWaveform.from_saleae_csv(filename, [scl_col, sda_col])
+    else:
+        print("You should not be able to see this.")
+        exit()
+
+    if aw_scl is not None and aw_sda is not None:
+        counts["samples"] = len(aw_scl)
 
 if aw_scl is None or aw_sda is None:
     print("At least one waveform could not be loaded.")
@@ -91,6 +149,12 @@ data = {
     "bitstats" : [],
     "crosstalk" : [],
     "transitiontimes" : {},
+    "bittiming" : [],
+    "setuphold" : [],
+    "clockstretching" : None,
+    "compliance" : None,
+    "timeline" : None,
+    "minmax" : {},
 }
 
 if len(aw_sda) != len(aw_scl):
@@ -111,17 +175,111 @@ print(f"{len(aw_scl)} samples at {samplerate(aw_scl.time_interval)}")
 data["info"]["samples"] = len(aw_scl)
 data["info"]["samplerate"] = 1 / aw_scl.time_interval
 
+#region Threshold sweep
+if sweep_thresholds is not None:
+    print(f"Digitizing and decoding with {len(sweep_thresholds)} threshold pairs...")
+    print()
+    with profiler.stage("sweep", samples=len(aw_scl), thresholds=len(sweep_thresholds)):
+        sweep = I2cThresholdSweep(aw_sda, aw_scl, [(v_bus * lo / 100, v_bus * hi / 100) for lo, hi in sweep_thresholds])
+        data["sweep"] = sweep.summary()
+    data["profile"] = profiler.serialize()
+
+    def median_str(stats):
+        return "---" if stats["median"] is None else f"{stats['median']:.0f}"
+
+    print("   lo %    hi %   SCL edges   SDA edges   transactions   incomplete   addr NACKs   data NACKs   SCL rise/fall [ns]   SDA rise/fall [ns]")
+    for (lo, hi), item in zip(sweep_thresholds, data["sweep"]):
+        tt = item["transitiontimes"]
+        scl_str = f"{median_str(tt['scl']['rise'])} / {median_str(tt['scl']['fall'])}"
+        sda_str = f"{median_str(tt['sda']['rise'])} / {median_str(tt['sda']['fall'])}"
+        print(f"  {lo:>5.1f}   {hi:>5.1f}   {item['scl_edges']:>9}   {item['sda_edges']:>9}   {item['transactions']:>12}   {item['incomplete']:>10}"
+              f"   {item['addr_nacks']:>10}   {item['data_nacks']:>10}   {scl_str:>18}   {sda_str:>18}")
+    print("(transition times: median of all edges)")
+
+    with open("sweep.json", "w") as fp:
+        json.dump(data, fp)
+    print()
+    print("Results saved as 'sweep.json'")
+    exit(0)
+
 print(f"Resampling as digital waveforms. V_hi = {v_hi:.3f} V; V_lo = {v_lo:.3f} V. This may take a while...")
 print()
 
-dw_scl = DigitalWaveform(aw_scl, v_lo, v_hi)
-print(f"Found {len(dw_scl.transitions)} transitions on SCL")
-dw_sda = DigitalWaveform(aw_sda, v_lo, v_hi)
-print(f"Found {len(dw_sda.transitions)} transitions on SDA")
+# this script has no __main__ guard, so worker processes must not import it again
+mp_context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+
+ia = None
+if not args.no_cache:
+    # hashing the capture is part of looking up the cache
+    with profiler.stage("cache_load") as counts:
+        cache = AnalysisCache.next_to(input_files[0], args.cache_size << 20)
+        cache_key = cache.key(input_files, v_lo, v_hi, *cache_extra)
+        if args.rebuild_cache:
+            cache.invalidate(cache_key)
+        elif args.chunk_size is None:
+            ia = cache.load(cache_key, aw_sda, aw_scl, v_lo, v_hi)
+        elif (ia := cache.load(cache_key, aw_sda.waveform(), aw_scl.waveform(), v_lo, v_hi)) is not None:
+            aw_scl.close()
+            aw_sda.close()
+            ia.scl_data.awf = file_load_saleae_bin(scl_file)
+            ia.sda_data.awf = file_load_saleae_bin(sda_file)
+        counts["hit"] = ia is not None
+
+if ia is not None:
+    dw_scl = ia.scl_data
+    dw_sda = ia.sda_data
+    print(f"Loaded edges and transactions from '{cache.path(cache_key)}'")
+    print(f"Found {len(dw_scl.transitions)} transitions on SCL")
+    print(f"Found {len(dw_sda.transitions)} transitions on SDA")
+
+    print()
+elif args.jobs is not None:
+    with profiler.stage("digitize_decode_parallel", samples=len(aw_scl)) as counts:
+        ia = I2cParallelAnalyzer(aw_sda, aw_scl, v_lo, v_hi, processes=args.jobs, mp_context=mp_context)
+        ia.run()
+        counts["segments"] = len(ia.segments)
+    dw_scl = ia.scl_data
+    dw_sda = ia.sda_data
+    print(f"Found {len(dw_scl.transitions)} transitions on SCL")
+    print(f"Found {len(dw_sda.transitions)} transitions on SDA")
+    print(f"Processed {len(ia.segments)} segments in {ia.processes} processes")
+
+    print()
+elif args.chunk_size is None:
+    with profiler.stage("digitize_scl", samples=len(aw_scl)) as counts:
+        dw_scl = DigitalWaveform(aw_scl, v_lo, v_hi)
+        counts["edges"] = len(dw_scl.transitions)
+    print(f"Found {len(dw_scl.transitions)} transitions on SCL")
+    with profiler.stage("digitize_sda", samples=len(aw_sda)) as counts:
+        dw_sda = DigitalWaveform(aw_sda, v_lo, v_hi)
+        counts["edges"] = len(dw_sda.transitions)
+    print(f"Found {len(dw_sda.transitions)} transitions on SDA")
+
+    print()
+    ia = I2cAnalyzer(dw_sda, dw_scl)
+else:
+    with profiler.stage("digitize_decode_chunked", samples=len(aw_scl), chunk_size=args.chunk_size):
+        ia = I2cStreamAnalyzer(aw_sda.waveform(), aw_scl.waveform(), v_lo, v_hi)
+        with aw_scl, aw_sda:
+            ia.run(aw_sda, aw_scl)
+    dw_scl = ia.scl_data
+    dw_sda = ia.sda_data
+    print(f"Found {len(dw_scl.transitions)} transitions on SCL")
+    print(f"Found {len(dw_sda.transitions)} transitions on SDA")
+
+    # eye diagrams, crosstalk and the min/max pyramids need random access to the samples (memory-mapped)
+    dw_scl.awf = file_load_saleae_bin(scl_file)
+    dw_sda.awf = file_load_saleae_bin(sda_file)
 
-print()
-ia = I2cAnalyzer(dw_sda, dw_scl)
-transactions = ia.get_transactions()
+    print()
+
+with profiler.stage("get_transactions", scl_edges=len(dw_scl.transitions), sda_edges=len(dw_sda.transitions)) as counts:
+    transactions = ia.get_transactions()
+    counts["transactions"] = len(transactions)
+
+if not args.no_cache and not cache.path(cache_key).exists():
+    with profiler.stage("cache_store"):
+        cache.store(cache_key, ia)
 
 print(f"Found {len(transactions)} I2C transactions:")
 
@@ -136,40 +294,41 @@ data["bus"]["addresses"] = ttgroups
 #region Transactions
 print()
 print("== Transactions ==")
-for i, tr in enumerate(transactions):
-
-    data["transactions"].append({ 
-        "start" : None if tr.start_condition is None else tr.start_condition.serialize(),
-        "address" : None if tr.obj_address is None else tr.obj_address.serialize(),
-        "data" : [o.serialize() for o in tr.obj_data],
-        "stop" : None if tr.stop_condition is None else tr.stop_condition.serialize(),
-    })
-
-    s = f"  {i:>4} "
-    if (ts := tr.t_startcondition) is not None:
-        s += f"{ts:>10.6f}s"
-    else:
-        s += "---- ? ----"
+with profiler.stage("transactions", transactions=len(transactions)):
+    for i, tr in enumerate(transactions):
+
+        data["transactions"].append({ 
+            "start" : None if tr.start_condition is None else tr.start_condition.serialize(),
+            "address" : None if tr.obj_address is None else tr.obj_address.serialize(),
+            "data" : [o.serialize() for o in tr.obj_data],
+            "stop" : None if tr.stop_condition is None else tr.stop_condition.serialize(),
+        })
+
+        s = f"  {i:>4} "
+        if (ts := tr.t_startcondition) is not None:
+            s += f"{ts:>10.6f}s"
+        else:
+            s += "---- ? ----"
     
-    s += " -> "
+        s += " -> "
 
-    if (ts := tr.t_stopcondition) is not None:
-        s += f"{ts:>10.6f}s"
-    else:
-        s += "---- ? ----"
+        if (ts := tr.t_stopcondition) is not None:
+            s += f"{ts:>10.6f}s"
+        else:
+            s += "---- ? ----"
 
-    addr_info = "[addr?]"
-    if tr.obj_address is not None:
-        addr_str = ""
-        if tr.obj_address.value is not None:
-            addr_str = f"{tr.obj_address.value:02X}"
-        addr_info = f"{addr_str}{'R' if tr.access_read is True else 'W'}{'a' if tr.addr_acked is True else 'n'}"
+        addr_info = "[addr?]"
+        if tr.obj_address is not None:
+            addr_str = ""
+            if tr.obj_address.value is not None:
+                addr_str = f"{tr.obj_address.value:02X}"
+            addr_info = f"{addr_str}{'R' if tr.access_read is True else 'W'}{'a' if tr.addr_acked is True else 'n'}"
 
-    s += f" {addr_info}: "
+        s += f" {addr_info}: "
 
-    s += " ".join([(f"{d.value:02X}" + ("n" if d.ack is False else "a")) if d.is_complete is True else "!!" for d in tr.obj_data])
+        s += " ".join([(f"{d.value:02X}" + ("n" if d.ack is False else "a")) if d.is_complete is True else "!!" for d in tr.obj_data])
 
-    print(s)
+        print(s)
 
 #region Bit statistics
 print()
@@ -177,6 +336,9 @@ print("== Bit statistics ==")
 
 import i2cvisualizer
 
+# the figures are rendered at the end, in parallel
+renderer = i2cvisualizer.FigureRenderer()
+
 for ag in i2c_addresses:
     # Bits read from devices
     info = {
@@ -186,56 +348,56 @@ for ag in i2c_addresses:
     }
 
     print(f"Bits read from device 0x{ag.address:02X}")
-    trsf = transactions.filter(ag.address, True)
-    bits = trsf.get_bits(False, True, True, False)
-    trsf = transactions.filter(ag.address, False) # ACK bits
-    bits.extend(trsf.get_bits(False, True, False, True))
-    read_bits_cnt = len(bits)
-    if read_bits_cnt == 0:
-        print("No read bits found.")
-    else:
-        bitinfo = i2cvisualizer.I2cBitInfo(bits, v_bus, dw_scl, dw_sda)
-        fig = bitinfo.draw_plot()
-        bitinfo.axis.set_title(f'SDA Bits read from 0x{ag.address:02X} ({len(bits)} wfrms)')
-
-        read_filename = f"bits_0x{ag.address:02X}R.png"
-        fig.savefig(read_filename, format="png")
-        read_bitinfo = bitinfo.info()
-        print(f"Eye diagram saved as '{read_filename}'")
-
-        info["read"] = {
-            "waveforms" : read_bits_cnt,
-            "filename" : read_filename,
-            "info" : read_bitinfo
-        }
+    with profiler.stage(f"bitstats_0x{ag.address:02X}R") as counts:
+        trsf = transactions.filter(ag.address, True)
+        bits = trsf.get_bits(False, True, True, False)
+        trsf = transactions.filter(ag.address, False) # ACK bits
+        bits.extend(trsf.get_bits(False, True, False, True))
+        read_bits_cnt = len(bits)
+        counts["waveforms"] = read_bits_cnt
+        if read_bits_cnt == 0:
+            print("No read bits found.")
+        else:
+            bitinfo = i2cvisualizer.I2cBitInfo(bits, v_bus, dw_scl, dw_sda)
+
+            read_filename = f"bits_0x{ag.address:02X}R.png"
+            renderer.add(read_filename, i2cvisualizer.draw_density, bitinfo.histogram.counts, bitinfo.histogram.x_bins, bitinfo.histogram.y_bins,
+                         f'SDA Bits read from 0x{ag.address:02X} ({len(bits)} wfrms)')
+            read_bitinfo = bitinfo.info()
+
+            info["read"] = {
+                "waveforms" : read_bits_cnt,
+                "filename" : read_filename,
+                "info" : read_bitinfo
+            }
 
     # Bits written to devices
     print(f"Bits written to device 0x{ag.address:02X}")
 
-    trsf = transactions.filter(ag.address, False)
-    bits = trsf.get_bits(True, False, True, False)
-    trsf = transactions.filter(ag.address, True) # address bits
-    bits.extend(trsf.get_bits(True, False, False, False))
-    write_bits_cnt = len(bits)
+    with profiler.stage(f"bitstats_0x{ag.address:02X}W") as counts:
+        trsf = transactions.filter(ag.address, False)
+        bits = trsf.get_bits(True, False, True, False)
+        trsf = transactions.filter(ag.address, True) # address bits
+        bits.extend(trsf.get_bits(True, False, False, False))
+        write_bits_cnt = len(bits)
+        counts["waveforms"] = write_bits_cnt
     
-    if write_bits_cnt == 0:
-        print("No write bits found.")
-    else:
+        if write_bits_cnt == 0:
+            print("No write bits found.")
+        else:
 
-        bitinfo = i2cvisualizer.I2cBitInfo(bits, v_bus, dw_scl, dw_sda)
-        fig = bitinfo.draw_plot()
-        bitinfo.axis.set_title(f'SDA for Bits written to 0x{ag.address:02X} ({len(bits)} wfrms)')
+            bitinfo = i2cvisualizer.I2cBitInfo(bits, v_bus, dw_scl, dw_sda)
 
-        write_filename = f"bits_0x{ag.address:02X}W.png"
-        fig.savefig(write_filename, format="png")
-        write_bitinfo = bitinfo.info()
-        print(f"Eye diagram saved as '{write_filename}'")
+            write_filename = f"bits_0x{ag.address:02X}W.png"
+            renderer.add(write_filename, i2cvisualizer.draw_density, bitinfo.histogram.counts, bitinfo.histogram.x_bins, bitinfo.histogram.y_bins,
+                         f'SDA for Bits written to 0x{ag.address:02X} ({len(bits)} wfrms)')
+            write_bitinfo = bitinfo.info()
 
-        info["write"] = {
-            "waveforms" : write_bits_cnt,
-            "filename" : write_filename,
-            "info" : write_bitinfo
-        }
+            info["write"] = {
+                "waveforms" : write_bits_cnt,
+                "filename" : write_filename,
+                "info" : write_bitinfo
+            }
 
     data["bitstats"].append(info)
 
@@ -250,12 +412,14 @@ xtalk_combs = [
 ]
 
 for item in xtalk_combs:
-    xtalk = i2cvisualizer.I2cCrosstalk(item[2], item[3], item[4], v_bus, item[6])
-    fig = xtalk.draw_plot()
     filename = item[5]
+    edges = item[2].transitions
+    with profiler.stage(f"crosstalk_{item[0]}_{item[1]}_{'rise' if item[3] else 'fall'}".lower(), edges=len(edges.pos_rising if item[3] else edges.pos_falling)) as counts:
+        xtalk = i2cvisualizer.I2cCrosstalk(item[2], item[3], item[4], v_bus, item[6])
+        histogram = xtalk.histogram()
+        counts["samples"] = int(histogram.counts.sum())
     
-    fig.savefig(filename, format="png")
-    print(f"Crosstalk diagram saved as '{filename}'")
+    renderer.add(filename, i2cvisualizer.draw_density, histogram.counts, histogram.x_bins, histogram.y_bins, item[6])
 
     data["crosstalk"].append({
         "aggressor" : item[0],
@@ -268,14 +432,17 @@ for item in xtalk_combs:
 #region Transition times
 print()
 print("== SCL Transition times ==")
-ttgroups = i2cvisualizer.I2cTransitiontime(transactions, True)
-filename = f"trtime_scl.png"
-fig = ttgroups.draw_plot()
-fig.savefig(filename, format="png")
-print(f"Transition time diagram saved as '{filename}'")
-
-stats_rise = Simplestats(ttgroups.data_all["rise"])
-stats_fall = Simplestats(ttgroups.data_all["fall"])
+with profiler.stage("transitiontimes_scl") as counts:
+    ttgroups = i2cvisualizer.I2cTransitiontime(transactions, True)
+    filename = f"trtime_scl.png"
+    renderer.add(filename, i2cvisualizer.draw_transitiontime, "SCL", ttgroups.histograms(), size=ttgroups.figsize)
+
+    # per device first, the statistics of all edges are merged from them
+    device_stats = [(ttgroup["address"], Simplestats(ttgroup["rise"]), Simplestats(ttgroup["fall"])) for ttgroup in ttgroups.data]
+    stats_rise = Simplestats.combine(item[1] for item in device_stats)
+    stats_fall = Simplestats.combine(item[2] for item in device_stats)
+    counts["rise"] = stats_rise.count
+    counts["fall"] = stats_fall.count
 
 print("All:")
 print(f"  Rise [ns]: min={stats_rise.min:.0f} avg={stats_rise.avg:.0f} mode={stats_rise.mode:.0f} median={stats_rise.median:.0f} max={stats_rise.max:.0f}")
@@ -290,17 +457,13 @@ data["transitiontimes"]["scl"] = {
     "devices" : []
 }
 
-for ttgroup in ttgroups.data:
-    fig = ttgroups.draw_plot()
-    print(f"For 0x{ag.address:02X}:")
-
-    stats_rise = Simplestats(ttgroup["rise"])
-    stats_fall = Simplestats(ttgroup["fall"])
+for address, stats_rise, stats_fall in device_stats:
+    print(f"For 0x{address:02X}:")
     print(f"  Rise [ns]: min={stats_rise.min:.0f} avg={stats_rise.avg:.0f} mode={stats_rise.mode:.0f} median={stats_rise.median:.0f} max={stats_rise.max:.0f}")
     print(f"  Fall [ns]: min={stats_fall.min:.0f} avg={stats_fall.avg:.0f} mode={stats_fall.mode:.0f} median={stats_fall.median:.0f} max={stats_fall.max:.0f}")
 
     data["transitiontimes"]["scl"]["devices"].append({
-        "address" : ttgroup["address"],
+        "address" : address,
         "rise" : stats_rise.serialize(),
         "fall" : stats_fall.serialize(),
     })
@@ -308,16 +471,18 @@ for ttgroup in ttgroups.data:
 
 print()
 print("== SDA Transition times ==")
-ttgroups = i2cvisualizer.I2cTransitiontime(transactions, False)
-filename = f"trtime_sda.png"
-fig = ttgroups.draw_plot()
-fig.savefig(filename, format="png")
-print(f"Transition time diagram saved as '{filename}'")
+with profiler.stage("transitiontimes_sda") as counts:
+    ttgroups = i2cvisualizer.I2cTransitiontime(transactions, False)
+    filename = f"trtime_sda.png"
+    renderer.add(filename, i2cvisualizer.draw_transitiontime, "SDA", ttgroups.histograms(), size=ttgroups.figsize)
+
+    # per device first, the statistics of all edges are merged from them
+    device_stats = [(ttgroup["address"], Simplestats(ttgroup["rise"]), Simplestats(ttgroup["fall"])) for ttgroup in ttgroups.data]
+    stats_rise = Simplestats.combine(item[1] for item in device_stats)
+    stats_fall = Simplestats.combine(item[2] for item in device_stats)
+    counts["rise"] = stats_rise.count
+    counts["fall"] = stats_fall.count
 
-stats_rise = Simplestats(ttgroups.data_all["rise"])
-stats_fall = Simplestats(ttgroups.data_all["fall"])
-
-#TODO: Add warnings for rise/fall time violations
 print("All:")
 print(f"  Rise [ns]: min={stats_rise.min:.0f} avg={stats_rise.avg:.0f} mode={stats_rise.mode:.0f} median={stats_rise.median:.0f} max={stats_rise.max:.0f}")
 print(f"  Fall [ns]: min={stats_fall.min:.0f} avg={stats_fall.avg:.0f} mode={stats_fall.mode:.0f} median={stats_fall.median:.0f} max={stats_fall.max:.0f}")
@@ -330,21 +495,220 @@ data["transitiontimes"]["sda"] = {
     "devices" : []
 }
 
-for ttgroup in ttgroups.data:
-    fig = ttgroups.draw_plot()
-    print(f"For 0x{ag.address:02X}:")
-
-    stats_rise = Simplestats(ttgroup["rise"])
-    stats_fall = Simplestats(ttgroup["fall"])
+for address, stats_rise, stats_fall in device_stats:
+    print(f"For 0x{address:02X}:")
     print(f"  Rise [ns]: min={stats_rise.min:.0f} avg={stats_rise.avg:.0f} mode={stats_rise.mode:.0f} median={stats_rise.median:.0f} max={stats_rise.max:.0f}")
     print(f"  Fall [ns]: min={stats_fall.min:.0f} avg={stats_fall.avg:.0f} mode={stats_fall.mode:.0f} median={stats_fall.median:.0f} max={stats_fall.max:.0f}")
 
     data["transitiontimes"]["sda"]["devices"].append({
-        "address" : ttgroup["address"],
+        "address" : address,
         "rise" : stats_rise.serialize(),
         "fall" : stats_fall.serialize(),
     })
 
+#region SCL timing
+print()
+print("== SCL timing ==")
+
+def timing_stats(values, scale):
+    # bits at the start or end of the capture have no edge before or after them
+    return Simplestats(values[~np.isnan(values)] * scale)
+
+with profiler.stage("bittiming") as counts:
+    counts["bits"] = 0
+    for ag in i2c_addresses:
+        for read in (True, False):
+            timing = transactions.filter(ag.address, read).bit_timing(True, True, True, True)
+            if len(timing) == 0:
+                continue
+            counts["bits"] += len(timing)
+
+            stats_high = timing_stats(timing.scl_high_time, 1e9)
+            stats_low = timing_stats(timing.scl_low_time, 1e9)
+            stats_freq = timing_stats(1 / timing.scl_period, 1e-3)
+            print(f"0x{ag.address:02X} {'read' if read else 'write'}, {len(timing)} bits:")
+            print(f"  SCL high [ns]: min={stats_high.min:.0f} median={stats_high.median:.0f} max={stats_high.max:.0f}")
+            print(f"  SCL low [ns]: min={stats_low.min:.0f} median={stats_low.median:.0f} max={stats_low.max:.0f}")
+            print(f"  f_SCL [kHz]: min={stats_freq.min:.1f} median={stats_freq.median:.1f} max={stats_freq.max:.1f}")
+
+            data["bittiming"].append({
+                "address" : ag.address,
+                "read" : read,
+                "bits" : len(timing),
+                "scl_high_time" : stats_high.serialize(),
+                "scl_low_time" : stats_low.serialize(),
+                "scl_period" : timing_stats(timing.scl_period, 1e9).serialize(),
+                "bit_time" : timing_stats(timing.bit_time, 1e9).serialize(),
+                "frequency" : stats_freq.serialize(),
+            })
+
+#region Clock stretching
+print()
+print("== Clock stretching ==")
+
+with profiler.stage("clockstretching") as counts:
+    stretching = ia.clock_stretching()
+    counts["stretched"] = len(stretching)
+
+print(f"Nominal SCL low time: {stretching.nominal_low_time * 1e9:.0f} ns, {len(stretching)} low phases longer than {stretching.factor:g}x, total stall {stretching.total_stall_time * 1e3:.3f} ms")
+
+data["clockstretching"] = {
+    "nominal_low_time" : stretching.nominal_low_time * 1e9,
+    "factor" : stretching.factor,
+    "count" : len(stretching),
+    "total_stall_time" : stretching.total_stall_time * 1e9,
+    "devices" : [],
+}
+
+for ag in i2c_addresses:
+    for read in (True, False):
+        device = stretching[(stretching.address == ag.address) & (stretching.read == int(read))]
+        if len(device) == 0:
+            continue
+        stall = device.stall_time * 1e9
+        hist_counts, bins = np.histogram(stall, bins=50)
+        # bit positions: 9, 18, ... after an ACK, "stop" before the STOP or repeated START
+        key, key_counts = np.unique(np.where(device.before_condition, -1, device.position), return_counts=True)
+        positions = { "stop" if k < 0 else str(k) : c for k, c in zip(key.tolist(), key_counts.tolist()) }
+
+        print(f"0x{ag.address:02X} {'read' if read else 'write'}: {len(device)} stretched, total stall {device.total_stall_time * 1e3:.3f} ms")
+        print(f"  Stall [ns]: min={stall.min():.0f} median={np.median(stall):.0f} max={stall.max():.0f}")
+        print(f"  Before bit: " + ", ".join(f"{key}: {count}" for key, count in positions.items()))
+
+        data["clockstretching"]["devices"].append({
+            "address" : ag.address,
+            "read" : read,
+            "count" : len(device),
+            "total_stall_time" : device.total_stall_time * 1e9,
+            "stall_time" : Simplestats(stall).serialize(),
+            "histogram" : { "bins" : bins.tolist(), "counts" : hist_counts.tolist() },
+            "positions" : positions,
+        })
+
+#region Setup and hold times
+print()
+print("== Setup and hold times ==")
+
+SETUPHOLD_NAMES = {
+    "t_su_dat" : "tSU;DAT",
+    "t_hd_dat" : "tHD;DAT",
+    "t_hd_sta" : "tHD;STA",
+    "t_su_sta" : "tSU;STA",
+    "t_su_sto" : "tSU;STO",
+    "t_buf" : "tBUF",
+}
+
+def setuphold_info(selection):
+    info = {}
+    for name, (values, times) in selection.setup_hold().items():
+        values = values * 1e9
+        counts, bins = np.histogram(values, bins=50) if len(values) > 0 else (np.array([], dtype=np.int64), np.array([]))
+        info[name] = {
+            "stats" : Simplestats(values).serialize(),
+            "histogram" : { "bins" : bins.tolist(), "counts" : counts.tolist() },
+        }
+        if len(values) > 0:
+            print(f"  {SETUPHOLD_NAMES[name]:<8} [ns]: n={len(values)} min={values.min():.0f} median={np.median(values):.0f} max={values.max():.0f}")
+    return info
+
+with profiler.stage("setuphold") as counts:
+    print("All transactions:")
+    data["setuphold"].append({ "address" : None, "read" : None, "parameters" : setuphold_info(transactions) })
+    for ag in i2c_addresses:
+        for read in (True, False):
+            selection = transactions.filter(ag.address, read)
+            if len(selection) == 0:
+                continue
+            print(f"0x{ag.address:02X} {'read' if read else 'write'}:")
+            data["setuphold"].append({ "address" : ag.address, "read" : read, "parameters" : setuphold_info(selection) })
+    counts["groups"] = len(data["setuphold"])
+
+#region Compliance
+print()
+print("== UM10204 compliance ==")
+
+def compliance_value(name, value):
+    return "---" if value is None else f"{value * I2cCompliance.PARAMETERS[name][2]:.{3 if name.startswith('v_') else 0}f}"
+
+with profiler.stage("compliance") as counts:
+    compliance = I2cCompliance(transactions.table, v_bus, args.mode)
+    counts["violations"] = len(compliance.violation_time)
+
+print(f"{MODES[compliance.mode]['name']}{' (detected)' if args.mode is None else ''}, {len(compliance.violation_time)} violations in {len(compliance.offending_transactions())} transactions")
+for name, (label, unit, scale) in I2cCompliance.PARAMETERS.items():
+    summary = compliance.summary[name]
+    s = f"  {label:<8} [{unit}]: limits {compliance_value(name, summary['min'])}...{compliance_value(name, summary['max'])}, {summary['count']} measured"
+    if summary["worst"] is not None:
+        s += f", worst {compliance_value(name, summary['worst'])} at {summary['time']:.6f}s"
+    if summary["violations"] > 0:
+        s += f", {summary['violations']} VIOLATIONS"
+    print(s)
+
+names = list(I2cCompliance.PARAMETERS)
+max_listed = 20
+if len(compliance.violation_time) > 0:
+    print(f"First {min(max_listed, len(compliance.violation_time))} violations:")
+for i in range(min(max_listed, len(compliance.violation_time))):
+    name = names[compliance.violation_parameter[i]]
+    label, unit, _ = I2cCompliance.PARAMETERS[name]
+    row = compliance.violation_row[i]
+    bit = compliance.violation_bit[i]
+    where = "outside of transactions" if row < 0 else f"transaction {row}" + ("" if bit < 0 else f", bit {bit}")
+    print(f"  {compliance.violation_time[i]:>10.6f}s {label:<8} {compliance_value(name, compliance.violation_value[i])} {unit} ({where})")
+
+data["compliance"] = compliance.serialize()
+
+#region Bus timeline
+print()
+print("== Bus timeline ==")
+
+with profiler.stage("timeline") as counts:
+    timeline = I2cBusTimeline(transactions.table, dw_scl.awf.time_offset, dw_scl.awf.time_at_index(len(dw_scl.awf)))
+    counts["levels"] = len(timeline.levels)
+    overview = timeline.view()
+    filename = "timeline.png"
+    px = 1 / matplotlib.rcParams['figure.dpi']
+    renderer.add(filename, i2cvisualizer.draw_timeline, overview, size=(640 * 2 * px, 480 * 1.5 * px))
+
+total = timeline.windows(timeline.t_end - timeline.t_start)
+peak = timeline.windows(1e-3)
+print(f"Whole capture: bus load {total['utilization'][0] * 100:.1f} %, {total['transactions_per_s'][0]:.1f} transactions/s, {total['bytes_per_s'][0]:.1f} bytes/s, "
+      f"NACK rate {total['nack_rate'][0] * 100:.1f} %, f_SCL {total['scl_frequency'][0] * 1e-3:.1f} kHz")
+print(f"Peak bus load in 1 ms: {np.max(peak['utilization']) * 100:.1f} % at {peak['time'][np.argmax(peak['utilization'])]:.6f}s")
+
+data["timeline"] = dict(timeline.serialize(), filename=filename)
+
+#region Min/max pyramids
+if not args.no_minmax:
+    print()
+    print("== Min/max pyramids ==")
+    for name, dw in (("scl", dw_scl), ("sda", dw_sda)):
+        filename = f"{name}.minmax"
+        with profiler.stage(f"minmax_{name}", samples=len(dw.awf)) as counts:
+            pyramid = dw.awf.minmax_pyramid()
+            pyramid.save(filename)
+            counts["levels"] = pyramid.levels
+        print(f"{name.upper()}: {pyramid.levels} levels, {pyramid.samples_per_bin} to {pyramid.bin_samples(pyramid.levels - 1) if pyramid.levels > 0 else 0} samples per bin, saved as '{filename}'")
+        data["minmax"][name] = {
+            "filename" : filename,
+            "tile_size" : MinMaxPyramid.DEFAULT_TILE_SIZE,
+            "levels" : [{ "samples_per_bin" : pyramid.bin_samples(level), "bins" : len(pyramid.bins(level)[0]) } for level in range(pyramid.levels)],
+        }
+
+#region Rendering
+print()
+print("== Rendering ==")
+with profiler.stage("render", figures=len(renderer.jobs)):
+    filenames = renderer.run(args.jobs, mp_context)
+for filename in filenames:
+    print(f"Figure saved as '{filename}'")
+
+print()
+print("== Profile ==")
+for line in profiler.table():
+    print(line)
+data["profile"] = profiler.serialize()
+
 with open("report.json", "w") as fp:
     json.dump(data, fp)
 
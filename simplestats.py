@@ -1,42 +1,371 @@
 import statistics
+import numpy as np
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest).
+
+    The samples are summarized by at most about compression / 2 centroids
+    (mean, weight), small ones at the tails and large ones around the median,
+    so extreme percentiles like p99.9 stay accurate. Memory doesn't depend on
+    the number of samples and digests of different chunks, devices or captures
+    can be merged.
+    """
+    DEFAULT_COMPRESSION = 500
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION) -> None:
+        """
+        Args:
+            compression: Trade-off between size and accuracy
+        """
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._buffer = []
+        self._buffered = 0
+
+    def add(self, values, weights = None) -> None:
+        """Add samples (optionally weighted)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+
+        self._buffer.append((values, weights))
+        self._buffered += len(values)
+        self.count += weights.sum()
+        self.min = values.min() if self.min is None else min(self.min, values.min())
+        self.max = values.max() if self.max is None else max(self.max, values.max())
+
+        if self._buffered > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> None:
+        """Add the samples summarized by another digest."""
+        other._compress()
+        if other.count == 0:
+            return
+        self._buffer.append((other.means, other.weights))
+        self._buffered += len(other.means)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def _compress(self) -> None:
+        if self._buffered == 0:
+            return
+
+        means = np.concatenate([self.means] + [v for v, _ in self._buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+
+        # k1 scale function: centroids span at most one unit of k
+        cum = np.cumsum(weights)
+        q = (cum - weights / 2) / cum[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        group = np.floor(k).astype(np.int64)
+
+        first = np.flatnonzero(np.diff(group, prepend=group[0] - 1))
+        self.weights = np.add.reduceat(weights, first)
+        self.means = np.add.reduceat(means * weights, first) / self.weights
+
+    def quantile(self, q):
+        """
+        Estimate quantiles.
+
+        Args:
+            q: Quantile(s) in 0...1
+
+        Returns:
+            Estimated value(s), None if there are no samples
+        """
+        self._compress()
+        if self.count == 0:
+            return None
+
+        # centroid means are placed at the center of their weight, min and max at the ends
+        rank = np.concatenate(([0], np.cumsum(self.weights) - self.weights / 2, [self.count]))
+        value = np.concatenate(([self.min], self.means, [self.max]))
+        return np.interp(np.asarray(q) * self.count, rank, value)
 
 class Simplestats:
-    def __init__(self, data):
-        self.data = data
+    """
+    Descriptive statistics of a set of samples.
+
+    Count, mean, variance, min and max are computed in one vectorized pass per
+    update() and kept as running values. Median and mode are computed on first
+    access and cached until the next update(). Partial results (e.g. of several
+    devices or chunks) can be combined with merge() without scanning the samples
+    again.
+
+    With sketch=True, the samples are not kept. Median, quantiles and mode are
+    estimated from a TDigest instead, so the memory usage is bounded.
+    """
+    def __init__(self, data = None, sketch: bool = False, compression: float = TDigest.DEFAULT_COMPRESSION):
+        """
+        Args:
+            data: Samples (optional, more can be added with update())
+            sketch: Summarize the samples in a TDigest instead of keeping them
+            compression: Compression of the TDigest
+        """
+        self.digest = TDigest(compression) if sketch else None
+        self.count = 0
+        self.mean = float("nan")
+        self._m2 = 0.0 # sum of squared differences from the mean
+        self._min = None
+        self._max = None
+        self._chunks = []
+        self._cache = {}
+
+        self.hist_counts = None
+        self.hist_centers = None
+
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        """
+        Add samples.
+
+        Args:
+            data: Samples (anything np.asarray() accepts)
+
+        Returns:
+            self
+        """
+        data = np.asarray(data, dtype=np.float64).ravel()
+        if len(data) == 0:
+            return self
+
+        mean = data.mean()
+        self._add_moments(len(data), mean, float(((data - mean) ** 2).sum()), data.min(), data.max())
+        if self.digest is not None:
+            self.digest.add(data)
+        else:
+            self._chunks.append(data)
+        return self
+
+    def merge(self, other: "Simplestats"):
+        """
+        Add the samples of other statistics.
+
+        Args:
+            other: Statistics to merge (not modified)
+
+        Returns:
+            self
+        """
+        if other.hist_counts is not None or self.hist_counts is not None:
+            raise ValueError("Statistics created from histograms can't be merged")
+        if other.digest is not None and self.digest is None:
+            raise ValueError("Sketched statistics can only be merged into sketched statistics")
+        if other.count == 0:
+            return self
+
+        self._add_moments(other.count, other.mean, other._m2, other._min, other._max)
+        if other.digest is not None:
+            self.digest.merge(other.digest)
+        elif self.digest is not None:
+            for chunk in other._chunks:
+                self.digest.add(chunk)
+        else:
+            self._chunks.extend(other._chunks)
+        return self
+
+    @classmethod
+    def combine(cls, stats):
+        """Create statistics of all samples of several statistics (sketched if any of them is)."""
+        stats = list(stats)
+        digests = [item.digest for item in stats if item.digest is not None]
+        if len(digests) > 0:
+            result = cls(sketch=True, compression=max(digest.compression for digest in digests))
+        else:
+            result = cls()
+        for item in stats:
+            result.merge(item)
+        return result
+
+    def _add_moments(self, count, mean, m2, min, max):
+        # Chan et al., pairwise combination of mean and variance
+        if self.count == 0:
+            self.mean = float(mean)
+            self._m2 = m2
+        else:
+            total = self.count + count
+            delta = mean - self.mean
+            self.mean = float(self.mean + delta * count / total)
+            self._m2 = self._m2 + m2 + delta ** 2 * self.count * count / total
+        self.count += count
+        if self._min is None or min < self._min:
+            self._min = float(min)
+        if self._max is None or max > self._max:
+            self._max = float(max)
+        self._cache = {}
+
+    @property
+    def data(self):
+        """All samples as one array, None for sketched statistics and statistics created from histograms."""
+        if self.hist_counts is not None or self.digest is not None:
+            return None
+        if "data" not in self._cache:
+            self._cache["data"] = np.concatenate(self._chunks) if len(self._chunks) > 0 else np.empty(0)
+            # keep a single chunk instead of the parts
+            self._chunks = [self._cache["data"]]
+        return self._cache["data"]
 
     def __len__(self) -> int:
-        return len(self.data)
+        return self.count
     
     @property
     def min(self):
-        return min(self.data)
+        return self._min
     
     @property
     def avg(self):
-        return sum(self.data) / len(self.data)
+        return self.mean if self.count > 0 else None
+
+    @property
+    def variance(self):
+        """Population variance"""
+        return self._m2 / self.count if self.count > 0 else None
+
+    @property
+    def stddev(self):
+        """Population standard deviation"""
+        return self.variance ** 0.5 if self.count > 0 else None
     
     @property
     def mode(self):
-        return statistics.mode(self.data)
+        """
+        Most common value.
+
+        The samples are mostly continuous, so this is the center of the most
+        populated bin of a histogram (numpy's "auto" bin width) instead of the
+        most frequent exact value.
+        """
+        if self.count == 0:
+            return None
+        if "mode" not in self._cache:
+            if self.hist_counts is not None:
+                mode = self.hist_centers[self.hist_counts.argmax()]
+            elif self.digest is not None:
+                # densest centroid: weight per distance to its neighbors
+                means = np.concatenate(([self.min], self.digest.means, [self.max]))
+                width = np.maximum(means[2:] - means[:-2], np.finfo(np.float64).tiny)
+                mode = self.digest.means[(self.digest.weights / width).argmax()]
+            else:
+                counts, edges = np.histogram(self.data, bins="auto")
+                i = counts.argmax()
+                mode = (edges[i] + edges[i + 1]) / 2
+            self._cache["mode"] = float(mode)
+        return self._cache["mode"]
     
     def mode_precision(self, ndigits):
         return statistics.mode([round(x, ndigits) for x in self.data])
     
     @property
     def median(self):
-        return statistics.median(self.data)
+        if self.count == 0:
+            return None
+        if "median" not in self._cache:
+            if self.hist_counts is not None:
+                cumsum = np.cumsum(self.hist_counts)
+                median = self.hist_centers[np.searchsorted(cumsum, cumsum[-1] / 2)]
+            elif self.digest is not None:
+                median = self.digest.quantile(0.5)
+            else:
+                median = np.median(self.data)
+            self._cache["median"] = float(median)
+        return self._cache["median"]
+
+    PERCENTILES = (1, 50, 99, 99.9)
+    """Percentiles in serialize()"""
+
+    def quantile(self, q):
+        """
+        Get quantiles (linear interpolation between samples, estimated for sketched statistics).
+
+        Args:
+            q: Quantile(s) in 0...1
+
+        Returns:
+            Value(s), None if there are no samples
+        """
+        if self.count == 0:
+            return None
+        if self.hist_counts is not None:
+            cumsum = np.cumsum(self.hist_counts)
+            return self.hist_centers[np.minimum(np.searchsorted(cumsum, np.asarray(q) * cumsum[-1]), len(cumsum) - 1)]
+        if self.digest is not None:
+            return self.digest.quantile(q)
+        return np.quantile(self.data, q)
     
     @property
     def max(self):
-        return max(self.data)
+        return self._max
     
+    @classmethod
+    def from_histogram(cls, counts, edges, min = None, max = None):
+        """
+        Create statistics from a histogram instead of the samples.
+
+        level_info() then costs the same no matter how many samples were binned.
+        The results are as precise as the bins are narrow: levels are found on the
+        same 1000 point grid, counts and standard deviations use the bin centers,
+        so a bin straddling the border of a level window counts completely or not
+        at all.
+
+        Args:
+            counts: Number of samples per bin
+            edges: Bin edges (len(counts) + 1)
+            min: Exact minimum of the samples (default: left edge of the first used bin)
+            max: Exact maximum of the samples (default: right edge of the last used bin)
+        """
+        counts = np.asarray(counts)
+        edges = np.asarray(edges, dtype=np.float64)
+        used = np.flatnonzero(counts)
+        centers = (edges[:-1] + edges[1:]) / 2
+
+        stats = cls()
+        stats.hist_counts = counts
+        stats.hist_centers = centers
+        if len(used) > 0:
+            count = int(counts.sum())
+            mean = np.average(centers, weights=counts)
+            m2 = float(np.sum(counts * (centers - mean) ** 2))
+            stats._add_moments(count, mean,  m2,
+                               min if min is not None else edges[used[0]],
+                               max if max is not None else edges[used[-1] + 1])
+        return stats
+
+    def _samples(self):
+        """Values and weights of the samples (weights is None for raw data)."""
+        if self.hist_counts is not None:
+            return self.hist_centers, self.hist_counts
+        if self.digest is not None:
+            self.digest._compress()
+            return self.digest.means, self.digest.weights
+        return self.data, None
+
     def find_dominant_voltages(self, num_levels = 2, bandwidth_factor = 0.05, min_peak_height = None, min_peak_height_rel = None):
-        from scipy.stats import gaussian_kde
         from scipy.signal import find_peaks
-        import numpy as np
         """
         Find dominant voltage levels in waveform data using KDE (Kernel Density Estimation).
         Particularly useful for PAM4 signals which have 4 distinct levels.
+
+        The KDE is binned: the samples are distributed linearly onto the evaluation
+        grid and convolved with the gaussian kernel, so the cost is linear in the
+        number of samples (constant for histograms). It matches scipy's gaussian_kde
+        within O((grid step / bandwidth)^2), the peaks land on the same grid points.
         
         Parameters:
         num_levels (int): Expected number of voltage levels (default 4 for PAM4)
@@ -49,13 +378,32 @@ class Simplestats:
             - density_curve: KDE density values for plotting
             - voltage_points: Voltage points used for density calculation
         """
-        # Create kernel density estimation
-        kde = gaussian_kde(self.data)
-        kde.set_bandwidth(bw_method=bandwidth_factor)
-        
+        values, weights = self._samples()
+        total = self.count
+
+        # Kernel width like gaussian_kde: bandwidth_factor * standard deviation (ddof=1)
+        var = self._m2 / (self.count - 1)
+        sigma = bandwidth_factor * np.sqrt(var)
+
         # Generate points for density evaluation
-        voltage_points = np.linspace(min(self.data), max(self.data), 1000)
-        density = kde(voltage_points)
+        voltage_points = np.linspace(self.min, self.max, 1000)
+        step = voltage_points[1] - voltage_points[0]
+
+        # Linear binning onto the grid
+        pos = np.clip((values - voltage_points[0]) / step, 0, len(voltage_points) - 1)
+        index = np.minimum(pos.astype(np.int64), len(voltage_points) - 2)
+        frac = pos - index
+        w = weights if weights is not None else 1.0
+        grid = np.bincount(index, weights=w * (1 - frac), minlength=len(voltage_points)) + \
+            np.bincount(index + 1, weights=w * frac, minlength=len(voltage_points))
+
+        if sigma > 0 and step > 0:
+            k = int(np.ceil(5 * sigma / step))
+            x = np.arange(-k, k + 1) * step
+            kernel = np.exp(-0.5 * (x / sigma) ** 2) / (sigma * np.sqrt(2 * np.pi))
+            density = np.convolve(grid, kernel)[k:k + len(voltage_points)] / total
+        else:
+            density = grid / total
         
         if min_peak_height_rel is None:
             min_peak_height = 0.2
@@ -80,20 +428,25 @@ class Simplestats:
         return voltage_levels, density, voltage_points
     
     def level_info(self, min_peak_height_rel = 0.1):
-        import numpy as np
-        data = np.array(self.data)
+        values, weights = self._samples()
         levels, _, _ = self.find_dominant_voltages(2, min_peak_height_rel)
 
         result = { "high" : { "value" : None, "stddev" : None, "cnt" : None },  "low" : { "value" : None, "stddev" : None, "cnt" : None } }
 
         for i, level in enumerate(levels):
-            window = abs(data - level) < (abs(level) * 0.05)
-            points_near_level = data[window]
-            stddev = np.std(points_near_level)
+            window = abs(values - level) < (abs(level) * 0.05)
+            points_near_level = values[window]
+            if weights is None:
+                cnt = len(points_near_level)
+                stddev = np.std(points_near_level)
+            else:
+                w = weights[window]
+                cnt = int(np.sum(w))
+                stddev = np.sqrt(np.average((points_near_level - np.average(points_near_level, weights=w)) ** 2, weights=w)) if cnt > 0 else np.float64(np.nan)
             
             # drrrty
             key = "low" if level < self.median else "high"
-            result[key] = { "value" : level, "stddev" : stddev, "cnt" : len(points_near_level) }
+            result[key] = { "value" : level, "stddev" : stddev, "cnt" : cnt }
 
         return result
 
@@ -108,4 +461,5 @@ class Simplestats:
             "mode" : self.mode,
             "median" : self.median,
             "max" : self.max,
+            **{ f"p{p:g}" : float(self.quantile(p / 100)) if self.count > 0 else None for p in self.PERCENTILES },
         }
\ No newline at end of file
@@ -0,0 +1,134 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from waveforms import AnalogWaveform, DigitalWaveform
+from i2c_dissector import I2cAnalyzer, I2cDecoder, I2cParallelAnalyzer, I2cStartcondition, I2cStreamAnalyzer
+from i2cgenerator import I2cWaveformGenerator
+
+EXAMPLES = Path(__file__).parent / "exampledata"
+
+V_LO = 1.5
+V_HI = 3.5
+
+# bus speed -> generator settings, the edges of Fast-mode Plus are steeper and sampled faster
+# (every edge needs about 2 samples between the thresholds to be detected reliably)
+BUS_SPEEDS = {
+    I2cWaveformGenerator.STANDARD_MODE : dict(sample_rate=12.5e6, rise_time=1000e-9, fall_time=400e-9),
+    I2cWaveformGenerator.FAST_MODE : dict(sample_rate=12.5e6, rise_time=500e-9, fall_time=400e-9),
+    I2cWaveformGenerator.FAST_MODE_PLUS : dict(sample_rate=50e6, rise_time=120e-9, fall_time=100e-9),
+}
+
+def generator(bus_speed: float, seed: int = 1) -> I2cWaveformGenerator:
+    return I2cWaveformGenerator(bus_speed=bus_speed, stretch_probability=0.2, nack_probability=0.1, restart_probability=0.3,
+                                seed=seed, **BUS_SPEEDS[bus_speed])
+
+def capture(bus_speed: float, seed: int = 1, bytes_per_speed: int = 400) -> tuple:
+    """Generated capture with about the same number of bytes for every bus speed, (generator, SDA, SCL)."""
+    gen = generator(bus_speed, seed)
+    sda, scl = gen.generate(bytes_per_speed * 9 / bus_speed)
+    return gen, sda, scl
+
+def describe(tr) -> tuple:
+    """Everything the decoders find about a transaction, for comparisons."""
+    return (
+        None if tr.start_condition is None else tr.start_condition.index,
+        None if tr.obj_address is None else (tr.obj_address.value, tr.obj_address.read, tr.obj_address.ack),
+        [(d.value, d.ack, d.is_complete) for d in tr.obj_data],
+        [bit.scl_transition.position for bit in tr.get_bits(True, True, True, True)],
+        None if tr.stop_condition is None else (type(tr.stop_condition).__name__, tr.stop_condition.index),
+    )
+
+def assert_same_edges(a: DigitalWaveform, b: DigitalWaveform) -> None:
+    for column in ("i_start", "i_end", "rising", "v1", "v2"):
+        np.testing.assert_array_equal(getattr(a.transitions, column), getattr(b.transitions, column), err_msg=column)
+
+def assert_same_analysis(a: I2cAnalyzer, b: I2cAnalyzer) -> None:
+    assert_same_edges(a.sda_data, b.sda_data)
+    assert_same_edges(a.scl_data, b.scl_data)
+    np.testing.assert_array_equal(a.scl_level_at_sda, b.scl_level_at_sda)
+    np.testing.assert_array_equal(a.sda_level_at_scl, b.sda_level_at_scl)
+    ta = a.get_transactions().table
+    tb = b.get_transactions().table
+    for column in ("start_pos", "end_pos", "restart", "bit_first", "bit_count"):
+        np.testing.assert_array_equal(getattr(ta, column), getattr(tb, column), err_msg=column)
+
+def batch_analyzer(sda: AnalogWaveform, scl: AnalogWaveform) -> I2cAnalyzer:
+    return I2cAnalyzer(DigitalWaveform(sda, V_LO, V_HI), DigitalWaveform(scl, V_LO, V_HI))
+
+@pytest.mark.parametrize("bus_speed", list(BUS_SPEEDS))
+def test_generated_traffic(bus_speed):
+    gen, sda, scl = capture(bus_speed)
+    transactions = batch_analyzer(sda, scl).get_transactions()
+    decoded = [tr for tr in transactions if tr.start_condition is not None]
+
+    truth = gen.transactions
+    assert len(truth) > 20
+    assert any(tr["restart"] for tr in truth) and any(not tr["addr_ack"] for tr in truth)
+    assert len(decoded) == len(truth)
+    for i, (tr, expected) in enumerate(zip(decoded, truth)):
+        # the START is found where SDA crosses the lower threshold
+        assert 0 <= tr.start_condition.time - expected["start"] < 2 * gen.fall_time
+        assert tr.address == expected["address"]
+        assert tr.access_read == expected["read"]
+        assert tr.addr_acked == expected["addr_ack"]
+        assert tr.data == expected["data"]
+        assert [d.ack for d in tr.obj_data] == expected["data_ack"]
+        restarted = i + 1 < len(truth) and truth[i + 1]["restart"]
+        assert isinstance(tr.stop_condition, I2cStartcondition) == restarted
+
+@pytest.mark.parametrize("bus_speed", list(BUS_SPEEDS))
+def test_decode_table_matches_decoder(bus_speed):
+    _, sda, scl = capture(bus_speed, seed=2)
+    ia = batch_analyzer(sda, scl)
+    table = ia.decode_table()
+    expected = [describe(tr) for tr in I2cDecoder(ia).decode()]
+    assert [describe(table.transaction(row)) for row in range(len(table))] == expected
+
+def test_decode_table_matches_decoder_example():
+    sda = AnalogWaveform.from_saleae_bin(str(EXAMPLES / "analog_0.bin.gz"), True)
+    scl = AnalogWaveform.from_saleae_bin(str(EXAMPLES / "analog_1.bin.gz"), True)
+    ia = batch_analyzer(sda, scl)
+    table = ia.decode_table()
+    expected = [describe(tr) for tr in I2cDecoder(ia).decode()]
+    assert len(expected) > 300
+    assert [describe(table.transaction(row)) for row in range(len(table))] == expected
+
+@pytest.mark.parametrize("chunk_size", [997, 4096, 65537])
+@pytest.mark.parametrize("bus_speed", list(BUS_SPEEDS))
+def test_stream_analyzer(bus_speed, chunk_size):
+    _, sda, scl = capture(bus_speed, seed=3)
+    expected = batch_analyzer(sda, scl)
+
+    timing = []
+    for awf in (sda, scl):
+        wf = AnalogWaveform()
+        wf.time_offset, wf.time_interval = awf.time_offset, awf.time_interval
+        timing.append(wf)
+    ia = I2cStreamAnalyzer(*timing, V_LO, V_HI)
+    chunks = range(0, len(sda.data), chunk_size)
+    ia.run((sda.data[i:i + chunk_size] for i in chunks), (scl.data[i:i + chunk_size] for i in chunks))
+
+    assert_same_analysis(ia, expected)
+    # the transactions decoded while streaming are the ones of the whole capture
+    assert [describe(tr) for tr in ia.transactions] == [describe(tr) for tr in expected.get_transactions()]
+
+@pytest.mark.parametrize("mmap", [False, True])
+@pytest.mark.parametrize("bus_speed", list(BUS_SPEEDS))
+def test_parallel_analyzer(bus_speed, mmap, tmp_path):
+    gen = generator(bus_speed, seed=4)
+    duration = 400 * 9 / bus_speed
+    if mmap:
+        gen.write_saleae_bin(duration, tmp_path / "scl.bin", tmp_path / "sda.bin")
+        sda = AnalogWaveform.from_saleae_bin(str(tmp_path / "sda.bin"))
+        scl = AnalogWaveform.from_saleae_bin(str(tmp_path / "scl.bin"))
+    else:
+        sda, scl = gen.generate(duration)
+    expected = batch_analyzer(sda, scl)
+
+    ia = I2cParallelAnalyzer(sda, scl, V_LO, V_HI, processes=2, chunk_size=4099)
+    ia.run()
+
+    assert len(ia.segments) > 1
+    assert_same_analysis(ia, expected)
@@ -0,0 +1,176 @@
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from waveforms import AnalogWaveform, DigitalWaveform, EdgeDetector
+from i2cgenerator import I2cWaveformGenerator
+
+EXAMPLES = [Path(__file__).parent / "exampledata" / name for name in ("analog_0.bin.gz", "analog_1.bin.gz")]
+
+class SignalState(Enum):
+    LO = 0
+    LO_RISE = 1
+    HI_RISE = 2
+    HI = 3
+    HI_FALL = 4
+    LO_FALL = 5
+    UNKNOWN = 6
+
+    @property
+    def is_low_state(self) -> bool:
+        return self in (SignalState.LO, SignalState.LO_RISE, SignalState.LO_FALL)
+
+    @property
+    def is_high_state(self) -> bool:
+        return self in (SignalState.HI, SignalState.HI_RISE, SignalState.HI_FALL)
+
+def next_state(voltage: float, prev_state: SignalState, threshold_lo: float, threshold_hi: float) -> SignalState:
+    if voltage >= threshold_hi:
+        if prev_state.is_low_state:
+            return SignalState.HI_RISE
+        if prev_state in (SignalState.HI_FALL, SignalState.UNKNOWN):
+            return SignalState.HI
+    elif voltage < threshold_lo:
+        if prev_state.is_high_state:
+            return SignalState.LO_FALL
+        if prev_state in (SignalState.LO_RISE, SignalState.UNKNOWN):
+            return SignalState.LO
+    else:
+        if prev_state in (SignalState.LO, SignalState.LO_FALL):
+            return SignalState.LO_RISE
+        if prev_state in (SignalState.HI, SignalState.HI_RISE):
+            return SignalState.HI_FALL
+    return prev_state
+
+def reference_transitions(samples, threshold_lo: float, threshold_hi: float) -> tuple:
+    """
+    Per-sample state machine the vectorized EdgeDetector replaces, on Python floats.
+
+    Returns:
+        Lists (i_start, i_end, rising) of the edges
+    """
+    data = np.asarray(samples).tolist()
+
+    def interpolate_index(level, index):
+        if index == 0:
+            return index
+        v1 = data[index - 1]
+        v2 = data[index]
+        return index - 1 + (level - v1) / (v2 - v1)
+
+    i_start = []
+    i_end = []
+    rising = []
+    prev_state = SignalState.UNKNOWN
+    marker = None
+
+    for i, voltage in enumerate(data):
+        state = next_state(voltage, prev_state, threshold_lo, threshold_hi)
+
+        if state == SignalState.UNKNOWN or prev_state == SignalState.UNKNOWN:
+            prev_state = state
+            continue
+
+        if state != prev_state:
+            if state in (SignalState.LO_RISE, SignalState.HI_FALL):
+                marker = (i, state)
+            elif state == SignalState.HI_RISE and marker and marker[1] == SignalState.LO_RISE:
+                i_start.append(interpolate_index(threshold_lo, marker[0]))
+                i_end.append(interpolate_index(threshold_hi, i))
+                rising.append(True)
+            elif state == SignalState.LO_FALL and marker and marker[1] == SignalState.HI_FALL:
+                i_start.append(interpolate_index(threshold_hi, marker[0]))
+                i_end.append(interpolate_index(threshold_lo, i))
+                rising.append(False)
+
+            prev_state = state
+
+    return i_start, i_end, rising
+
+def waveform(samples) -> AnalogWaveform:
+    awf = AnalogWaveform()
+    awf.data = samples
+    awf.time_interval = 1e-7
+    return awf
+
+def assert_reference(table, samples, threshold_lo, threshold_hi) -> None:
+    i_start, i_end, rising = reference_transitions(samples, threshold_lo, threshold_hi)
+    np.testing.assert_array_equal(table.i_start, np.array(i_start, dtype=np.float64))
+    np.testing.assert_array_equal(table.i_end, np.array(i_end, dtype=np.float64))
+    np.testing.assert_array_equal(table.rising, np.array(rising, dtype=bool))
+
+def noisy_trace(rng: np.random.Generator, length: int, dtype, threshold_lo: float = 1.5, threshold_hi: float = 3.5) -> np.ndarray:
+    """Random levels of a 5 V bus with slow edges, noise, single-sample glitches and samples exactly at the thresholds."""
+    mid = (threshold_lo + threshold_hi) / 2
+    levels = rng.choice([0.0, mid, 5.0], size=length // 20 + 1, p=[0.45, 0.1, 0.45])
+    trace = np.repeat(levels, 20)[:length]
+    trace = np.convolve(trace, np.ones(5) / 5, mode="same")
+    trace += rng.normal(0, 0.3, length)
+    glitches = rng.random(length) < 0.01
+    trace[glitches] = rng.choice([-0.5, threshold_lo, mid, threshold_hi, 5.5], size=glitches.sum())
+    exact = rng.random(length) < 0.01
+    trace[exact] = rng.choice([threshold_lo, threshold_hi], size=exact.sum())
+    # start between the thresholds
+    trace[:3] = mid
+    return trace.astype(dtype)
+
+@pytest.fixture(scope="module")
+def example_captures():
+    return [AnalogWaveform.from_saleae_bin(str(filename), True) for filename in EXAMPLES]
+
+@pytest.mark.parametrize("thresholds", [(1.5, 3.5), (0.99, 2.31)])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("seed", range(5))
+def test_random_traces(seed, dtype, thresholds):
+    rng = np.random.default_rng(seed)
+    samples = noisy_trace(rng, 5000, dtype, *thresholds)
+    assert_reference(DigitalWaveform(waveform(samples), *thresholds).transitions, samples, *thresholds)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 13, 999])
+def test_random_traces_chunked(chunk_size):
+    rng = np.random.default_rng(chunk_size)
+    samples = noisy_trace(rng, 3000, np.float32)
+    dw = DigitalWaveform(waveform(samples), 1.5, 3.5, streaming=True)
+    for offset in range(0, len(samples), chunk_size):
+        dw.feed(samples[offset:offset + chunk_size])
+    assert_reference(dw.transitions, samples, 1.5, 3.5)
+
+def test_constant_traces():
+    for samples in ([], [2.5] * 10, [0.0] * 10, [5.0] * 10, [0.0, 2.5, 2.5, 0.0, 2.5, 5.0]):
+        samples = np.array(samples, dtype=np.float32)
+        detector = EdgeDetector(1.5, 3.5)
+        i_start, i_end, rising, _, _ = detector.feed(samples)
+        assert (i_start.tolist(), i_end.tolist(), rising.tolist()) == reference_transitions(samples, 1.5, 3.5)
+
+@pytest.mark.parametrize("capture", range(len(EXAMPLES)))
+@pytest.mark.parametrize("chunk_size", [None, 1001, 65537])
+def test_example_captures(example_captures, capture, chunk_size):
+    data = example_captures[capture].data
+    # a few slices of the capture, one of them starting between the thresholds
+    in_band = np.flatnonzero((data[:1 << 20] >= 1.5) & (data[:1 << 20] < 3.5))
+    starts = [0, len(data) // 2, len(data) - 200_000, int(in_band[0])]
+    for start in starts:
+        samples = np.asarray(data[start:start + 200_000])
+        if chunk_size is None:
+            table = DigitalWaveform(waveform(samples), 1.5, 3.5).transitions
+        else:
+            dw = DigitalWaveform(waveform(samples), 1.5, 3.5, streaming=True)
+            for offset in range(0, len(samples), chunk_size):
+                dw.feed(samples[offset:offset + chunk_size])
+            table = dw.transitions
+        assert len(table) > 0
+        assert_reference(table, samples, 1.5, 3.5)
+
+@pytest.mark.parametrize("chunk_size", [1001, 1 << 16])
+def test_sweep(chunk_size):
+    sda, _ = I2cWaveformGenerator(nack_probability=0.1, stretch_probability=0.2, seed=5).generate(0.01)
+    thresholds = [(1.5, 3.5), (1.0, 4.0), (0.99, 2.31), (2.4, 2.6)]
+    swept = DigitalWaveform.sweep(sda, thresholds, chunk_size)
+    assert len(swept) == len(thresholds)
+    for (lo, hi), dw in zip(thresholds, swept):
+        expected = DigitalWaveform(sda, lo, hi).transitions
+        assert len(expected) > 100
+        for column in ("i_start", "i_end", "rising", "v1", "v2"):
+            np.testing.assert_array_equal(getattr(dw.transitions, column), getattr(expected, column), err_msg=column)
@@ -1,13 +1,13 @@
 from __future__ import annotations
-from enum import Enum
 #from dataclasses import dataclass
 from typing import List, Optional, Union, Iterator
 from pathlib import Path
 import csv
 import math
-import array
+import itertools
 import struct
 import gzip
+import numpy as np
 
 class AnalogWaveform:
     def __init__(self) -> None:
@@ -17,64 +17,73 @@ class AnalogWaveform:
         self.time_interval: Optional[float] = None
     
     @classmethod
-    def from_saleae_csv(cls, filename: Union[str, Path]) -> List[AnalogWaveform]:
+    def from_saleae_csv(cls, filename: Union[str, Path], columns: Optional[List[int]] = None, block_size: int = 1 << 20) -> List[AnalogWaveform]:
         """
         Create AnalogWaveform instances from a Saleae CSV file.
+
+        Only the requested columns are parsed, block by block, straight into
+        float32 arrays. The time interval is taken from the first two rows.
         
         Args:
             filename: Path to the CSV file
+            columns: 0-based indices of the data columns to load (time column excluded),
+                None loads all data columns
+            block_size: Number of rows parsed at once
             
         Returns:
-            List of AnalogWaveform instances, one per data column
+            List of AnalogWaveform instances, one per requested data column
         """
         try:
             with open(filename, "r", newline='') as fh:
-                reader = csv.reader(fh)
-                headers = next(reader)
-                
-                # Initialize waveforms for each data column (excluding time column)
-                waveforms = [cls() for _ in range(len(headers) - 1)]
-                
+                headers = next(csv.reader([next(fh)]))
+                num_columns = len(headers) - 1
+
+                if columns is None:
+                    columns = list(range(num_columns))
+                if not all(0 <= col < num_columns for col in columns):
+                    raise csv.Error(f"Requested columns {columns} not in file ({num_columns} data columns)")
+
                 # Process first two rows to establish timing parameters
-                first_row = next(reader)
-                second_row = next(reader)
-                
-                base_time = float(first_row[0])
-                time_interval = float(second_row[0]) - base_time
-                
-                # Set timing parameters for all waveforms
-                for wf in waveforms:
-                    wf.time_offset = base_time
-                    wf.time_interval = time_interval
-                
-                # Process first two rows' data
-                for i, value in enumerate(first_row[1:]):
-                    waveforms[i].data.append(float(value))
-                for i, value in enumerate(second_row[1:]):
-                    waveforms[i].data.append(float(value))
-                
-                # Process remaining rows
-                for row in reader:
-                    if len(row) < 2:  # Skip empty or malformed rows
-                        continue
-                    for i, value in enumerate(row[1:]):
-                        waveforms[i].data.append(float(value))
-                        
-                return waveforms
-                
-        except (FileNotFoundError, csv.Error) as e:
+                first_rows = [next(fh), next(fh)]
+                base_time = float(first_rows[0].split(",", 1)[0])
+                time_interval = float(first_rows[1].split(",", 1)[0]) - base_time
+
+                usecols = sorted(set(columns))
+                blocks = []
+                lines = first_rows + list(itertools.islice(fh, block_size))
+                while lines:
+                    blocks.append(np.loadtxt(lines, delimiter=",", usecols=[c + 1 for c in usecols], dtype=np.float32, ndmin=2))
+                    lines = list(itertools.islice(fh, block_size))
+
+        except (FileNotFoundError, StopIteration, csv.Error) as e:
             raise ValueError(f"Error reading CSV file: {e}")
         except ValueError as e:
             raise ValueError(f"Error parsing numeric values: {e}")
+
+        waveforms = []
+        for col in columns:
+            j = usecols.index(col)
+            wf = cls()
+            wf.time_offset = base_time
+            wf.time_interval = time_interval
+            wf.data = np.concatenate([block[:, j] for block in blocks])
+            waveforms.append(wf)
+
+        return waveforms
         
-    @classmethod
-    def from_saleae_bin(cls, filename: str, gzip_compressed: bool = False) -> AnalogWaveform:
+    @staticmethod
+    def _read_saleae_bin_header(f) -> tuple:
+        """
+        Read the header of a Saleae binary export.
+
+        Args:
+            f: File object positioned at the start of the file
+
+        Returns:
+            Tuple (begin_time, sample_rate, downsample, num_samples), f is left at the first sample
+        """
         expected_version = 0
         TYPE_ANALOG = 1
-        if gzip_compressed is True:
-            f= gzip.open(filename, "rb")
-        else:
-            f = open(filename, 'rb')
 
         identifier = f.read(8)
         if identifier != b"<SALEAE>":
@@ -86,15 +95,72 @@ class AnalogWaveform:
             raise Exception("Unexpected data type: {}".format(datatype))
 
         # Parse analog-specific data
-        begin_time, sample_rate, downsample, num_samples = struct.unpack('=dqqq', f.read(32))
+        return struct.unpack('=dqqq', f.read(32))
 
-        wf = cls()
-        wf.time_offset = begin_time
-        wf.time_interval = downsample / sample_rate
+    @staticmethod
+    def _write_saleae_bin_header(f, begin_time: float, sample_rate: float, downsample: int, num_samples: int) -> None:
+        """
+        Write the header of a Saleae binary export, the float32 samples follow.
+
+        Args:
+            f: File object
+            begin_time: Time of the first sample [s]
+            sample_rate: Sample rate of the analyzer [Hz]
+            downsample: Downsampling factor of the export
+            num_samples: Number of samples following the header
+        """
+        f.write(b"<SALEAE>")
+        f.write(struct.pack('=ii', 0, 1))
+        f.write(struct.pack('=dqqq', begin_time, int(sample_rate), downsample, num_samples))
+
+    def to_saleae_bin(self, filename: Union[str, Path], gzip_compressed: bool = False) -> None:
+        """
+        Save as a Saleae binary export (readable by from_saleae_bin).
+
+        Args:
+            filename: Path to the .bin or .bin.gz file
+            gzip_compressed: Whether to gzip the file
+        """
+        with (gzip.open(filename, "wb") if gzip_compressed else open(filename, "wb")) as f:
+            self._write_saleae_bin_header(f, self.time_offset, round(1 / self.time_interval), 1, len(self.data))
+            f.write(np.ascontiguousarray(self.data, dtype=np.float32).data)
 
-        # Parse samples
-        wf.data = array.array("f")
-        wf.data.fromfile(f, num_samples)
+    @classmethod
+    def from_saleae_bin(cls, filename: str, gzip_compressed: bool = False, mmap: bool = True) -> AnalogWaveform:
+        """
+        Create an AnalogWaveform from a Saleae binary export.
+
+        Args:
+            filename: Path to the .bin or .bin.gz file
+            gzip_compressed: Whether the file is gzip compressed
+            mmap: Map uncompressed files into memory instead of reading them.
+                The samples are then paged in by the OS on access, without a copy.
+
+        Returns:
+            AnalogWaveform instance
+        """
+        if gzip_compressed is True:
+            f = gzip.open(filename, "rb")
+        else:
+            f = open(filename, 'rb')
+
+        with f:
+            begin_time, sample_rate, downsample, num_samples = cls._read_saleae_bin_header(f)
+
+            wf = cls()
+            wf.time_offset = begin_time
+            wf.time_interval = downsample / sample_rate
+
+            # Parse samples
+            if gzip_compressed is False and mmap is True and num_samples > 0:
+                wf.data = np.memmap(filename, dtype=np.float32, mode="r", offset=f.tell(), shape=(num_samples,))
+            else:
+                # decompress block by block straight into the sample buffer, no intermediate copy
+                wf.data = np.empty(num_samples, dtype=np.float32)
+                for offset in range(0, num_samples, SaleaeBinStream.DEFAULT_CHUNK_SIZE):
+                    block = wf.data[offset:offset + SaleaeBinStream.DEFAULT_CHUNK_SIZE]
+                    if SaleaeBinStream._readinto(f, block) != len(block):
+                        raise EOFError("Unexpected end of file")
     
         return wf
 
@@ -109,23 +175,52 @@ class AnalogWaveform:
         Returns:
             The value at the specified index
         """
-        if not self.data:
+        if len(self.data) == 0:
             raise ValueError("No data available")
             
         i2 = math.ceil(index)
         if i2 >= len(self.data):
-            return self.data[-1]
+            return float(self.data[-1])
         if i2 <= 0:
-            return self.data[0]
+            return float(self.data[0])
             
         if not interpolate:
-            return self.data[i2]
+            return float(self.data[i2])
             
-        v2 = self.data[i2]
-        v1 = self.data[i2 - 1]
+        v2 = float(self.data[i2])
+        v1 = float(self.data[i2 - 1])
         fraction = index - i2 + 1
         return v1 + (v2 - v1) * fraction
     
+    def values_at_indices(self, index: np.ndarray, interpolate: bool = True) -> np.ndarray:
+        """
+        Vectorized version of value_at_index for an array of indices.
+
+        Args:
+            index: Array of indices to query (can be fractional)
+            interpolate: Whether to interpolate between points
+
+        Returns:
+            Array of values (float64) at the specified indices
+        """
+        index = np.asarray(index, dtype=np.float64)
+        if len(index) == 0:
+            return np.array([], dtype=np.float64)
+        if len(self.data) == 0:
+            raise ValueError("No data available")
+
+        data = np.asarray(self.data)
+        i2 = np.clip(np.ceil(index).astype(np.int64), 0, len(data) - 1)
+        v2 = data[i2].astype(np.float64)
+        if not interpolate:
+            return v2
+
+        v1 = data[np.maximum(i2 - 1, 0)].astype(np.float64)
+        fraction = index - i2 + 1
+        result = v1 + (v2 - v1) * fraction
+        # out of range indices are clamped to the first and last value
+        return np.where((i2 <= 0) | (np.ceil(index) >= len(data)), v2, result)
+
     def time_at_index(self, index: int) -> float:
         """Convert index to time value."""
         if self.time_interval is None:
@@ -137,7 +232,7 @@ class AnalogWaveform:
         Convert time to index value.
         
         Args:
-            time: The time to convert
+            time: The time to convert (scalar or array)
             limit: Whether to limit the result to valid indices
             
         Returns:
@@ -150,7 +245,9 @@ class AnalogWaveform:
         
         if not limit:
             return index
-            
+
+        if isinstance(index, np.ndarray):
+            return np.clip(index, 0, len(self.data) - 1)
         return max(0, min(index, len(self.data) - 1))
     
     def get_range_index(self, start: Optional[int] = None, end: Optional[int] = None) -> List[float]:
@@ -164,7 +261,7 @@ class AnalogWaveform:
         Returns:
             List of values within the specified range
         """
-        if not self.data:
+        if len(self.data) == 0:
             return []
             
         start = max(0, math.floor(start) if start is not None else 0)
@@ -196,32 +293,317 @@ class AnalogWaveform:
                   
         return self.get_range_index(start_idx, end_idx)
     
+    def minmax_pyramid(self, samples_per_bin: int = 64, factor: int = 4, chunk_size: int = 1 << 20) -> MinMaxPyramid:
+        """
+        Build the min/max pyramid of the samples in one pass, chunk by chunk (memory-mapped samples are paged in once).
+
+        Args:
+            samples_per_bin: Samples per bin of the finest level
+            factor: Bins of a level merged into one bin of the next level
+            chunk_size: Number of samples processed at once
+        """
+        pyramid = MinMaxPyramid(self.time_offset, self.time_interval, samples_per_bin, factor)
+        for offset in range(0, len(self.data), chunk_size):
+            pyramid.feed(self.data[offset:offset + chunk_size])
+        pyramid.finish()
+        return pyramid
+
     def __len__(self) -> int:
         return len(self.data)
     
     def __iter__(self) -> Iterator[float]:
         return iter(self.data)
 
-class Edge:
-    def __init__(self, waveform: DigitalWaveform, i_start: float, i_end: float) -> None:
-        self.dw = waveform
-        
-        self.i_start = i_start
-        self.i_end = i_end
-        self.slope = None
+class SaleaeBinStream:
+    """
+    Chunked reader for Saleae binary exports (.bin or .bin.gz).
+
+    The samples are decompressed in fixed-size blocks and yielded as float32
+    arrays, so memory usage is bounded by the chunk size instead of the capture length.
+
+    Usage:
+        with SaleaeBinStream("analog_0.bin.gz", True) as stream:
+            for chunk in stream:
+                ...
+    """
+    DEFAULT_CHUNK_SIZE = 1 << 20
 
-        self.slope_prev = None
-        self.slope_next = None
+    def __init__(self, filename: Union[str, Path], gzip_compressed: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        """
+        Open the file and parse its header.
+
+        Args:
+            filename: Path to the .bin or .bin.gz file
+            gzip_compressed: Whether the file is gzip compressed
+            chunk_size: Number of samples per chunk
+        """
+        assert chunk_size > 0, "Chunk size must be > 0"
+        self.filename = filename
+        self.chunk_size = chunk_size
+
+        if gzip_compressed is True:
+            self.file = gzip.open(filename, "rb")
+        else:
+            self.file = open(filename, "rb")
+
+        begin_time, sample_rate, downsample, num_samples = AnalogWaveform._read_saleae_bin_header(self.file)
+        self.time_offset: float = begin_time
+        self.time_interval: float = downsample / sample_rate
+        self.num_samples: int = num_samples
 
     @staticmethod
-    def _interpolate_index(digital_waveform, level: float, index: int):
-        v2 = digital_waveform.awf.data[index]
-        if index == 0:
-            return index
-        
-        v1 = digital_waveform.awf.data[index - 1]
+    def _readinto(f, block: np.ndarray) -> int:
+        """Fill block from f, returns the number of samples read."""
+        view = memoryview(block).cast("B")
+        nbytes = 0
+        while nbytes < len(view):
+            n = f.readinto(view[nbytes:])
+            if not n:
+                break
+            nbytes += n
+        return nbytes // block.itemsize
+
+    def waveform(self) -> AnalogWaveform:
+        """Get an AnalogWaveform with the timing parameters of the stream, but without samples."""
+        wf = AnalogWaveform()
+        wf.time_offset = self.time_offset
+        wf.time_interval = self.time_interval
+        return wf
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        remaining = self.num_samples
+        while remaining > 0:
+            block = np.empty(min(self.chunk_size, remaining), dtype=np.float32)
+            n = self._readinto(self.file, block)
+            if n != len(block):
+                raise EOFError("Unexpected end of file")
+            remaining -= n
+            yield block
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> SaleaeBinStream:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class MinMaxPyramid:
+    """
+    Min/max level-of-detail pyramid of a waveform, like the peak detect decimation of an oscilloscope.
+
+    Every bin of the finest level holds the minimum and maximum of samples_per_bin
+    samples, every bin of the next level the ones of factor bins of the level below,
+    up to a level with a single bin. Peaks survive at every level, so a glitch of
+    one sample is still visible when the whole capture is shown.
+
+    The samples are fed chunk by chunk, full groups are merged to the next level
+    as soon as they are complete, so the pyramid is built in one O(N) pass and only
+    the bins (not the samples) are kept.
+
+    The file format (save(), load()) is meant for viewers fetching the part of a
+    level they display, in tiles of tile_size bins at fixed offsets:
+    * header: "<MINMAX>", version (int32), number of levels (int32), time offset
+      and time interval of the samples (float64), number of samples and tile size (int64)
+    * per level: samples per bin, number of bins, file offset of the bins (int64)
+    * per level: the bins as (min, max) float32 pairs, bin i starting at sample i * samples per bin
+
+    All values are little-endian.
+    """
+    MAGIC = b"<MINMAX>"
+    VERSION = 1
+    DEFAULT_SAMPLES_PER_BIN = 64
+    DEFAULT_FACTOR = 4
+    DEFAULT_TILE_SIZE = 1024
+
+    def __init__(self, time_offset: float = 0.0, time_interval: float = 1.0, samples_per_bin: int = DEFAULT_SAMPLES_PER_BIN,
+                 factor: int = DEFAULT_FACTOR) -> None:
+        """
+        Args:
+            time_offset: Time of the first sample [s]
+            time_interval: Time between two samples [s]
+            samples_per_bin: Samples per bin of the finest level
+            factor: Bins of a level merged into one bin of the next level
+        """
+        assert samples_per_bin > 0 and factor > 1, "Need at least 1 sample per bin and a factor of at least 2"
+        self.time_offset = time_offset
+        self.time_interval = time_interval
+        self.samples_per_bin = samples_per_bin
+        self.factor = factor
+        self.num_samples = 0
+
+        self._min: List[GrowableArray] = []
+        self._max: List[GrowableArray] = []
+        self._merged: List[int] = []
+        """Number of bins of every level that are merged into the next level"""
+        self._pending = np.empty(0, dtype=np.float32)
+        """Samples of the last, incomplete bin of the finest level"""
+
+    @property
+    def levels(self) -> int:
+        return len(self._min)
+
+    def bin_samples(self, level: int) -> int:
+        """Number of samples per bin of a level."""
+        return self.samples_per_bin * self.factor ** level
+
+    def bins(self, level: int) -> tuple:
+        """Tuple (minimum, maximum) of every bin of a level."""
+        return self._min[level].values, self._max[level].values
+
+    def _add(self, level: int, mins: np.ndarray, maxs: np.ndarray) -> None:
+        """Append bins to a level and merge the groups completed by them into the next level."""
+        if level == self.levels:
+            self._min.append(GrowableArray(np.float32))
+            self._max.append(GrowableArray(np.float32))
+            self._merged.append(0)
+        self._min[level].extend(mins)
+        self._max[level].extend(maxs)
+
+        merged = self._merged[level]
+        full = (len(self._min[level]) - merged) // self.factor * self.factor
+        if full > 0:
+            end = merged + full
+            self._merged[level] = end
+            self._add(level + 1, self._min[level].values[merged:end].reshape(-1, self.factor).min(axis=1),
+                                 self._max[level].values[merged:end].reshape(-1, self.factor).max(axis=1))
+
+    def feed(self, chunk) -> None:
+        """Add the next chunk of samples."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        self.num_samples += len(chunk)
+        if len(self._pending) > 0:
+            chunk = np.concatenate((self._pending, chunk))
+        full = len(chunk) // self.samples_per_bin * self.samples_per_bin
+        if full > 0:
+            samples = chunk[:full].reshape(-1, self.samples_per_bin)
+            self._add(0, samples.min(axis=1), samples.max(axis=1))
+        self._pending = chunk[full:].copy()
+
+    def finish(self) -> None:
+        """Close the incomplete bins after the last chunk, up to a level with a single bin."""
+        if len(self._pending) > 0:
+            self._add(0, self._pending.min(keepdims=True), self._pending.max(keepdims=True))
+            self._pending = np.empty(0, dtype=np.float32)
+
+        level = 0
+        while level < self.levels and len(self._min[level]) > 1:
+            merged = self._merged[level]
+            if merged < len(self._min[level]):
+                self._merged[level] = len(self._min[level])
+                self._add(level + 1, self._min[level].values[merged:].min(keepdims=True),
+                                     self._max[level].values[merged:].max(keepdims=True))
+            level += 1
+
+    def view(self, t_start: float, t_end: float, points: int = 1000) -> tuple:
+        """
+        Get the bins of a time range from the finest level with at most points bins in it.
 
-        return index - 1 + (level - v1) / (v2 - v1)
+        Returns:
+            Tuple (level, start time of every bin [s], minimum, maximum)
+        """
+        level = 0
+        while level < self.levels - 1 and (t_end - t_start) / (self.bin_samples(level) * self.time_interval) > points:
+            level += 1
+        width = self.bin_samples(level) * self.time_interval
+        first = max(int(math.floor((t_start - self.time_offset) / width)), 0)
+        last = max(int(math.ceil((t_end - self.time_offset) / width)), first)
+        mins, maxs = self.bins(level)
+        mins, maxs = mins[first:last], maxs[first:last]
+        return level, self.time_offset + (first + np.arange(len(mins))) * width, mins, maxs
+
+    def save(self, filename: Union[str, Path], tile_size: int = DEFAULT_TILE_SIZE) -> None:
+        """
+        Save the pyramid (see the file format above).
+
+        Args:
+            filename: Path of the file
+            tile_size: Number of bins per tile the viewer is expected to fetch at once
+        """
+        offset = 8 + 8 + 32 + 24 * self.levels
+        directory = []
+        for level in range(self.levels):
+            directory.append((self.bin_samples(level), len(self._min[level]), offset))
+            offset += len(self._min[level]) * 8
+
+        with open(filename, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack("<ii", self.VERSION, self.levels))
+            f.write(struct.pack("<ddqq", self.time_offset, self.time_interval, self.num_samples, tile_size))
+            for entry in directory:
+                f.write(struct.pack("<qqq", *entry))
+            for level in range(self.levels):
+                pairs = np.empty((len(self._min[level]), 2), dtype="<f4")
+                pairs[:, 0], pairs[:, 1] = self.bins(level)
+                f.write(pairs.data)
+
+    @classmethod
+    def load(cls, filename: Union[str, Path]) -> MinMaxPyramid:
+        """Load a pyramid saved with save()."""
+        with open(filename, "rb") as f:
+            if f.read(8) != cls.MAGIC:
+                raise ValueError(f"'{filename}' is not a min/max pyramid")
+            version, levels = struct.unpack("<ii", f.read(8))
+            if version != cls.VERSION:
+                raise ValueError(f"Unsupported min/max pyramid version {version}")
+            time_offset, time_interval, num_samples, tile_size = struct.unpack("<ddqq", f.read(32))
+            directory = [struct.unpack("<qqq", f.read(24)) for _ in range(levels)]
+
+        samples_per_bin = directory[0][0] if levels > 0 else cls.DEFAULT_SAMPLES_PER_BIN
+        factor = directory[1][0] // directory[0][0] if levels > 1 else cls.DEFAULT_FACTOR
+        pyramid = cls(time_offset, time_interval, samples_per_bin, factor)
+        pyramid.num_samples = num_samples
+        with open(filename, "rb") as f:
+            for _, count, offset in directory:
+                f.seek(offset)
+                pairs = np.fromfile(f, dtype="<f4", count=2 * count).reshape(-1, 2)
+                for columns, column in ((pyramid._min, pairs[:, 0]), (pyramid._max, pairs[:, 1])):
+                    columns.append(GrowableArray(np.float32))
+                    columns[-1].extend(column)
+                pyramid._merged.append(count)
+        return pyramid
+
+class Edge:
+    """
+    View on a single row of an EdgeTable.
+
+    Edge instances don't hold any data, they are created on demand when an
+    edge of DigitalWaveform.transitions is accessed.
+    """
+    __slots__ = ("table", "position")
+    slope = None
+
+    def __init__(self, table: EdgeTable, position: int) -> None:
+        self.table = table
+        self.position = position
+
+    @property
+    def dw(self) -> DigitalWaveform:
+        return self.table.dw
+
+    @property
+    def i_start(self) -> float:
+        return float(self.table.i_start[self.position])
+
+    @property
+    def i_end(self) -> float:
+        return float(self.table.i_end[self.position])
+
+    @property
+    def slope_prev(self) -> Optional[Edge]:
+        if self.position == 0:
+            return None
+        return self.table[self.position - 1]
+
+    @property
+    def slope_next(self) -> Optional[Edge]:
+        if self.position + 1 >= len(self.table):
+            return None
+        return self.table[self.position + 1]
     
     def get_time(self, interpolated: bool = False):
         ad = self.dw.awf
@@ -229,70 +611,437 @@ class Edge:
 
     @property
     def t1(self):
-        return self.dw.awf.time_at_index(self.i_start)
+        return float(self.table.t1[self.position])
 
     @property
     def t2(self):
-        return self.dw.awf.time_at_index(self.i_end)
+        return float(self.table.t2[self.position])
 
     @property
     def transition_time(self):
-        return self.t2 - self.t1
+        return float(self.table.transition_time[self.position])
 
     @property
     def v1(self):
-        return self.dw.awf.value_at_index(self.i_start)
+        return float(self.table.v1[self.position])
 
     @property
     def v2(self):
-        return self.dw.awf.value_at_index(self.i_end)
+        return float(self.table.v2[self.position])
 
     @property
     def slewrate(self):
-        dt = (self.i_end - self.i_start) * self.dw.awf.time_interval
-        if dt == 0:
+        slewrate = self.table.slewrate[self.position]
+        if np.isnan(slewrate):
             return None
-        return (self.v2 - self.v1) / dt
+        return float(slewrate)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Edge) and self.table is other.table and self.position == other.position
+
+    def __hash__(self) -> int:
+        return hash((id(self.table), self.position))
 
 class RisingEdge(Edge):
-    def __init__(self, waveform: "DigitalWaveform", i_start, i_end):
-        i_start = Edge._interpolate_index(waveform, waveform.threshold_lo, math.ceil(i_start))
-        i_end = Edge._interpolate_index(waveform, waveform.threshold_hi, math.ceil(i_end))
-        super().__init__(waveform, i_start, i_end)
-        self.slope = True
+    __slots__ = ()
+    slope = True
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} index={self.i_start}->{self.i_end}>"
 
 class FallingEdge(Edge):
-    def __init__(self, waveform: "DigitalWaveform", i_start, i_end):
-        i_start = Edge._interpolate_index(waveform, waveform.threshold_hi, math.ceil(i_start))
-        i_end = Edge._interpolate_index(waveform, waveform.threshold_lo, math.ceil(i_end))
-        super().__init__(waveform, i_start, i_end)
-        self.slope = False
+    __slots__ = ()
+    slope = False
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} index={self.i_start}->{self.i_end}>"
 
-class SignalState(Enum):
-    LO = 0
-    LO_RISE = 1
-    HI_RISE = 2
-    HI = 3
-    HI_FALL = 4
-    LO_FALL = 5
-    UNKNOWN = 6
+class GrowableArray:
+    """Append-only numpy array with amortized constant time growth."""
+    def __init__(self, dtype = np.float64) -> None:
+        self._data = np.empty(0, dtype=dtype)
+        self._n = 0
+
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=self._data.dtype)
+        n = self._n + len(values)
+        if n > len(self._data):
+            data = np.empty(max(n, 2 * len(self._data)), dtype=self._data.dtype)
+            data[:self._n] = self._data[:self._n]
+            self._data = data
+        self._data[self._n:n] = values
+        self._n = n
 
     @property
-    def is_low_state(self) -> bool:
-        return self in (SignalState.LO, SignalState.LO_RISE, SignalState.LO_FALL)
-    
+    def values(self) -> np.ndarray:
+        """View on the valid part of the buffer."""
+        return self._data[:self._n]
+
+    def __len__(self) -> int:
+        return self._n
+
+class EdgeTable:
+    """
+    Columnar storage of the transitions of a DigitalWaveform.
+
+    All edges are kept in parallel numpy arrays, Edge objects are only created
+    when a single edge is accessed by index or iteration.
+    Edges can be appended chunk by chunk with extend().
+    """
+    def __init__(self, waveform: DigitalWaveform, i_start = (), i_end = (), rising = (), v1 = None, v2 = None) -> None:
+        """
+        Initialize the table and precompute the derived columns.
+
+        Args:
+            waveform: DigitalWaveform the edges belong to
+            i_start: Interpolated start index of each edge
+            i_end: Interpolated end index of each edge (strictly increasing)
+            rising: True for rising, False for falling edges
+            v1: Voltage at i_start, taken from the analog waveform if None
+            v2: Voltage at i_end, taken from the analog waveform if None
+        """
+        self.dw = waveform
+        self._columns = {
+            "i_start" : GrowableArray(np.float64),
+            "i_end" : GrowableArray(np.float64),
+            "rising" : GrowableArray(bool),
+            "t1" : GrowableArray(np.float64),
+            "t2" : GrowableArray(np.float64),
+            "transition_time" : GrowableArray(np.float64),
+            "v1" : GrowableArray(np.float64),
+            "v2" : GrowableArray(np.float64),
+            "slewrate" : GrowableArray(np.float64),
+            # positions and end indices of rising and falling edges for the polarity-aware searches
+            "pos_rising" : GrowableArray(np.int64),
+            "pos_falling" : GrowableArray(np.int64),
+            "i_end_rising" : GrowableArray(np.float64),
+            "i_end_falling" : GrowableArray(np.float64),
+        }
+        self.extend(i_start, i_end, rising, v1, v2)
+
+    def extend(self, i_start, i_end, rising, v1 = None, v2 = None) -> None:
+        """Append edges to the table, their i_end must be larger than the last one in the table."""
+        i_start = np.asarray(i_start, dtype=np.float64)
+        i_end = np.asarray(i_end, dtype=np.float64)
+        rising = np.asarray(rising, dtype=bool)
+
+        awf = self.dw.awf
+        if v1 is None:
+            v1 = awf.values_at_indices(i_start)
+        if v2 is None:
+            v2 = awf.values_at_indices(i_end)
+        v1 = np.asarray(v1, dtype=np.float64)
+        v2 = np.asarray(v2, dtype=np.float64)
+
+        t1 = awf.time_at_index(i_start)
+        t2 = awf.time_at_index(i_end)
+        dt = (i_end - i_start) * awf.time_interval
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slewrate = np.where(dt == 0, np.nan, (v2 - v1) / dt)
+
+        offset = len(self)
+        pos_rising = np.flatnonzero(rising)
+        pos_falling = np.flatnonzero(~rising)
+
+        c = self._columns
+        c["pos_rising"].extend(pos_rising + offset)
+        c["pos_falling"].extend(pos_falling + offset)
+        c["i_end_rising"].extend(i_end[pos_rising])
+        c["i_end_falling"].extend(i_end[pos_falling])
+        c["i_start"].extend(i_start)
+        c["i_end"].extend(i_end)
+        c["rising"].extend(rising)
+        c["t1"].extend(t1)
+        c["t2"].extend(t2)
+        c["transition_time"].extend(t2 - t1)
+        c["v1"].extend(v1)
+        c["v2"].extend(v2)
+        c["slewrate"].extend(slewrate)
+
+    @property
+    def i_start(self) -> np.ndarray:
+        return self._columns["i_start"].values
+
+    @property
+    def i_end(self) -> np.ndarray:
+        return self._columns["i_end"].values
+
+    @property
+    def rising(self) -> np.ndarray:
+        return self._columns["rising"].values
+
+    @property
+    def t1(self) -> np.ndarray:
+        return self._columns["t1"].values
+
+    @property
+    def t2(self) -> np.ndarray:
+        return self._columns["t2"].values
+
+    @property
+    def transition_time(self) -> np.ndarray:
+        return self._columns["transition_time"].values
+
+    @property
+    def v1(self) -> np.ndarray:
+        return self._columns["v1"].values
+
+    @property
+    def v2(self) -> np.ndarray:
+        return self._columns["v2"].values
+
     @property
-    def is_high_state(self) -> bool:
-        return self in (SignalState.HI, SignalState.HI_RISE, SignalState.HI_FALL)
+    def slewrate(self) -> np.ndarray:
+        return self._columns["slewrate"].values
+
+    @property
+    def pos_rising(self) -> np.ndarray:
+        return self._columns["pos_rising"].values
+
+    @property
+    def pos_falling(self) -> np.ndarray:
+        return self._columns["pos_falling"].values
+
+    @property
+    def i_end_rising(self) -> np.ndarray:
+        return self._columns["i_end_rising"].values
+
+    @property
+    def i_end_falling(self) -> np.ndarray:
+        return self._columns["i_end_falling"].values
+
+    def __len__(self) -> int:
+        return len(self._columns["i_end"])
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Edge, List[Edge]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("edge index out of range")
+        return (RisingEdge if self.rising[index] else FallingEdge)(self, index)
+
+    def __iter__(self) -> Iterator[Edge]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def first_after(self, index: float, slope: Optional[bool] = None) -> Optional[int]:
+        """
+        Find the first edge ending after index.
+
+        Args:
+            index: Sample index to search from (exclusive)
+            slope: True for rising, False for falling, None for any edge
+
+        Returns:
+            Position of the edge in the table or None
+        """
+        if slope is None:
+            i_end = self.i_end
+            pos = int(np.searchsorted(i_end, index, side="right"))
+            return pos if pos < len(i_end) else None
+
+        if slope is True:
+            positions, i_end = self.pos_rising, self.i_end_rising
+        else:
+            positions, i_end = self.pos_falling, self.i_end_falling
+        i = int(np.searchsorted(i_end, index, side="right"))
+        return int(positions[i]) if i < len(positions) else None
+
+class EdgeDetector:
+    """
+    Vectorized hysteresis edge detector.
+
+    Gives the same edges as a per-sample hysteresis state machine (see test_waveforms.py):
+    * every sample is classified as low (< threshold_lo), mid or high (>= threshold_hi)
+    * the hysteresis level flips whenever a low or high sample follows a sample
+      of the opposite class, mid samples in between keep the previous level
+    * entering the mid band from low (or high) sets the marker of a rising (or falling) edge
+    * on a flip, an edge is emitted if the most recent marker has the matching direction
+
+    The samples can be fed in consecutive chunks. The hysteresis level, the pending marker
+    and the last samples of the previous chunk are carried over, so edges straddling a chunk
+    boundary are found exactly like with a single call over the whole capture.
+    """
+    # samples of the previous chunk needed to interpolate at the start of the next one
+    TAIL = 2
+
+    def __init__(self, threshold_lo: float, threshold_hi: float) -> None:
+        # compare against float64 scalars, otherwise numpy would round the thresholds to the sample dtype
+        self.threshold_lo = np.float64(threshold_lo)
+        self.threshold_hi = np.float64(threshold_hi)
+
+        self.offset = 0
+        """Absolute index of the next sample to be fed"""
+        self.level: Optional[int] = None
+        """Class of the last sample outside the band (0: low, 2: high), None before the first one"""
+        self.marker: Optional[tuple] = None
+        """Most recent band entry as (index, rising, i_start, v1)"""
+        self.window = np.empty(0, dtype=np.float32)
+        """Last fed chunk, prepended by the tail of the chunk before"""
+        self.window_offset = 0
+        """Absolute index of the first sample in window"""
+
+    def _classify(self, data: np.ndarray) -> np.ndarray:
+        # 0: low, 1: between thresholds, 2: high
+        cls = (data >= self.threshold_hi).view(np.int8) * np.int8(2)
+        cls += ((data >= self.threshold_lo) & (data < self.threshold_hi)).view(np.int8)
+        return cls
+
+    @staticmethod
+    def _interpolate_indices(buf: np.ndarray, offset: int, level: np.ndarray, pos: np.ndarray) -> np.ndarray:
+        """Indices where the waveform crosses level between the samples pos - 1 and pos of buf, which starts at absolute index offset."""
+        index = pos + offset
+        v2 = buf[pos].astype(np.float64)
+        v1 = buf[np.maximum(pos - 1, 0)].astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = (index - 1) + (level - v1) / (v2 - v1)
+        return np.where(index == 0, index, result).astype(np.float64)
+
+    @staticmethod
+    def _values_at(buf: np.ndarray, offset: int, index: np.ndarray) -> np.ndarray:
+        """Vectorized version of AnalogWaveform.value_at_index on buf, which starts at absolute index offset."""
+        index = np.asarray(index, dtype=np.float64)
+        i2 = np.ceil(index).astype(np.int64)
+        pos = np.clip(i2 - offset, 0, len(buf) - 1)
+        v2 = buf[pos].astype(np.float64)
+        v1 = buf[np.maximum(pos - 1, 0)].astype(np.float64)
+        result = v1 + (v2 - v1) * (index - i2 + 1)
+        return np.where(i2 <= 0, v2, result)
+
+    def values_at(self, index: np.ndarray) -> np.ndarray:
+        """
+        Get the interpolated voltages at absolute indices within the current window.
+
+        Args:
+            index: Array of indices, ceil(index) - 1 must not be before window_offset
+        """
+        if len(index) == 0:
+            return np.array([], dtype=np.float64)
+        return self._values_at(self.window, self.window_offset, index)
+
+    def resume(self, data: np.ndarray, index: int, block_size: int = 1 << 16) -> None:
+        """
+        Set the state as if all samples of data before index had been fed.
+
+        The hysteresis level and the pending marker are recovered by scanning
+        backwards from index, this usually only touches the samples since the last edge.
+
+        Args:
+            data: Samples of the whole capture (e.g. memory-mapped)
+            index: Index of the next sample to be fed
+            block_size: Number of samples classified at once while scanning
+        """
+        self.offset = index
+        self.window_offset = max(index - self.TAIL, 0)
+        self.window = np.asarray(data[self.window_offset:index])
+        self.level = None
+        self.marker = None
+
+        end = index
+        while end > 0 and (self.level is None or self.marker is None):
+            start = max(end - block_size, 0)
+            # one more sample in front to see where the band was entered
+            buf = np.asarray(data[max(start - 1, 0):end])
+            cls = self._classify(buf)
+            first = 1 if start > 0 else 0
+
+            if self.level is None:
+                defined = np.flatnonzero(cls[first:] != 1)
+                if len(defined) > 0:
+                    self.level = int(cls[first + defined[-1]])
+
+            if self.marker is None:
+                entries = np.flatnonzero((cls[1:] == 1) & (cls[:-1] != 1)) + 1
+                entries = entries[entries >= first]
+                if len(entries) > 0:
+                    m = int(entries[-1]) + max(start - 1, 0)
+                    rising = bool(cls[entries[-1] - 1] == 0)
+                    buf = np.asarray(data[max(m - self.TAIL, 0):m + 1])
+                    buf_offset = max(m - self.TAIL, 0)
+                    level = self.threshold_lo if rising else self.threshold_hi
+                    i_start = self._interpolate_indices(buf, buf_offset, np.array([level]), np.array([m - buf_offset]))
+                    v1 = self._values_at(buf, buf_offset, i_start)
+                    self.marker = (m, rising, float(i_start[0]), float(v1[0]))
+
+            end = start
+
+    def feed(self, chunk) -> tuple:
+        """
+        Process the next chunk of samples.
+
+        Args:
+            chunk: Samples following the previously fed ones
+
+        Returns:
+            Tuple of arrays (i_start, i_end, rising, v1, v2) of the edges completed in this chunk,
+            with absolute interpolated indices and the voltages at them
+        """
+        chunk = np.asarray(chunk)
+        tail = self.window[-self.TAIL:]
+        buf = np.concatenate((tail, chunk)) if len(tail) > 0 else chunk
+        offset = self.offset - len(tail)
+        first = len(tail)
+
+        cls = self._classify(buf)
+
+        # the classes only change at a few positions, the markers and flips are a subset of them
+        start = max(first, 1)
+        changes = np.flatnonzero(cls[start:] != cls[start - 1:-1]) + start
+        change_cls = cls[changes]
+
+        # entering the band between the thresholds sets the marker for the next edge
+        markers = changes[change_cls == 1]
+        marker_rising = cls[markers - 1] == 0
+
+        defined = changes[change_cls != 1]
+        defined_cls = cls[defined]
+        level = self.level
+        if level is None:
+            is_defined = cls[first:] != 1
+            if is_defined.any():
+                level = int(cls[first + int(np.argmax(is_defined))])
+        prev_cls = np.concatenate(([level if level is not None else 1], defined_cls[:-1])).astype(np.int8)
+        is_flip = (defined_cls != prev_cls) & (prev_cls != 1)
+        flips = defined[is_flip]
+        flip_rising = defined_cls[is_flip] == 2
+        if len(defined_cls) > 0:
+            level = int(defined_cls[-1])
+
+        marker_i_start = self._interpolate_indices(buf, offset, np.where(marker_rising, self.threshold_lo, self.threshold_hi), markers)
+        marker_v1 = self._values_at(buf, offset, marker_i_start)
+        marker_index = markers + offset
+
+        # the marker of the previous chunk is still valid until the first one of this chunk
+        if self.marker is not None:
+            marker_index = np.concatenate(([self.marker[0]], marker_index))
+            marker_rising = np.concatenate(([self.marker[1]], marker_rising))
+            marker_i_start = np.concatenate(([self.marker[2]], marker_i_start))
+            marker_v1 = np.concatenate(([self.marker[3]], marker_v1))
+
+        # most recent marker before each flip, edge is only valid if the directions match
+        m = np.searchsorted(marker_index, flips + offset) - 1
+        valid = m >= 0
+        valid[valid] = marker_rising[m[valid]] == flip_rising[valid]
+        m = m[valid]
+        flips = flips[valid]
+        rising = flip_rising[valid]
+
+        i_end = self._interpolate_indices(buf, offset, np.where(rising, self.threshold_hi, self.threshold_lo), flips)
+        v2 = self._values_at(buf, offset, i_end)
+
+        if len(marker_index) > 0:
+            self.marker = (int(marker_index[-1]), bool(marker_rising[-1]), float(marker_i_start[-1]), float(marker_v1[-1]))
+        self.level = level
+        self.window = buf
+        self.window_offset = offset
+        self.offset += len(chunk)
+
+        return marker_i_start[m], i_end, rising, marker_v1[m], v2
 
 class DigitalWaveform:
-    def __init__(self, analog_data: AnalogWaveform, threshold_lo: float, threshold_hi: float):
+    def __init__(self, analog_data: AnalogWaveform, threshold_lo: float, threshold_hi: float, streaming: bool = False):
         """
         Initialize DigitalWaveform with analog data and threshold values.
         
@@ -300,38 +1049,65 @@ class DigitalWaveform:
             analog_data: Source analog waveform data
             threshold_lo: Lower threshold voltage
             threshold_hi: Higher threshold voltage
+            streaming: Don't process analog_data, the samples are passed chunk by chunk
+                to feed() instead. analog_data then only provides the timing parameters.
         """
         self.awf = analog_data
         self.threshold_lo = threshold_lo
         self.threshold_hi = threshold_hi
-        self.transitions = self._compute_transitions()
+        self._detector: Optional[EdgeDetector] = None
 
-    def time_at_index(self, index: int) -> float:
-        """Get time value at given index."""
-        return self.awf.time_at_index(index)
+        if streaming is True:
+            self._detector = EdgeDetector(threshold_lo, threshold_hi)
+            self.transitions = EdgeTable(self)
+        else:
+            self.transitions = self._compute_transitions()
 
-    def _get_state(self, voltage: float, prev_state: SignalState = SignalState.UNKNOWN) -> SignalState:
+    def feed(self, chunk) -> int:
         """
-        Determine signal state based on voltage and previous state.
-        Uses a more efficient state transition logic with early returns.
+        Process the next chunk of samples in streaming mode.
+
+        Args:
+            chunk: Samples following the previously fed ones
+
+        Returns:
+            Number of transitions found in this chunk, they are appended to transitions
         """
-        if voltage >= self.threshold_hi:
-            if prev_state.is_low_state:
-                return SignalState.HI_RISE
-            if prev_state in (SignalState.HI_FALL, SignalState.UNKNOWN):
-                return SignalState.HI
-        elif voltage < self.threshold_lo:
-            if prev_state.is_high_state:
-                return SignalState.LO_FALL
-            if prev_state in (SignalState.LO_RISE, SignalState.UNKNOWN):
-                return SignalState.LO
-        else:  # voltage between thresholds
-            if prev_state in (SignalState.LO, SignalState.LO_FALL):
-                return SignalState.LO_RISE
-            if prev_state in (SignalState.HI, SignalState.HI_RISE):
-                return SignalState.HI_FALL
-        
-        return prev_state
+        assert self._detector is not None, "DigitalWaveform is not in streaming mode"
+        i_start, i_end, rising, v1, v2 = self._detector.feed(chunk)
+        self.transitions.extend(i_start, i_end, rising, v1, v2)
+        return len(i_end)
+
+    @classmethod
+    def sweep(cls, analog_data: AnalogWaveform, thresholds, chunk_size: int = 1 << 16) -> List["DigitalWaveform"]:
+        """
+        Digitize with many threshold pairs in a single pass over the samples.
+
+        Every chunk of samples is read once (from memory, a memory-mapped file...)
+        and fed to the edge detectors of all threshold pairs while it is in the cache.
+
+        Args:
+            analog_data: Source analog waveform data
+            thresholds: (threshold_lo, threshold_hi) pairs
+            chunk_size: Number of samples processed at once
+
+        Returns:
+            One DigitalWaveform per threshold pair, same as DigitalWaveform(analog_data, lo, hi)
+        """
+        waveforms = [cls(analog_data, lo, hi, streaming=True) for lo, hi in thresholds]
+        for offset in range(0, len(analog_data.data), chunk_size):
+            chunk = np.asarray(analog_data.data[offset:offset + chunk_size])
+            for dw in waveforms:
+                dw.feed(chunk)
+
+        # the samples are available, no need for the detector's window anymore
+        for dw in waveforms:
+            dw._detector = None
+        return waveforms
+
+    def time_at_index(self, index: int) -> float:
+        """Get time value at given index."""
+        return self.awf.time_at_index(index)
 
     def level_at(self, index: Union[int, float], interpolate: bool = True) -> Optional[bool]:
         """
@@ -347,64 +1123,43 @@ class DigitalWaveform:
             return False
         return None
 
-    def _compute_transitions(self) -> List[Edge]:
+    def levels_at(self, index: np.ndarray, interpolate: bool = True) -> np.ndarray:
         """
-        Compute signal transitions using a more efficient single-pass algorithm.
+        Vectorized version of level_at.
+
+        In streaming mode without analog data, the indices must be within the last fed chunk.
+
+        Returns:
+            Array of levels, 1 for high, 0 for low, -1 for undefined
         """
-        transitions = []
-        prev_slope = None
-        prev_state = SignalState.UNKNOWN
-        marker: Optional[tuple[int, SignalState]] = None
-        
-        for i, voltage in enumerate(self.awf.data):
-            state = self._get_state(voltage, prev_state)
-            
-            if state == SignalState.UNKNOWN or prev_state == SignalState.UNKNOWN:
-                prev_state = state
-                continue
-                
-            if state != prev_state:
-                if state in (SignalState.LO_RISE, SignalState.HI_FALL):
-                    marker = (i, state)
-                elif state == SignalState.HI_RISE and marker and marker[1] == SignalState.LO_RISE:
-                    slope = RisingEdge(self, marker[0], i)
-                    self._link_slope(slope, prev_slope)
-                    transitions.append(slope)
-                    prev_slope = slope
-                elif state == SignalState.LO_FALL and marker and marker[1] == SignalState.HI_FALL:
-                    slope = FallingEdge(self, marker[0], i)
-                    self._link_slope(slope, prev_slope)
-                    transitions.append(slope)
-                    prev_slope = slope
-                
-                prev_state = state
-        
-        return transitions
+        if self._detector is not None and len(self.awf.data) == 0:
+            voltage = self._detector.values_at(index)
+        else:
+            voltage = self.awf.values_at_indices(index, interpolate)
+        return np.where(voltage >= self.threshold_hi, 1, np.where(voltage < self.threshold_lo, 0, -1)).astype(np.int8)
 
-    @staticmethod
-    def _link_slope(current_slope: Edge, prev_slope: Optional[Edge]) -> None:
-        """Helper method to link adjacent slopes."""
-        current_slope.slope_prev = prev_slope
-        if prev_slope is not None:
-            prev_slope.slope_next = current_slope
-
-
-    def _find_first_after(self, index):
-        left = 0
-        right = len(self.transitions) - 1
-        result = None
-
-        while left <= right:
-            mid = (left + right) // 2
-            if self.transitions[mid].i_end > index:
-                # This could be our answer, but let's check if there's an earlier one
-                result = self.transitions[mid]
-                right = mid - 1
-            else:
-                # Too early, look in right half
-                left = mid + 1
+    def _compute_transitions(self) -> EdgeTable:
+        """Compute signal transitions with the vectorized EdgeDetector in a single pass."""
+        detector = EdgeDetector(self.threshold_lo, self.threshold_hi)
+        return EdgeTable(self, *detector.feed(self.awf.data))
+
+    def next_from_index(self, i_start, slope = None, i_end = None) -> Optional[Edge]:
+        """
+        Find the first transition ending after i_start.
+
+        Args:
+            i_start: Index to search from (exclusive)
+            slope: True for rising, False for falling, None for any edge
+            i_end: Only accept transitions ending before this index (exclusive)
 
-        return result
+        Returns:
+            The transition or None
+        """
+        pos = self.transitions.first_after(i_start, slope)
+        if pos is None or (i_end is not None and self.transitions.i_end[pos] >= i_end):
+            return None
+        
+        return self.transitions[pos]
 
 #    def next_from_index_old(self, i_start, slope = None, i_end = None):
 #        cls = None
@@ -423,26 +1178,6 @@ class DigitalWaveform:
 #
 #        return None
 
-    def next_from_index(self, i_start, slope = None, i_end = None):
-        cls = None
-        if slope is True:
-            cls = RisingEdge
-        elif slope is False:
-            cls = FallingEdge
-
-        if i_end is None:
-            i_end = len(self.awf.data)
-
-        tr = self._find_first_after(i_start)
-
-        while tr is not None:
-            if (cls is None or isinstance(tr, cls)) and tr.i_end > i_start and tr.i_end < i_end:
-                return tr
-            tr = tr.slope_next
-        
-        return None
-
-
 #    def next_from_index(self, i_start, slope = None, i_end = None):
 #        cls = None
 #        if slope is True: